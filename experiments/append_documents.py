@@ -0,0 +1,148 @@
+import argparse
+import json
+import logging
+import os
+
+from instruct_qa.collections.utils import load_collection
+from instruct_qa.experiment_utils import log_commandline_args
+from instruct_qa.retrieval.index import IndexBase
+from instruct_qa.retrieval.utils import convert_dict_to_text, load_index, load_retriever
+
+parser = argparse.ArgumentParser(
+    description="Appends new passages to a document collection and its index, encoding "
+    "only the new passages, and saves them as segments next to the existing ones."
+)
+parser.add_argument(
+    "--passages_file",
+    action="store",
+    type=str,
+    required=True,
+    help="JSON lines file of the new passages, with id, text, title and optionally "
+    "sub_title keys.",
+)
+parser.add_argument(
+    "--segments_dir",
+    action="store",
+    type=str,
+    required=True,
+    help="Directory of the segments of the collection and index.",
+)
+parser.add_argument(
+    "--document_collection_name",
+    action="store",
+    type=str,
+    default="dpr_wiki_collection",
+    help="Document collection to append to.",
+)
+parser.add_argument(
+    "--document_cache_dir",
+    action="store",
+    type=str,
+    default=None,
+    help="Directory that document collection is cached in.",
+)
+parser.add_argument(
+    "--document_file_name",
+    action="store",
+    type=str,
+    default=None,
+    help="Basename of the path to the file containing the document collection.",
+)
+parser.add_argument(
+    "--document_storage",
+    action="store",
+    type=str,
+    default=None,
+    help="How the document collection holds passages e.g., memory, columnar, mmap.",
+)
+parser.add_argument(
+    "--retriever_name",
+    action="store",
+    type=str,
+    default="all-MiniLM-L6-v2",
+    help="Name of the retriever used to encode the new passages.",
+)
+parser.add_argument(
+    "--index_name",
+    action="store",
+    type=str,
+    default=None,
+    help="Name of the index to append to. If not given, only the collection is updated.",
+)
+parser.add_argument(
+    "--index_path",
+    action="store",
+    type=str,
+    default=None,
+    help="Path to the index to append to.",
+)
+parser.add_argument(
+    "--batch_size",
+    action="store",
+    type=int,
+    default=32,
+    help="Batch size to use for encoding.",
+)
+parser.add_argument(
+    "--merge_segments",
+    action="store_true",
+    default=False,
+    help="Whether to merge all segments into one after appending.",
+)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(os.path.basename(__file__))
+    log_commandline_args(args, logger.info)
+
+    with open(args.passages_file) as f:
+        passages = [json.loads(line) for line in f if line.strip()]
+    for passage in passages:
+        passage.setdefault("sub_title", "")
+    logger.info(f"Read {len(passages)} new passages.")
+
+    logger.info("Loading document collection...")
+    kwargs = {}
+    if args.document_cache_dir is not None:
+        kwargs["cachedir"] = args.document_cache_dir
+    if args.document_file_name is not None:
+        kwargs["file_name"] = args.document_file_name
+    if args.document_storage is not None:
+        kwargs["storage"] = args.document_storage
+    collection = load_collection(args.document_collection_name, **kwargs)
+    collection.load_segments(args.segments_dir)
+
+    index = None
+    if args.index_name is not None:
+        logger.info("Loading index...")
+        kwargs = {}
+        if args.index_path is not None:
+            kwargs["index_path"] = args.index_path
+        index = load_index(args.index_name, **kwargs)
+        index.load_segments(args.segments_dir)
+        if len(index) != len(collection.passages):
+            raise ValueError(
+                f"The index holds {len(index)} documents, but the collection holds "
+                f"{len(collection.passages)} passages."
+            )
+
+    indices = collection.add_passages(passages)
+    path = collection.save_segment(args.segments_dir, indices.start)
+    logger.info(f"Saved passages {indices.start} to {indices.stop - 1} to {path}.")
+
+    if index is not None:
+        retriever = load_retriever(args.retriever_name, index)
+        texts = [
+            convert_dict_to_text(p, key_order=("title", "sub_title", "text")) for p in passages
+        ]
+        retriever.add_documents(texts, batch_size=args.batch_size, show_progress_bar=True)
+        path = index.save_segment(args.segments_dir, indices.start)
+        logger.info(f"Saved embeddings to {path}.")
+
+    if args.merge_segments:
+        collection.merge_segments(args.segments_dir)
+        if index is not None:
+            IndexBase.merge_segments(args.segments_dir)
+        logger.info("Merged segments.")
@@ -0,0 +1,126 @@
+import argparse
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from instruct_qa.experiment_utils import log_commandline_args
+from instruct_qa.retrieval.index import IndexPyseriniBM25
+
+parser = argparse.ArgumentParser(
+    description="Benchmarks the throughput of searching a Pyserini BM25 index with a "
+    "varying number of threads, and checks that every thread count gives the same "
+    "results as searching the queries one at a time."
+)
+parser.add_argument(
+    "--index_dir",
+    action="store",
+    type=str,
+    required=True,
+    help="Directory the Pyserini index was built in (see IndexPyseriniBM25.build_index).",
+)
+parser.add_argument(
+    "--index_subdir",
+    action="store",
+    type=str,
+    default="bm25_pyserini",
+    help="Subdirectory of the index.",
+)
+parser.add_argument(
+    "--queries_file",
+    action="store",
+    type=str,
+    required=True,
+    help="Text file with one query per line.",
+)
+parser.add_argument(
+    "--num_queries",
+    action="store",
+    type=int,
+    default=None,
+    help="Number of queries to search, sampled with replacement from the queries file. "
+    "Defaults to all queries of the file.",
+)
+parser.add_argument(
+    "--threads",
+    action="store",
+    type=int,
+    nargs="+",
+    default=[1, 2, 4, 8, 16],
+    help="Thread counts to benchmark.",
+)
+parser.add_argument(
+    "--k",
+    action="store",
+    type=int,
+    default=10,
+    help="Number of documents retrieved per query.",
+)
+parser.add_argument(
+    "--repeats",
+    action="store",
+    type=int,
+    default=3,
+    help="Number of runs of each thread count. The median time is reported.",
+)
+parser.add_argument(
+    "--output_file",
+    action="store",
+    type=str,
+    default=None,
+    help="Optional path of a JSON file to write the results to.",
+)
+parser.add_argument(
+    "--seed",
+    action="store",
+    type=int,
+    default=0,
+    help="Seed for RNG.",
+)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(os.path.basename(__file__))
+    log_commandline_args(args, logger.info)
+
+    with open(args.queries_file) as f:
+        queries = [line.strip() for line in f if line.strip()]
+    if args.num_queries is not None:
+        rng = np.random.default_rng(args.seed)
+        queries = [queries[i] for i in rng.integers(len(queries), size=args.num_queries)]
+    logger.info(f"Searching {len(queries)} queries.")
+
+    index = IndexPyseriniBM25.load(args.index_dir, args.index_subdir)
+    # Warms up the JVM and the page cache of the index.
+    reference = index.search(queries, k=args.k, threads=1)
+
+    summary = {}
+    for threads in args.threads:
+        times = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            results = index.search(queries, k=args.k, threads=threads)
+            times.append(time.perf_counter() - start)
+
+        if not np.array_equal(results["indices"], reference["indices"]):
+            raise RuntimeError(f"Searching with {threads} threads gives different documents.")
+        search_time = float(np.median(times))
+        summary[threads] = {
+            "search_s": search_time,
+            "queries_per_s": len(queries) / search_time,
+            "speedup": summary[args.threads[0]]["search_s"] / search_time if summary else 1.0,
+        }
+        logger.info(
+            f"threads={threads}: {search_time:.3f}s, "
+            f"{summary[threads]['queries_per_s']:.1f} queries/s, "
+            f"{summary[threads]['speedup']:.2f}x the throughput of threads={args.threads[0]}"
+        )
+
+    if args.output_file is not None:
+        with open(args.output_file, "w") as f:
+            json.dump(summary, f, indent=2)
+        logger.info(f"Saved the results to {args.output_file}.")
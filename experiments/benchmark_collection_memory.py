@@ -0,0 +1,152 @@
+import argparse
+import csv
+import gc
+import json
+import logging
+import os
+import random
+import time
+import tracemalloc
+
+from instruct_qa.collections.passage_store import ColumnarPassages
+from instruct_qa.experiment_utils import log_commandline_args
+
+parser = argparse.ArgumentParser(
+    description="Compares the memory footprint of the passage collection layouts."
+)
+parser.add_argument(
+    "--tsv_path",
+    action="store",
+    type=str,
+    default=None,
+    help="Optional DPR-style TSV file (id, text, title) to sample passages from. "
+    "If not given, synthetic passages are generated.",
+)
+parser.add_argument(
+    "--num_passages",
+    action="store",
+    type=int,
+    default=200000,
+    help="Number of passages to load.",
+)
+parser.add_argument(
+    "--passages_per_title",
+    action="store",
+    type=int,
+    default=5,
+    help="Number of consecutive synthetic passages sharing the same title.",
+)
+parser.add_argument(
+    "--num_lookups",
+    action="store",
+    type=int,
+    default=10000,
+    help="Number of random passage lookups used to time access.",
+)
+parser.add_argument(
+    "--output_file",
+    action="store",
+    type=str,
+    default=None,
+    help="Optional path of a JSON file to write the results to.",
+)
+parser.add_argument(
+    "--seed",
+    action="store",
+    type=int,
+    default=0,
+    help="Seed for RNG.",
+)
+
+
+def iter_synthetic_passages(num_passages, passages_per_title, seed=0):
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(5000)]
+    for i in range(num_passages):
+        yield {
+            "id": f"wiki:{i + 1}",
+            "text": " ".join(rng.choices(vocabulary, k=100)),
+            "title": f"Article {i // passages_per_title}",
+            "sub_title": "",
+            "index": i,
+        }
+
+
+def iter_tsv_passages(path, num_passages):
+    with open(path) as ifile:
+        reader = csv.reader(ifile, delimiter="\t")
+        index = 0
+        for row in reader:
+            if row[0] == "id":
+                continue
+            if index >= num_passages:
+                break
+            yield {
+                "id": "wiki:" + row[0],
+                "text": row[1],
+                "title": row[2],
+                "sub_title": "",
+                "index": index,
+            }
+            index += 1
+
+
+def measure(layout, passages, num_lookups, seed=0):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    if layout == "memory":
+        container = []
+    else:
+        container = ColumnarPassages()
+    for passage in passages:
+        container.append(passage)
+    load_time = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rng = random.Random(seed)
+    lookups = [rng.randrange(len(container)) for _ in range(num_lookups)]
+    start = time.perf_counter()
+    for i in lookups:
+        container[i]
+    lookup_time = time.perf_counter() - start
+
+    return {
+        "layout": layout,
+        "num_passages": len(container),
+        "memory_bytes": current,
+        "peak_memory_bytes": peak,
+        "bytes_per_passage": current / max(len(container), 1),
+        "load_seconds": load_time,
+        "lookup_microseconds": 1e6 * lookup_time / max(num_lookups, 1),
+    }
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(os.path.basename(__file__))
+    log_commandline_args(args, logger.info)
+
+    results = []
+    for layout in ["memory", "columnar"]:
+        if args.tsv_path is not None:
+            passages = iter_tsv_passages(args.tsv_path, args.num_passages)
+        else:
+            passages = iter_synthetic_passages(
+                args.num_passages, args.passages_per_title, seed=args.seed
+            )
+        result = measure(layout, passages, args.num_lookups, seed=args.seed)
+        results.append(result)
+        logger.info(
+            f"{layout:>10}: {result['memory_bytes'] / 2**20:,.1f} MiB "
+            f"({result['bytes_per_passage']:,.0f} B/passage), "
+            f"load {result['load_seconds']:.2f}s, "
+            f"lookup {result['lookup_microseconds']:.2f}us"
+        )
+
+    if args.output_file is not None:
+        with open(args.output_file, "w") as f:
+            json.dump(results, f, indent=2)
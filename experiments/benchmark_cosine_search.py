@@ -0,0 +1,105 @@
+import argparse
+import logging
+import os
+import time
+
+import numpy as np
+import torch
+
+from instruct_qa.experiment_utils import log_commandline_args
+from instruct_qa.retrieval.index import IndexTorchFlat
+
+parser = argparse.ArgumentParser(
+    description="Compares the per-query latency of cosine search in IndexTorchFlat, with "
+    "documents normalized once when the index is built, against computing the norms of "
+    "all documents in every search, on a synthetic corpus."
+)
+parser.add_argument(
+    "--num_documents",
+    action="store",
+    type=int,
+    default=1000000,
+    help="Number of documents of the synthetic corpus.",
+)
+parser.add_argument(
+    "--dim",
+    action="store",
+    type=int,
+    default=128,
+    help="Embedding dimension of the synthetic corpus.",
+)
+parser.add_argument(
+    "--num_queries",
+    action="store",
+    type=int,
+    default=20,
+    help="Number of queries, searched one at a time.",
+)
+parser.add_argument(
+    "--k",
+    action="store",
+    type=int,
+    default=10,
+    help="Number of documents retrieved per query.",
+)
+parser.add_argument(
+    "--device",
+    action="store",
+    type=str,
+    default="auto",
+    help="Device of the index.",
+)
+parser.add_argument(
+    "--seed",
+    action="store",
+    type=int,
+    default=0,
+    help="Seed for RNG.",
+)
+
+
+def cosine(x, y):
+    # Cosine similarity recomputing the norms of the documents in every search.
+    denom = torch.norm(x, dim=1, keepdim=True) * torch.norm(y, dim=1, keepdim=True).t()
+    return torch.mm(x, y.t()) / denom
+
+
+def time_queries(index, queries, k):
+    indices = []
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        indices.append(index.search(query[None], k=k)["indices"][0])
+        latencies.append(time.perf_counter() - start)
+    return np.array(indices), np.array(latencies) * 1000
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(os.path.basename(__file__))
+    log_commandline_args(args, logger.info)
+
+    generator = torch.Generator().manual_seed(args.seed)
+    embeddings = torch.randn(args.num_documents, args.dim, generator=generator)
+    queries = torch.randn(args.num_queries, args.dim, generator=generator)
+
+    before = IndexTorchFlat(embeddings, sim_func=cosine, device=args.device)
+    start = time.perf_counter()
+    after = IndexTorchFlat(embeddings, sim_func="cosine", device=args.device)
+    logger.info(f"Normalized {args.num_documents} documents in {time.perf_counter() - start:.3f}s.")
+
+    before_indices, before_latencies = time_queries(before, queries, args.k)
+    after_indices, after_latencies = time_queries(after, queries, args.k)
+
+    # Rounding differs between the two, which may swap documents with close scores.
+    overlap = np.mean(
+        [len(set(a) & set(b)) / args.k for a, b in zip(before_indices, after_indices)]
+    )
+    logger.info(f"Overlap of the top {args.k} documents: {overlap:.3f}")
+    for name, latencies in (("Before", before_latencies), ("After", after_latencies)):
+        logger.info(
+            f"{name}: median {np.median(latencies):.1f} ms, "
+            f"p95 {np.percentile(latencies, 95):.1f} ms per query"
+        )
@@ -0,0 +1,148 @@
+import argparse
+import json
+import logging
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+
+from instruct_qa.experiment_utils import log_commandline_args
+from instruct_qa.retrieval.benchmark import get_memory_usage
+from instruct_qa.retrieval.utils import load_index
+
+parser = argparse.ArgumentParser(
+    description="Benchmarks loading a faiss index into memory against memory-mapping it. "
+    "Each mode is run in a fresh process, which reports the time to load the index, the "
+    "time to the first query results, and its resident memory."
+)
+parser.add_argument(
+    "--index_name",
+    action="store",
+    type=str,
+    required=True,
+    help="Name of the index, which selects its type (see load_index).",
+)
+parser.add_argument(
+    "--index_path",
+    action="store",
+    type=str,
+    default=None,
+    help="Path to the index. Defaults to the path of the index name.",
+)
+parser.add_argument(
+    "--num_queries",
+    action="store",
+    type=int,
+    default=1,
+    help="Number of random queries in the first search.",
+)
+parser.add_argument(
+    "--k",
+    action="store",
+    type=int,
+    default=10,
+    help="Number of documents retrieved per query.",
+)
+parser.add_argument(
+    "--repeats",
+    action="store",
+    type=int,
+    default=3,
+    help="Number of runs of each mode, in alternation. The first run of the first mode "
+    "may read the file from disk, the others from the page cache.",
+)
+parser.add_argument(
+    "--output_file",
+    action="store",
+    type=str,
+    default=None,
+    help="Optional path of a JSON file to write the results to.",
+)
+parser.add_argument(
+    "--seed",
+    action="store",
+    type=int,
+    default=0,
+    help="Seed for RNG.",
+)
+
+
+def run(index_name, index_path, mmap, num_queries, k, seed, results):
+    before = get_memory_usage()
+    start = time.perf_counter()
+    kwargs = {"mmap": mmap}
+    if index_path is not None:
+        kwargs["index_path"] = index_path
+    index = load_index(index_name, **kwargs)
+    load_time = time.perf_counter() - start
+
+    # Not timed: it is only needed to generate the queries.
+    dim = index.get_embeddings(0, 1).shape[1]
+    queries = np.random.default_rng(seed).normal(size=(num_queries, dim)).astype(np.float32)
+    start = time.perf_counter()
+    index.search(queries, k=k)
+    first_query_time = load_time + time.perf_counter() - start
+
+    after = get_memory_usage()
+    results.put(
+        {
+            "mmap": mmap,
+            "load_s": load_time,
+            "first_query_s": first_query_time,
+            "rss_mib": {key: after[key] - before.get(key, 0) for key in after},
+        }
+    )
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(os.path.basename(__file__))
+    log_commandline_args(args, logger.info)
+
+    context = mp.get_context("spawn")
+    runs = []
+    for _ in range(args.repeats):
+        for mmap in (False, True):
+            results = context.Queue()
+            process = context.Process(
+                target=run,
+                args=(
+                    args.index_name,
+                    args.index_path,
+                    mmap,
+                    args.num_queries,
+                    args.k,
+                    args.seed,
+                    results,
+                ),
+            )
+            process.start()
+            runs.append(results.get())
+            process.join()
+            logger.info(json.dumps(runs[-1]))
+
+    summary = {}
+    for mmap in (False, True):
+        mode_runs = [r for r in runs if r["mmap"] == mmap]
+        summary["mmap" if mmap else "read"] = {
+            "load_s": float(np.median([r["load_s"] for r in mode_runs])),
+            "first_query_s": float(np.median([r["first_query_s"] for r in mode_runs])),
+            "rss_mib": {
+                key: float(np.median([r["rss_mib"][key] for r in mode_runs]))
+                for key in mode_runs[0]["rss_mib"]
+            },
+        }
+    for mode, stats in summary.items():
+        rss = ", ".join(f"{key} {value:.1f} MiB" for key, value in stats["rss_mib"].items())
+        logger.info(
+            f"{mode}: load {stats['load_s']:.3f}s, first query after "
+            f"{stats['first_query_s']:.3f}s, {rss} (medians over {args.repeats} runs)"
+        )
+
+    if args.output_file is not None:
+        with open(args.output_file, "w") as f:
+            json.dump({"runs": runs, "summary": summary}, f, indent=2)
+        logger.info(f"Saved the results to {args.output_file}.")
@@ -0,0 +1,144 @@
+import argparse
+import json
+import logging
+import os
+
+from instruct_qa.experiment_utils import log_commandline_args
+from instruct_qa.retrieval.benchmark import INDEX_TYPES, run_benchmark
+
+parser = argparse.ArgumentParser(
+    description="Compares index types on synthetic or sampled data: build time, memory, "
+    "query latency at several batch sizes, and recall@k against exact search. Each index "
+    "is built in a fresh process. Writes a JSON report."
+)
+parser.add_argument(
+    "--index_types",
+    action="store",
+    type=str,
+    nargs="+",
+    default=["torch-flat", "faiss-flat", "hnsw", "bm25-numpy"],
+    choices=INDEX_TYPES,
+    help="Index types to benchmark. BM25 indexes are benchmarked on synthetic texts.",
+)
+parser.add_argument(
+    "--index_params",
+    action="store",
+    type=str,
+    default=None,
+    help="JSON object of the constructor arguments of each index type, e.g. "
+    '\'{"hnsw": [{"ef_search": 64}, {"ef_search": 256}], "ivfpq": {"m": 32}}\'. A list '
+    "benchmarks each set of arguments in turn.",
+)
+parser.add_argument(
+    "--num_documents",
+    action="store",
+    type=int,
+    default=100000,
+    help="Number of documents to index.",
+)
+parser.add_argument(
+    "--dim",
+    action="store",
+    type=int,
+    default=768,
+    help="Dimension of synthetic embeddings.",
+)
+parser.add_argument(
+    "--embeddings_file",
+    action="store",
+    type=str,
+    default=None,
+    help="Optional .npy file of document embeddings, e.g. exported from an index, to "
+    "sample --num_documents embeddings from instead of generating them.",
+)
+parser.add_argument(
+    "--num_queries",
+    action="store",
+    type=int,
+    default=1000,
+    help="Number of queries, which are perturbed documents for dense indexes.",
+)
+parser.add_argument(
+    "--k",
+    action="store",
+    type=int,
+    default=10,
+    help="Number of documents retrieved per query.",
+)
+parser.add_argument(
+    "--batch_sizes",
+    action="store",
+    type=int,
+    nargs="+",
+    default=[1, 16, 128],
+    help="Numbers of queries searched at a time when measuring latency.",
+)
+parser.add_argument(
+    "--max_batches",
+    action="store",
+    type=int,
+    default=100,
+    help="Maximum number of searches timed per batch size.",
+)
+parser.add_argument(
+    "--work_dir",
+    action="store",
+    type=str,
+    default=None,
+    help="Directory for the data and the indexes built on disk. Defaults to a temporary "
+    "directory.",
+)
+parser.add_argument(
+    "--output_file",
+    action="store",
+    type=str,
+    default="index_benchmark.json",
+    help="Path of the JSON report.",
+)
+parser.add_argument(
+    "--seed",
+    action="store",
+    type=int,
+    default=0,
+    help="Seed for RNG.",
+)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(os.path.basename(__file__))
+    log_commandline_args(args, logger.info)
+
+    report = run_benchmark(
+        args.index_types,
+        num_documents=args.num_documents,
+        dim=args.dim,
+        num_queries=args.num_queries,
+        k=args.k,
+        batch_sizes=args.batch_sizes,
+        max_batches=args.max_batches,
+        embeddings_file=args.embeddings_file,
+        index_params=json.loads(args.index_params) if args.index_params else None,
+        work_dir=args.work_dir,
+        seed=args.seed,
+    )
+
+    for run in report["runs"]:
+        if "error" in run:
+            logger.info(f"{run['name']}: failed with {run['error']}")
+            continue
+        latency = ", ".join(
+            f"batch {batch_size}: p50 {stats['p50_ms']:.2f}ms p99 {stats['p99_ms']:.2f}ms "
+            f"{stats['queries_per_s']:.0f} q/s"
+            for batch_size, stats in run["latency"].items()
+        )
+        logger.info(
+            f"{run['name']}: recall@{args.k} {run['recall']:.3f}, built in "
+            f"{run['build_s']:.1f}s, +{run['memory_mib'].get('RssAnon', 0):.1f} MiB anonymous "
+            f"memory, {latency}"
+        )
+
+    with open(args.output_file, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Saved the report to {args.output_file}.")
@@ -0,0 +1,123 @@
+import argparse
+import logging
+import os
+import time
+
+import numpy as np
+import torch
+
+from instruct_qa.experiment_utils import log_commandline_args
+from instruct_qa.retrieval.index import IndexTorchFlat
+
+parser = argparse.ArgumentParser(
+    description="Checks that the blockwise search of IndexTorchFlat gives the same results "
+    "as scoring all documents at once, and compares their speed and the size of the "
+    "score matrices they hold, on a synthetic corpus."
+)
+parser.add_argument(
+    "--num_documents",
+    action="store",
+    type=int,
+    default=1000000,
+    help="Number of documents of the synthetic corpus.",
+)
+parser.add_argument(
+    "--dim",
+    action="store",
+    type=int,
+    default=128,
+    help="Embedding dimension of the synthetic corpus.",
+)
+parser.add_argument(
+    "--num_queries",
+    action="store",
+    type=int,
+    default=64,
+    help="Number of queries in the batch.",
+)
+parser.add_argument(
+    "--k",
+    action="store",
+    type=int,
+    default=10,
+    help="Number of documents retrieved per query.",
+)
+parser.add_argument(
+    "--sim_func",
+    action="store",
+    type=str,
+    default="dot",
+    choices=["dot", "cosine"],
+    help="Similarity function of the index.",
+)
+parser.add_argument(
+    "--block_size",
+    action="store",
+    type=int,
+    default=65536,
+    help="Number of documents scored at a time.",
+)
+parser.add_argument(
+    "--n_jobs",
+    action="store",
+    type=int,
+    default=-1,
+    help="Number of threads scoring blocks (-1 for all CPUs).",
+)
+parser.add_argument(
+    "--device",
+    action="store",
+    type=str,
+    default="auto",
+    help="Device of the index.",
+)
+parser.add_argument(
+    "--seed",
+    action="store",
+    type=int,
+    default=0,
+    help="Seed for RNG.",
+)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(os.path.basename(__file__))
+    log_commandline_args(args, logger.info)
+
+    generator = torch.Generator().manual_seed(args.seed)
+    embeddings = torch.randn(args.num_documents, args.dim, generator=generator)
+    queries = torch.randn(args.num_queries, args.dim, generator=generator)
+    index = IndexTorchFlat(
+        embeddings,
+        sim_func=args.sim_func,
+        device=args.device,
+        block_size=args.block_size,
+        n_jobs=args.n_jobs,
+    )
+
+    start = time.perf_counter()
+    results = index.search(queries, k=args.k)
+    block_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scores, indices = torch.topk(
+        index.sim_func(queries.to(index.index.device), index.index), k=args.k, dim=1
+    )
+    full_time = time.perf_counter() - start
+
+    if not np.array_equal(results["scores"], scores.cpu().numpy()):
+        raise RuntimeError("The blockwise search does not give the same scores.")
+    # Documents with equal scores may be ordered differently by torch.topk.
+    mismatches = int((results["indices"] != indices.cpu().numpy()).sum())
+    logger.info(f"Same scores. Indices differing because of ties: {mismatches}.")
+
+    element_size = embeddings.element_size()
+    full_size = args.num_queries * args.num_documents * element_size / 2**20
+    block_size = args.num_queries * min(args.block_size, args.num_documents) * element_size
+    logger.info(
+        f"Full search: {full_time:.3f}s, one score matrix of {full_size:.1f} MiB. "
+        f"Blockwise search: {block_time:.3f}s, score matrices of {block_size / 2**20:.1f} "
+        "MiB per thread."
+    )
@@ -0,0 +1,122 @@
+import argparse
+import logging
+import os
+import time
+
+from instruct_qa.collections.utils import load_collection
+from instruct_qa.experiment_utils import log_commandline_args
+from instruct_qa.retrieval.index import IndexNumpyBM25
+
+parser = argparse.ArgumentParser(
+    description="Builds a BM25 index of a document collection in numpy arrays, which needs "
+    "neither Java nor Pyserini, and runs a few queries against it."
+)
+parser.add_argument(
+    "--document_collection_name",
+    action="store",
+    type=str,
+    default="dpr_wiki_collection",
+    help="Document collection to index.",
+)
+parser.add_argument(
+    "--document_cache_dir",
+    action="store",
+    type=str,
+    default=None,
+    help="Directory that document collection is cached in.",
+)
+parser.add_argument(
+    "--document_file_name",
+    action="store",
+    type=str,
+    default=None,
+    help="Basename of the path to the file containing the document collection.",
+)
+parser.add_argument(
+    "--document_storage",
+    action="store",
+    type=str,
+    default=None,
+    help="How the document collection holds passages e.g., memory, columnar, mmap.",
+)
+parser.add_argument(
+    "--output_dir",
+    action="store",
+    type=str,
+    default="data/nq/index",
+    help="Directory to save the index to.",
+)
+parser.add_argument(
+    "--index_subdir",
+    action="store",
+    type=str,
+    default="bm25_numpy",
+    help="Subdirectory of --output_dir holding the index.",
+)
+parser.add_argument(
+    "--k1",
+    action="store",
+    type=float,
+    default=0.9,
+    help="BM25 k1 parameter, which controls term frequency saturation.",
+)
+parser.add_argument(
+    "--b",
+    action="store",
+    type=float,
+    default=0.4,
+    help="BM25 b parameter, which controls document length normalization.",
+)
+parser.add_argument(
+    "--queries",
+    action="store",
+    type=str,
+    nargs="*",
+    default=["who wrote the origin of species", "when was the eiffel tower built"],
+    help="Queries run against the saved index.",
+)
+parser.add_argument(
+    "--k",
+    action="store",
+    type=int,
+    default=5,
+    help="Number of documents retrieved per query.",
+)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(os.path.basename(__file__))
+    log_commandline_args(args, logger.info)
+
+    kwargs = {}
+    if args.document_cache_dir is not None:
+        kwargs["cachedir"] = args.document_cache_dir
+    if args.document_file_name is not None:
+        kwargs["file_name"] = args.document_file_name
+    if args.document_storage is not None:
+        kwargs["storage"] = args.document_storage
+    collection = load_collection(args.document_collection_name, **kwargs)
+
+    start = time.time()
+    IndexNumpyBM25.build_index(
+        collection.passages, args.output_dir, index_subdir=args.index_subdir, k1=args.k1, b=args.b
+    )
+    logger.info(
+        f"Built an index of {len(collection.passages)} passages in {time.time() - start:.1f}s, "
+        f"saved to {os.path.join(args.output_dir, args.index_subdir)}."
+    )
+
+    start = time.time()
+    index = IndexNumpyBM25.load(args.output_dir, index_subdir=args.index_subdir)
+    logger.info(f"Loaded the index in {time.time() - start:.3f}s.")
+    start = time.time()
+    results = index.search(args.queries, k=args.k)
+    logger.info(f"Searched {len(args.queries)} queries in {time.time() - start:.3f}s.")
+    for query, indices, scores in zip(args.queries, results["indices"], results["scores"]):
+        logger.info(f"Query: {query}")
+        # Queries matching fewer than k documents are padded with an index of -1.
+        indices, scores = indices[indices >= 0], scores[indices >= 0]
+        for passage, score in zip(collection.get_passages_from_indices(indices), scores):
+            logger.info(f"\t{score:.2f}\t{passage['title']}: {passage['text'][:100]}")
@@ -0,0 +1,149 @@
+import argparse
+import logging
+import os
+import time
+
+import numpy as np
+
+from instruct_qa.experiment_utils import log_commandline_args
+from instruct_qa.retrieval.index import IndexFaissHNSW
+
+parser = argparse.ArgumentParser(
+    description="Builds an HNSW index from document embeddings, saves it, and checks "
+    "that the saved index gives the same results as the built one."
+)
+parser.add_argument(
+    "--embeddings_file",
+    action="store",
+    type=str,
+    default=None,
+    help="Path to a .npy file of document embeddings, of shape (n_documents, dim). It is "
+    "memory-mapped. If not given, a synthetic corpus is generated.",
+)
+parser.add_argument(
+    "--synthetic_size",
+    action="store",
+    type=int,
+    default=20000,
+    help="Number of documents of the synthetic corpus.",
+)
+parser.add_argument(
+    "--synthetic_dim",
+    action="store",
+    type=int,
+    default=64,
+    help="Embedding dimension of the synthetic corpus.",
+)
+parser.add_argument(
+    "--output_dir",
+    action="store",
+    type=str,
+    default="data/index/hnsw",
+    help="Directory to save the index to.",
+)
+parser.add_argument(
+    "--filename",
+    action="store",
+    type=str,
+    default="hnsw.index.faiss",
+    help="Name of the index file.",
+)
+parser.add_argument(
+    "--store_n",
+    action="store",
+    type=int,
+    default=512,
+    help="Number of neighbors of each node in the HNSW graph.",
+)
+parser.add_argument(
+    "--ef_search",
+    action="store",
+    type=int,
+    default=128,
+    help="Size of the candidate list when searching.",
+)
+parser.add_argument(
+    "--ef_construction",
+    action="store",
+    type=int,
+    default=200,
+    help="Size of the candidate list when building the graph.",
+)
+parser.add_argument(
+    "--chunk_size",
+    action="store",
+    type=int,
+    default=100000,
+    help="Number of embeddings added to the graph at a time.",
+)
+parser.add_argument(
+    "--n_jobs",
+    action="store",
+    type=int,
+    default=-1,
+    help="Number of threads used to build the graph (-1 for all CPUs).",
+)
+parser.add_argument(
+    "--num_queries",
+    action="store",
+    type=int,
+    default=100,
+    help="Number of queries used to check the saved index.",
+)
+parser.add_argument(
+    "--k",
+    action="store",
+    type=int,
+    default=10,
+    help="Number of documents retrieved per query.",
+)
+parser.add_argument(
+    "--seed",
+    action="store",
+    type=int,
+    default=0,
+    help="Seed for RNG.",
+)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(os.path.basename(__file__))
+    log_commandline_args(args, logger.info)
+
+    rng = np.random.default_rng(args.seed)
+    embeddings_file = args.embeddings_file
+    if embeddings_file is None:
+        os.makedirs(args.output_dir, exist_ok=True)
+        embeddings_file = os.path.join(args.output_dir, "synthetic_embeddings.npy")
+        np.save(
+            embeddings_file,
+            rng.normal(size=(args.synthetic_size, args.synthetic_dim)).astype(np.float32),
+        )
+        logger.info(f"Saved a synthetic corpus to {embeddings_file}.")
+
+    start = time.time()
+    index = IndexFaissHNSW.from_file(
+        embeddings_file,
+        store_n=args.store_n,
+        ef_search=args.ef_search,
+        ef_construction=args.ef_construction,
+        chunk_size=args.chunk_size,
+        n_jobs=args.n_jobs,
+        show_progress_bar=True,
+    )
+    logger.info(f"Built an index of {len(index)} documents in {time.time() - start:.1f}s.")
+    index.save(args.output_dir, args.filename)
+    logger.info(f"Saved the index to {os.path.join(args.output_dir, args.filename)}.")
+
+    embeddings = np.load(embeddings_file, mmap_mode="r")
+    queries = rng.normal(size=(args.num_queries, embeddings.shape[1])).astype(np.float32)
+    results = index.search(queries, k=args.k)
+    loaded_results = IndexFaissHNSW.load(args.output_dir, args.filename).search(queries, k=args.k)
+    if not np.array_equal(results["indices"], loaded_results["indices"]):
+        raise RuntimeError("The saved index does not give the same results as the built one.")
+
+    exact = np.argsort(-(queries @ np.asarray(embeddings).T), axis=1)[:, : args.k]
+    recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(results["indices"], exact)])
+    logger.info(f"Save/load round-trip OK. Recall@{args.k} against exact search: {recall:.3f}")
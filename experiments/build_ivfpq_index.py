@@ -0,0 +1,188 @@
+import argparse
+import logging
+import os
+import time
+
+import numpy as np
+
+from instruct_qa.experiment_utils import log_commandline_args
+from instruct_qa.retrieval.index import IndexFaissIVFPQ
+from instruct_qa.retrieval.utils import INDEX_NAME_TO_PATH_URL, export_embeddings, load_index
+
+parser = argparse.ArgumentParser(
+    description="Builds a compressed IVF-PQ index from document embeddings, or from an "
+    "existing flat or HNSW index, and reports its recall against exact search."
+)
+parser.add_argument(
+    "--index_name",
+    action="store",
+    type=str,
+    default="dpr-nq-multi-ivfpq",
+    help="Name of the IVF-PQ index to build. Its paths are read from INDEX_NAME_TO_PATH_URL.",
+)
+parser.add_argument(
+    "--source_index_name",
+    action="store",
+    type=str,
+    default="dpr-nq-multi-hnsw",
+    help="Name of the index whose embeddings are compressed, if --embeddings_file is "
+    "not given. Its embeddings are exported for re-scoring.",
+)
+parser.add_argument(
+    "--embeddings_file",
+    action="store",
+    type=str,
+    default=None,
+    help="Path to a .npy file of document embeddings, of shape (n_documents, dim). It is "
+    "memory-mapped.",
+)
+parser.add_argument(
+    "--index_path",
+    action="store",
+    type=str,
+    default=None,
+    help="Path to save the index to. Defaults to the path of --index_name.",
+)
+parser.add_argument(
+    "--embeddings_path",
+    action="store",
+    type=str,
+    default=None,
+    help="Path to export the embeddings of the source index to. Defaults to the "
+    "embeddings path of --index_name.",
+)
+parser.add_argument(
+    "--n_lists",
+    action="store",
+    type=int,
+    default=None,
+    help="Number of inverted lists. Defaults to about 4 * sqrt(n_documents).",
+)
+parser.add_argument(
+    "--m",
+    action="store",
+    type=int,
+    default=64,
+    help="Number of PQ sub-quantizers, which must divide the embedding dimension.",
+)
+parser.add_argument(
+    "--n_bits",
+    action="store",
+    type=int,
+    default=8,
+    help="Number of bits per sub-quantizer code.",
+)
+parser.add_argument(
+    "--opq",
+    action="store_true",
+    default=False,
+    help="Whether to learn an OPQ rotation before quantization.",
+)
+parser.add_argument(
+    "--train_size",
+    action="store",
+    type=int,
+    default=None,
+    help="Number of embeddings sampled for training.",
+)
+parser.add_argument(
+    "--nprobe",
+    action="store",
+    type=int,
+    default=32,
+    help="Number of inverted lists visited per query when reporting recall.",
+)
+parser.add_argument(
+    "--chunk_size",
+    action="store",
+    type=int,
+    default=100000,
+    help="Number of embeddings read and added at a time.",
+)
+parser.add_argument(
+    "--n_jobs",
+    action="store",
+    type=int,
+    default=-1,
+    help="Number of threads used by faiss (-1 for all CPUs).",
+)
+parser.add_argument(
+    "--num_queries",
+    action="store",
+    type=int,
+    default=100,
+    help="Number of queries used to report recall. They are perturbed document embeddings.",
+)
+parser.add_argument(
+    "--k",
+    action="store",
+    type=int,
+    default=10,
+    help="Number of documents retrieved per query when reporting recall.",
+)
+parser.add_argument(
+    "--seed",
+    action="store",
+    type=int,
+    default=0,
+    help="Seed for RNG.",
+)
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(os.path.basename(__file__))
+    log_commandline_args(args, logger.info)
+
+    paths = INDEX_NAME_TO_PATH_URL.get(args.index_name, {})
+    index_path = args.index_path or paths["path"]
+    embeddings_path = args.embeddings_file
+    if embeddings_path is None:
+        embeddings_path = args.embeddings_path or paths["embeddings_path"]
+        if os.path.exists(embeddings_path):
+            logger.info(f"Using the embeddings exported to {embeddings_path}.")
+        else:
+            os.makedirs(os.path.dirname(embeddings_path) or ".", exist_ok=True)
+            export_embeddings(load_index(args.source_index_name), embeddings_path, args.chunk_size)
+            logger.info(f"Exported the embeddings to {embeddings_path}.")
+    embeddings = np.load(embeddings_path, mmap_mode="r")
+
+    start = time.time()
+    index = IndexFaissIVFPQ(
+        embeddings,
+        n_lists=args.n_lists,
+        m=args.m,
+        n_bits=args.n_bits,
+        opq=args.opq,
+        nprobe=args.nprobe,
+        train_size=args.train_size,
+        chunk_size=args.chunk_size,
+        n_jobs=args.n_jobs,
+        show_progress_bar=True,
+        seed=args.seed,
+    )
+    logger.info(f"Built an index of {len(index)} documents in {time.time() - start:.1f}s.")
+    index.save(os.path.dirname(index_path), os.path.basename(index_path))
+    logger.info(
+        f"Saved the index to {index_path} ({os.path.getsize(index_path) / 2**20:.1f} MiB, "
+        f"embeddings are {embeddings.nbytes / 2**20:.1f} MiB)."
+    )
+
+    rng = np.random.default_rng(args.seed)
+    sample = embeddings[np.sort(rng.choice(len(embeddings), size=args.num_queries, replace=False))]
+    queries = (sample + rng.normal(scale=sample.std(), size=sample.shape)).astype(np.float32)
+    exact = np.argsort(-(queries @ np.asarray(embeddings).T), axis=1)[:, : args.k]
+
+    loaded = IndexFaissIVFPQ.load(
+        os.path.dirname(index_path),
+        os.path.basename(index_path),
+        nprobe=args.nprobe,
+        embeddings_path=embeddings_path,
+    )
+    for rescore_factor in [0, loaded.rescore_factor]:
+        loaded.rescore_factor = rescore_factor
+        indices = loaded.search(queries, k=args.k)["indices"]
+        recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(indices, exact)])
+        logger.info(f"Recall@{args.k} with rescore_factor={rescore_factor}: {recall:.3f}")
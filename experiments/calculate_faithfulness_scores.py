@@ -220,6 +220,21 @@ parser.add_argument(
     default=None,
     help="Basename of the path to the file containing the document collection.",
 )
+parser.add_argument(
+    "--document_storage",
+    action="store",
+    type=str,
+    default=None,
+    help="How the document collection holds passages e.g., memory, columnar, mmap, zlib, lzma, "
+    "arrow. Defaults to the default of the collection.",
+)
+parser.add_argument(
+    "--document_snapshot_dir",
+    action="store",
+    type=str,
+    default=None,
+    help="Directory of processed document collection snapshots, reused across runs.",
+)
 parser.add_argument(
     "--api_key",
     action="store",
@@ -342,10 +357,15 @@ if __name__ == "__main__":
     )
 
     logger.info("Loading document collection...")
+    document_kwargs = {}
+    if args.document_storage is not None:
+        document_kwargs["storage"] = args.document_storage
     document_collection = load_collection(
         args.document_collection_name,
         cache_dir=args.document_cache_dir,
         file_name=args.document_file_name,
+        snapshot_dir=args.document_snapshot_dir,
+        **document_kwargs,
     )
 
     print("Metrics calculated:", metrics)
@@ -126,6 +126,35 @@ parser.add_argument(
     default=None,
     help="Basename of the path to the file containing the document collection.",
 )
+parser.add_argument(
+    "--document_storage",
+    action="store",
+    type=str,
+    default=None,
+    help="How the document collection holds passages e.g., memory, columnar, mmap, zlib, lzma, arrow.",
+)
+parser.add_argument(
+    "--document_snapshot_dir",
+    action="store",
+    type=str,
+    default=None,
+    help="Directory of processed document collection snapshots, reused across runs.",
+)
+parser.add_argument(
+    "--document_shared_memory_name",
+    action="store",
+    type=str,
+    default=None,
+    help="Attach to a document collection published in shared memory under this name "
+    "(see experiments/share_collection.py) instead of loading it.",
+)
+parser.add_argument(
+    "--document_n_jobs",
+    action="store",
+    type=int,
+    default=None,
+    help="Number of processes used to parse TSV document collections (-1 for all CPUs).",
+)
 parser.add_argument(
     "--batch_size",
     action="store",
@@ -168,6 +197,51 @@ parser.add_argument(
     default=None,
     help="Path to the index to use for retrieval.",
 )
+parser.add_argument(
+    "--index_mmap",
+    action="store_true",
+    help="Memory-map the index from its file instead of reading it into memory. "
+    "Processes that load the same index then share its pages.",
+)
+parser.add_argument(
+    "--warmup",
+    action="store_true",
+    help="Read the memory-mapped files of the index and the document collection into "
+    "memory in background threads after loading, so that the first queries do not wait "
+    "on the disk.",
+)
+parser.add_argument(
+    "--index_nprobe",
+    action="store",
+    type=int,
+    default=None,
+    help="Number of inverted lists visited per query, for IVF-PQ indexes. Defaults to "
+    "the tuned value, if any (see experiments/tune_index.py).",
+)
+parser.add_argument(
+    "--index_ef_search",
+    action="store",
+    type=int,
+    default=None,
+    help="Size of the candidate list when searching, for HNSW indexes. Defaults to the "
+    "tuned value, if any (see experiments/tune_index.py).",
+)
+parser.add_argument(
+    "--index_embeddings_path",
+    action="store",
+    type=str,
+    default=None,
+    help="Path to the exact document embeddings (.npy) used to re-score the candidates "
+    "of IVF-PQ and scalar-quantized indexes.",
+)
+parser.add_argument(
+    "--segments_dir",
+    action="store",
+    type=str,
+    default=None,
+    help="Directory of the passages and embeddings appended to the document collection "
+    "and index since they were built (see experiments/append_documents.py).",
+)
 parser.add_argument(
     "--seed",
     action="store",
@@ -245,7 +319,21 @@ if __name__ == "__main__":
         kwargs['cachedir'] = args.document_cache_dir
     if args.document_file_name is not None:
         kwargs['file_name'] = args.document_file_name
-    document_collection = load_collection(args.document_collection_name, **kwargs)
+    if args.document_storage is not None:
+        kwargs['storage'] = args.document_storage
+    if args.document_snapshot_dir is not None:
+        kwargs['snapshot_dir'] = args.document_snapshot_dir
+    if args.document_n_jobs is not None:
+        kwargs['n_jobs'] = args.document_n_jobs
+    document_collection = load_collection(
+        args.document_collection_name,
+        shared_memory_name=args.document_shared_memory_name,
+        **kwargs,
+    )
+    if args.segments_dir is not None:
+        document_collection.load_segments(args.segments_dir)
+    if args.warmup:
+        document_collection.start_warmup()
 
     logger.info("Loading generation model...")
     model = load_model(
@@ -264,7 +352,19 @@ if __name__ == "__main__":
         kwargs = {}
         if args.index_path is not None:
             kwargs['index_path'] = args.index_path
+        if args.index_mmap:
+            kwargs['mmap'] = True
+        if args.index_nprobe is not None:
+            kwargs['nprobe'] = args.index_nprobe
+        if args.index_ef_search is not None:
+            kwargs['ef_search'] = args.index_ef_search
+        if args.warmup:
+            kwargs['warmup'] = True
+        if args.index_embeddings_path is not None:
+            kwargs['embeddings_path'] = args.index_embeddings_path
         index = load_index(args.index_name, **kwargs)
+        if args.segments_dir is not None:
+            index.load_segments(args.segments_dir)
 
     retriever = None
     if index is not None or args.retriever_cached_results_fp is not None:
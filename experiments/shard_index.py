@@ -0,0 +1,141 @@
+import argparse
+import logging
+import os
+import time
+
+import numpy as np
+
+from instruct_qa.experiment_utils import log_commandline_args
+from instruct_qa.retrieval.index import (
+    IndexFaissFlatIP,
+    IndexFaissFlatSQ,
+    IndexFaissHNSW,
+    IndexSharded,
+)
+from instruct_qa.retrieval.utils import export_embeddings, load_index
+
+SHARD_TYPES = {
+    "flat": (IndexFaissFlatIP, {}),
+    "hnsw": (IndexFaissHNSW, {}),
+    "fp16": (IndexFaissFlatSQ, {"qtype": "fp16"}),
+    "sq8": (IndexFaissFlatSQ, {"qtype": "int8"}),
+}
+
+parser = argparse.ArgumentParser(
+    description="Splits document embeddings, or an existing index, into an IndexSharded of "
+    "contiguous shards saved separately, and compares its results with exact search."
+)
+parser.add_argument(
+    "--source_index_name",
+    action="store",
+    type=str,
+    default="dpr-nq-multi-hnsw",
+    help="Name of the index whose embeddings are sharded, if --embeddings_file is not "
+    "given. Its embeddings are exported to --embeddings_path first.",
+)
+parser.add_argument(
+    "--embeddings_file",
+    action="store",
+    type=str,
+    default=None,
+    help="Path to a .npy file of document embeddings, of shape (n_documents, dim). It is "
+    "memory-mapped.",
+)
+parser.add_argument(
+    "--embeddings_path",
+    action="store",
+    type=str,
+    default="data/nq/index/embeddings.npy",
+    help="Path to export the embeddings of the source index to.",
+)
+parser.add_argument(
+    "--output_dir",
+    action="store",
+    type=str,
+    default="data/nq/index/sharded",
+    help="Directory to save the shards and their manifest to.",
+)
+parser.add_argument(
+    "--shard_type",
+    action="store",
+    type=str,
+    default="hnsw",
+    choices=list(SHARD_TYPES),
+    help="Type of index of each shard.",
+)
+parser.add_argument(
+    "--n_shards",
+    action="store",
+    type=int,
+    default=4,
+    help="Number of shards.",
+)
+parser.add_argument(
+    "--chunk_size",
+    action="store",
+    type=int,
+    default=100000,
+    help="Number of embeddings read at a time.",
+)
+parser.add_argument(
+    "--num_queries",
+    action="store",
+    type=int,
+    default=100,
+    help="Number of queries used to report recall. They are perturbed document embeddings.",
+)
+parser.add_argument(
+    "--k",
+    action="store",
+    type=int,
+    default=10,
+    help="Number of documents retrieved per query when reporting recall.",
+)
+parser.add_argument(
+    "--seed",
+    action="store",
+    type=int,
+    default=0,
+    help="Seed for RNG.",
+)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(os.path.basename(__file__))
+    log_commandline_args(args, logger.info)
+
+    embeddings_path = args.embeddings_file
+    if embeddings_path is None:
+        embeddings_path = args.embeddings_path
+        if os.path.exists(embeddings_path):
+            logger.info(f"Using the embeddings exported to {embeddings_path}.")
+        else:
+            os.makedirs(os.path.dirname(embeddings_path) or ".", exist_ok=True)
+            export_embeddings(load_index(args.source_index_name), embeddings_path, args.chunk_size)
+            logger.info(f"Exported the embeddings to {embeddings_path}.")
+    embeddings = np.load(embeddings_path, mmap_mode="r")
+
+    index_cls, kwargs = SHARD_TYPES[args.shard_type]
+    if index_cls is not IndexFaissFlatIP:
+        kwargs = dict(kwargs, chunk_size=args.chunk_size)
+    start = time.time()
+    index = IndexSharded.from_embeddings(embeddings, args.n_shards, index_cls=index_cls, **kwargs)
+    logger.info(
+        f"Built {args.n_shards} shards of {len(index)} documents in {time.time() - start:.1f}s."
+    )
+    index.save(args.output_dir)
+    logger.info(f"Saved the shards to {args.output_dir}.")
+
+    rng = np.random.default_rng(args.seed)
+    sample = embeddings[np.sort(rng.choice(len(embeddings), size=args.num_queries, replace=False))]
+    queries = (sample + rng.normal(scale=sample.std(), size=sample.shape)).astype(np.float32)
+    exact = np.argsort(-(queries @ np.asarray(embeddings).T), axis=1)[:, : args.k]
+
+    loaded = IndexSharded.load(args.output_dir)
+    start = time.time()
+    indices = loaded.search(queries, k=args.k)["indices"]
+    latency = (time.time() - start) / args.num_queries * 1000
+    recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(indices, exact)])
+    logger.info(f"Recall@{args.k}: {recall:.3f}, {latency:.2f} ms per query.")
@@ -0,0 +1,93 @@
+import argparse
+import logging
+import os
+import signal
+import threading
+
+from instruct_qa.collections.utils import load_collection
+from instruct_qa.experiment_utils import log_commandline_args
+
+parser = argparse.ArgumentParser(
+    description="Loads a document collection once and publishes it in shared memory, "
+    "so that other processes on the host can attach to it with "
+    "--document_shared_memory_name instead of loading their own copy."
+)
+parser.add_argument(
+    "--document_collection_name",
+    action="store",
+    type=str,
+    default="dpr_wiki_collection",
+    help="Document collection to publish.",
+)
+parser.add_argument(
+    "--document_cache_dir",
+    action="store",
+    type=str,
+    default=None,
+    help="Directory that document collection is cached in.",
+)
+parser.add_argument(
+    "--document_file_name",
+    action="store",
+    type=str,
+    default=None,
+    help="Basename of the path to the file containing the document collection.",
+)
+parser.add_argument(
+    "--document_storage",
+    action="store",
+    type=str,
+    default="mmap",
+    help="How the document collection holds passages while it is loaded.",
+)
+parser.add_argument(
+    "--document_snapshot_dir",
+    action="store",
+    type=str,
+    default=None,
+    help="Directory of processed document collection snapshots, reused across runs.",
+)
+parser.add_argument(
+    "--shared_memory_name",
+    action="store",
+    type=str,
+    default=None,
+    help="Name of the shared memory segment. Defaults to the collection name.",
+)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(os.path.basename(__file__))
+    log_commandline_args(args, logger.info)
+
+    kwargs = {"storage": args.document_storage}
+    if args.document_cache_dir is not None:
+        kwargs["cachedir"] = args.document_cache_dir
+    if args.document_file_name is not None:
+        kwargs["file_name"] = args.document_file_name
+    if args.document_snapshot_dir is not None:
+        kwargs["snapshot_dir"] = args.document_snapshot_dir
+
+    logger.info("Loading document collection...")
+    collection = load_collection(args.document_collection_name, **kwargs)
+
+    shm_name = args.shared_memory_name or args.document_collection_name
+    segment = collection.publish_shared_memory(shm_name)
+    del collection
+    logger.info(
+        f"Published {segment.size / 2**30:.2f} GiB as shared memory segment '{shm_name}'. "
+        "Press Ctrl+C to remove it."
+    )
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        stop.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        segment.close()
+        segment.unlink()
+        logger.info(f"Removed shared memory segment '{shm_name}'.")
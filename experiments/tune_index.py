@@ -0,0 +1,154 @@
+import argparse
+import json
+import logging
+import os
+
+import numpy as np
+
+from instruct_qa.experiment_utils import log_commandline_args
+from instruct_qa.retrieval.benchmark import make_queries
+from instruct_qa.retrieval.index import save_search_params
+from instruct_qa.retrieval.tuning import tune_search_param
+from instruct_qa.retrieval.utils import INDEX_NAME_TO_PATH_URL, load_index
+
+parser = argparse.ArgumentParser(
+    description="Tunes the search parameter of an approximate index (ef_search of HNSW "
+    "indexes, nprobe of IVF-PQ indexes) to a target recall@k or a latency objective, and "
+    "saves it next to the index file, where load_index applies it."
+)
+parser.add_argument(
+    "--index_name",
+    action="store",
+    type=str,
+    required=True,
+    help="Name of the index, which selects its type (see load_index).",
+)
+parser.add_argument(
+    "--index_path",
+    action="store",
+    type=str,
+    default=None,
+    help="Path to the index. Defaults to the path of the index name.",
+)
+parser.add_argument(
+    "--queries_file",
+    action="store",
+    type=str,
+    default=None,
+    help="Optional .npy file of held-out query embeddings, e.g. encoded questions of a "
+    "development set. If not given, queries are perturbed embeddings of sampled documents.",
+)
+parser.add_argument(
+    "--embeddings_file",
+    action="store",
+    type=str,
+    default=None,
+    help="Optional .npy file of the exact embeddings of the documents, to compute exact "
+    "search results from. Defaults to reading them from the index.",
+)
+parser.add_argument(
+    "--num_queries",
+    action="store",
+    type=int,
+    default=1000,
+    help="Number of queries used for tuning.",
+)
+parser.add_argument(
+    "--k",
+    action="store",
+    type=int,
+    default=10,
+    help="Number of documents retrieved per query.",
+)
+parser.add_argument(
+    "--target_recall",
+    action="store",
+    type=float,
+    default=None,
+    help="Recall@k to reach against exact search.",
+)
+parser.add_argument(
+    "--max_latency_ms",
+    action="store",
+    type=float,
+    default=None,
+    help="Latency objective of a search of --batch_size queries, in milliseconds.",
+)
+parser.add_argument(
+    "--latency_stat",
+    action="store",
+    type=str,
+    default="p99_ms",
+    choices=["p50_ms", "p99_ms"],
+    help="Latency statistic compared to --max_latency_ms.",
+)
+parser.add_argument(
+    "--batch_size",
+    action="store",
+    type=int,
+    default=1,
+    help="Number of queries searched at a time when measuring latency.",
+)
+parser.add_argument(
+    "--low",
+    action="store",
+    type=int,
+    default=None,
+    help="Smallest value of the search parameter tried.",
+)
+parser.add_argument(
+    "--high",
+    action="store",
+    type=int,
+    default=None,
+    help="Largest value of the search parameter tried.",
+)
+parser.add_argument(
+    "--seed",
+    action="store",
+    type=int,
+    default=0,
+    help="Seed for RNG.",
+)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(os.path.basename(__file__))
+    log_commandline_args(args, logger.info)
+
+    index_path = args.index_path or INDEX_NAME_TO_PATH_URL[args.index_name]["path"]
+    index = load_index(args.index_name, index_path=index_path)
+    if index.search_param is None:
+        raise ValueError(f"{type(index).__name__} has no search parameter to tune.")
+
+    rng = np.random.default_rng(args.seed)
+    if args.queries_file is not None:
+        queries = np.load(args.queries_file)
+        if len(queries) > args.num_queries:
+            queries = queries[np.sort(rng.choice(len(queries), args.num_queries, replace=False))]
+    else:
+        rows = np.sort(rng.choice(len(index), size=args.num_queries, replace=False))
+        sample = np.concatenate([index.get_embeddings(i, i + 1) for i in rows])
+        queries = make_queries(sample, len(sample), seed=args.seed)
+
+    embeddings = None
+    if args.embeddings_file is not None:
+        embeddings = np.load(args.embeddings_file, mmap_mode="r")
+    params = tune_search_param(
+        index,
+        queries,
+        k=args.k,
+        target_recall=args.target_recall,
+        max_latency_ms=args.max_latency_ms,
+        latency_stat=args.latency_stat,
+        batch_size=args.batch_size,
+        embeddings=embeddings,
+        low=args.low,
+        high=args.high,
+    )
+    logger.info(json.dumps({key: value for key, value in params.items() if key != "trials"}))
+
+    save_search_params(index_path, params)
+    logger.info(f"Saved {index.search_param}={params[index.search_param]} next to {index_path}.")
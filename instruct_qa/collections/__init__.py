@@ -1,28 +1,504 @@
+import atexit
+import os
+import sys
+import tempfile
+import weakref
 from dataclasses import dataclass
-from typing import List, Dict
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from instruct_qa.segments import check_segment_start, get_segment_path, list_segments
+
+from .id_index import IdIndex
+from .passage_store import (
+    COMPRESSION_CODECS,
+    DICT_FIELDS,
+    PASSAGE_FIELDS,
+    STORE_SUFFIX,
+    ChainedPassages,
+    ColumnarPassages,
+    PassageStore,
+    write_passage_store,
+)
+from .snapshot import get_snapshot_path
 
 class PassageCollection(object):
-    def __init__(self, name, **kwargs):
+    storage_types = ("memory", "columnar", "mmap") + tuple(COMPRESSION_CODECS)
+    # Storage types backed by a memory-mapped snapshot.
+    mapped_storage_types = ("mmap",) + tuple(COMPRESSION_CODECS)
+    # Fields shared by the passages of an article, which are dictionary-encoded with
+    # "columnar" and "mmap" storage, and interned with "memory" storage.
+    dict_fields = DICT_FIELDS
+    # Number of passages per compressed block, and of decompressed blocks cached, for
+    # compressed storage.
+    compression_block_size = 64
+    compression_cache_blocks = 1024
+    # The background warm-up started with `start_warmup`, if any.
+    warmup = None
+    # The shared memory segment of a collection attached with `from_shared_memory`.
+    _shared_memory = None
+
+    def __init__(self, name, storage="memory", snapshot_dir=None, **kwargs):
+        """
+        Parameters
+        ----------
+        name: str
+            The name of the collection.
+
+        storage: str
+            How passages are held in memory. With "memory", `passages` is a list of
+            dicts. With "columnar", it is a `ColumnarPassages` container that keeps
+            each field in a compact array and only builds dicts on access. With
+            "mmap", it is a `PassageStore` memory-mapping a snapshot of the
+            collection, which is created on the first load (see `snapshot_dir`).
+            With "zlib" or "lzma", it is the same, except that the passage text is
+            compressed in blocks of `compression_block_size` passages with that
+            codec. Blocks are decompressed on access and cached, see `PassageStore`
+            (e.g. `passages.cache_info()` for the cache hit and miss counts).
+
+        snapshot_dir: str
+            If given, the processed collection is saved to a snapshot in this
+            directory after it is first loaded, and restored from it on later loads
+            without parsing the source files again. Snapshots are keyed on the source
+            files and the loader options (see `instruct_qa.collections.snapshot`).
+            With memory-mapped storage, snapshots default to the directory of the
+            source file.
+        """
+        if storage not in self.storage_types:
+            raise ValueError(
+                f"Unknown storage {storage}. Use one of {', '.join(self.storage_types)}."
+            )
         self.name = name
-        self.passages = []
+        self.storage = storage
+        self.snapshot_dir = snapshot_dir
+        self.passages = [] if storage == "memory" else ColumnarPassages(dict_fields=self.dict_fields)
+        self._id_to_index = IdIndex()
 
     def load_data(self, path_to_file: str):
         raise NotImplementedError
 
     def get_passage_from_id(self, id: str) -> Dict[str, str]:
-        raise NotImplementedError
+        index = self._id_to_index[id]
+        passage = self.passages[index]
+        assert passage["index"] == index
+        return passage
 
     def get_passages_from_indices(self, indices: List[int]) -> List[Dict[str, str]]:
         return [self.passages[i] for i in indices]
 
     def get_all_passages(self) -> List[Dict[str, str]]:
-        return self.passages
+        if isinstance(self.passages, list):
+            return self.passages
+        return list(self.passages)
 
     def get_indices_from_ids(self, ids: List[str]) -> List[int]:
-        raise NotImplementedError
+        return self._id_to_index.get_indices(ids).tolist()
 
     def passage_to_string(self, passage: Dict[str, str]) -> str:
         return passage["text"]
 
     def get_name(self) -> str:
         return self.name
+
+    def get_field_codes(self, field: str = "title") -> Tuple[np.ndarray, List[str]]:
+        """
+        Dictionary-encode a passage field, e.g. to group passages by article.
+
+        Parameters
+        ----------
+        field: str
+            The field to encode, usually "title" or "sub_title".
+
+        Returns
+        -------
+        tuple
+            An int32 array holding a code per passage, and the list of unique values
+            indexed by code, in order of first appearance. For fields in
+            `dict_fields`, both come straight from the columnar or memory-mapped
+            storage, without decoding passages.
+        """
+        if not isinstance(self.passages, list) and self.passages.field_types[field] == "dict":
+            return self.passages.get_codes(field), self.passages.get_table(field)
+
+        lookup = {}
+        codes = np.fromiter(
+            (lookup.setdefault(value, len(lookup)) for value in self._iter_field(field)),
+            dtype=np.int32,
+            count=len(self.passages),
+        )
+        return codes, list(lookup)
+
+    def get_indices_by_title(self, field: str = "title") -> Dict[str, np.ndarray]:
+        """
+        Group passages by the value of a field, by default by article title.
+
+        Returns
+        -------
+        dict
+            The indices of the passages with each value, in increasing order.
+        """
+        codes, table = self.get_field_codes(field)
+        order = np.argsort(codes, kind="stable")
+        splits = np.cumsum(np.bincount(codes, minlength=len(table)))[:-1]
+        return dict(zip(table, np.split(order, splits)))
+
+    def add_passages(self, passages: Iterable[Dict[str, str]]) -> range:
+        """
+        Append passages to the collection, e.g. for an incremental corpus refresh.
+
+        Read-only storages (memory-mapped stores, Arrow tables) are not modified: the
+        new passages are held in memory after them (see `ChainedPassages`). Persist
+        them with `save_segment`.
+
+        Parameters
+        ----------
+        passages: iterable of dicts
+            The passages to append, with the "id", "text", "title" and "sub_title"
+            keys. Their ids must not be in the collection yet.
+
+        Returns
+        -------
+        range
+            The indices of the new passages.
+        """
+        start_ix = len(self.passages)
+        if not isinstance(self.passages, (list, ColumnarPassages, ChainedPassages)):
+            self.passages = ChainedPassages([self.passages], dict_fields=self.dict_fields)
+
+        for passage in passages:
+            passage = {f: passage[f] for f in PASSAGE_FIELDS}
+            if isinstance(self.passages, list):
+                passage["index"] = len(self.passages)
+            self.passages.append(passage)
+            self._id_to_index.add(passage["id"])
+        return range(start_ix, len(self.passages))
+
+    def save_segment(self, directory: str, start_ix: int) -> str:
+        """
+        Persist the passages from `start_ix` on (e.g. the first index returned by
+        `add_passages`) as a segment in `directory`, in the passage store format.
+        Segments are loaded back with `load_segments`, after the collection itself.
+
+        Returns
+        -------
+        str
+            The path of the segment.
+        """
+        os.makedirs(directory, exist_ok=True)
+        path = get_segment_path(directory, start_ix, STORE_SUFFIX)
+        write_passage_store(
+            (self.passages[i] for i in range(start_ix, len(self.passages))),
+            path,
+            metadata={"name": self.name},
+            dict_fields=self.dict_fields,
+        )
+        return path
+
+    def load_segments(self, directory: str):
+        """
+        Append the segments saved in `directory` with `save_segment`, in order. With
+        memory-mapped storage, segments are memory-mapped as well; otherwise they are
+        copied into `passages`.
+        """
+        for start_ix, path in list_segments(directory, STORE_SUFFIX):
+            check_segment_start(start_ix, len(self.passages), path)
+            store = PassageStore.open(path, cache_blocks=self.compression_cache_blocks)
+            if self.storage in self.mapped_storage_types:
+                if not isinstance(self.passages, ChainedPassages):
+                    self.passages = ChainedPassages([self.passages], dict_fields=self.dict_fields)
+                self.passages.segments.append(store)
+                for id in store.iter_field("id"):
+                    self._id_to_index.add(id)
+            else:
+                self.add_passages(store)
+                store.close()
+
+    def start_warmup(self):
+        """
+        Start reading the memory-mapped passages of the collection into memory in a
+        background thread, see `instruct_qa.warmup.Warmup`. Passages can be read
+        meanwhile; once `warmup.ready` is set, reads no longer wait on the disk.
+        Collections held in memory are ready at once.
+
+        Returns
+        -------
+        instruct_qa.warmup.Warmup
+            The warm-up, also set as the `warmup` attribute of the collection.
+        """
+        from instruct_qa.warmup import Warmup
+
+        self.warmup = Warmup(files=self._get_mapped_files(), buffers=self._get_mapped_buffers())
+        return self.warmup.start()
+
+    def _get_mapped_buffers(self) -> List:
+        """
+        The memory maps of the passage stores of the collection and its segments.
+        """
+        segments = [self.passages]
+        if isinstance(self.passages, ChainedPassages):
+            segments = self.passages.segments
+        return [
+            segment.mmap_obj
+            for segment in segments
+            if isinstance(segment, PassageStore) and segment.mmap_obj is not None
+        ]
+
+    def _get_mapped_files(self) -> List[str]:
+        """
+        The files that passages are memory-mapped from other than passage stores.
+        """
+        return []
+
+    @staticmethod
+    def merge_segments(directory: str) -> str:
+        """
+        Merge the segments saved in `directory` into a single segment, to keep the
+        number of files and memory maps low after many incremental updates.
+
+        Returns
+        -------
+        str
+            The path of the merged segment, or None if there are no segments.
+        """
+        segments = list_segments(directory, STORE_SUFFIX)
+        if len(segments) < 2:
+            return segments[0][1] if segments else None
+
+        stores = [PassageStore.open(path) for _, path in segments]
+        size = segments[0][0]
+        for (start_ix, path), store in zip(segments, stores):
+            check_segment_start(start_ix, size, path)
+            size += len(store)
+
+        first = stores[0]
+        dict_fields = [f for f in first.fields if first.field_types[f] == "dict"]
+        # The merged segment replaces the first one, which stays readable until closed.
+        write_passage_store(
+            (passage for store in stores for passage in store),
+            segments[0][1],
+            metadata=first.metadata,
+            fields=first.fields,
+            dict_fields=dict_fields,
+        )
+        for store in stores:
+            store.close()
+        for _, path in segments[1:]:
+            os.remove(path)
+        return segments[0][1]
+
+    def publish_shared_memory(self, shm_name: str = None):
+        """
+        Publish the processed collection in a shared memory segment, in the passage
+        store format, so that other processes on the host can attach to it with
+        `from_shared_memory` instead of loading their own copy.
+
+        Parameters
+        ----------
+        shm_name: str
+            The name of the segment. If None, a unique name is generated; it can be
+            read from the `name` attribute of the returned segment.
+
+        Returns
+        -------
+        multiprocessing.shared_memory.SharedMemory
+            The segment. The caller owns it: it must be kept alive while other
+            processes use the collection, then closed and unlinked.
+        """
+        # Shared memory is only available from Python 3.8.
+        from .shared import copy_file_to_shared_memory, copy_to_shared_memory
+
+        if isinstance(self.passages, PassageStore):
+            # Memory-mapped collections are already backed by a snapshot.
+            return copy_to_shared_memory(self.passages.buffer, name=shm_name)
+
+        with tempfile.TemporaryDirectory(dir=self.snapshot_dir) as tmpdir:
+            path = os.path.join(tmpdir, "collection.store")
+            self._write_snapshot(path, self.passages)
+            return copy_file_to_shared_memory(path, name=shm_name)
+
+    @classmethod
+    def from_shared_memory(cls, shm_name: str) -> "PassageCollection":
+        """
+        Attach to a collection published with `publish_shared_memory`, possibly by
+        another process. Passages are read in place, through a read-only view of the
+        segment, so all attached processes share a single copy of the collection.
+
+        The collection must be attached with the class that published it, to restore
+        the loader state (e.g. `HotpotWikiCollection.title_to_id`). Attributes that
+        only configure parsing (e.g. column indices) are not set.
+
+        The collection is detached from the segment with `close`, which is called
+        when it is garbage collected, or when the interpreter exits.
+        """
+        from .shared import attach_shared_memory
+
+        segment = attach_shared_memory(shm_name)
+        store = PassageStore(segment.buf.toreadonly(), cache_blocks=cls.compression_cache_blocks)
+        collection = cls.__new__(cls)
+        PassageCollection.__init__(
+            collection, store.metadata.get("name", cls.__name__), storage="mmap"
+        )
+        collection._shared_memory = segment
+        collection._restore_store(store)
+        atexit.register(_close_collection, weakref.ref(collection))
+        return collection
+
+    def close(self):
+        """
+        Release the passage stores the collection reads passages from, and detach
+        from the shared memory segment of a collection attached with
+        `from_shared_memory`. The collection can no longer be read afterwards.
+        """
+        segments = [self.passages]
+        if isinstance(self.passages, ChainedPassages):
+            segments = self.passages.segments
+        # Ids may be views of a store, which cannot be released while they exist.
+        self._id_to_index = IdIndex()
+        self.passages = []
+        for segment in segments:
+            if isinstance(segment, PassageStore):
+                segment.close()
+        if self._shared_memory is not None:
+            shared_memory, self._shared_memory = self._shared_memory, None
+            shared_memory.close()
+
+    def __del__(self):
+        # Segments cannot be closed while views of them exist, so views are released
+        # first, before the segment is garbage collected.
+        if self._shared_memory is not None:
+            self.close()
+
+    def _get_loader_options(self) -> Dict:
+        """
+        The options that change how source files are processed, used to key snapshots.
+        """
+        return {}
+
+    def _get_snapshot_state(self) -> Dict:
+        """
+        JSON-serializable loader state to save in snapshots, besides passages and ids.
+        """
+        return {}
+
+    def _set_snapshot_state(self, state: Dict):
+        """
+        Restore the output of `_get_snapshot_state`. Passages are restored first.
+        """
+        pass
+
+    def _iter_field(self, field: str) -> Iterator[str]:
+        if isinstance(self.passages, list):
+            return (passage[field] for passage in self.passages)
+        return self.passages.iter_field(field)
+
+    def _load_cached(
+        self,
+        source_paths: List[str],
+        parse: Callable[[], None],
+        iter_passages: Callable[[], Iterator[Dict[str, str]]] = None,
+    ):
+        """
+        Fill the collection by calling `parse`, going through the snapshot cache if
+        `snapshot_dir` is set or the storage is memory-mapped.
+
+        When a snapshot exists, it is restored and `parse` is not called. Otherwise,
+        `parse` fills `passages` and `_id_to_index`, and a snapshot is written. For
+        memory-mapped storage, `iter_passages` can be given to stream passages
+        straight into the snapshot instead; it must add each id to `_id_to_index` as
+        it goes.
+        """
+        mapped = self.storage in self.mapped_storage_types
+        snapshot_dir = self.snapshot_dir
+        if snapshot_dir is None:
+            if not mapped:
+                parse()
+                return
+            if not source_paths:
+                raise ValueError(
+                    f"{type(self).__name__} has no source file to store the snapshot "
+                    f'next to: snapshot_dir is required with storage="{self.storage}".'
+                )
+            snapshot_dir = os.path.dirname(source_paths[0])
+
+        options = self._get_loader_options()
+        compression = self._get_compression()
+        if compression is not None:
+            options = {**options, "compression": compression}
+        path = get_snapshot_path(snapshot_dir, type(self).__name__, source_paths, options)
+        if not os.path.exists(path):
+            if mapped and iter_passages is not None:
+                self._write_snapshot(path, iter_passages())
+            else:
+                parse()
+                self._write_snapshot(path, self.passages)
+                if not mapped:
+                    return
+        self._restore_snapshot(path)
+
+    def _get_compression(self) -> Dict:
+        if self.storage not in COMPRESSION_CODECS:
+            return None
+        return {"codec": self.storage, "block_size": self.compression_block_size}
+
+    def _write_snapshot(self, path: str, passages):
+        metadata = {}
+        arrays = {}
+
+        def iter_passages():
+            yield from passages
+            # Passages may be streamed from the parser, so only read the loader state
+            # once they are exhausted.
+            id_index_state, id_index_arrays = self._id_to_index.get_state()
+            metadata["name"] = self.name
+            metadata["id_index"] = id_index_state
+            metadata["state"] = self._get_snapshot_state()
+            arrays.update({f"id_index.{k}": v for k, v in id_index_arrays.items()})
+
+        write_passage_store(
+            iter_passages(),
+            path,
+            metadata,
+            arrays,
+            dict_fields=self.dict_fields,
+            compression=self.storage if self.storage in COMPRESSION_CODECS else None,
+            block_size=self.compression_block_size,
+        )
+
+    def _restore_snapshot(self, path: str):
+        self._restore_store(PassageStore.open(path, cache_blocks=self.compression_cache_blocks))
+
+    def _restore_store(self, store: PassageStore):
+        id_index_arrays = {
+            name[len("id_index.") :]: values
+            for name, values in store.arrays.items()
+            if name.startswith("id_index.")
+        }
+
+        if self.storage in self.mapped_storage_types:
+            self.passages = store
+        else:
+            # Copy out of the store so that it can be closed.
+            id_index_arrays = {k: np.array(v) for k, v in id_index_arrays.items()}
+            if self.storage == "columnar":
+                self.passages = ColumnarPassages.from_store(store)
+            else:
+                self.passages = list(store)
+                # Share one string per unique value, as in the columnar storage.
+                dict_fields = [f for f in self.dict_fields if f in store.fields]
+                for passage in self.passages:
+                    for f in dict_fields:
+                        passage[f] = sys.intern(passage[f])
+
+        self._id_to_index = IdIndex.from_state(
+            store.metadata["id_index"], id_index_arrays, ids=self._iter_field("id")
+        )
+        self._set_snapshot_state(store.metadata["state"])
+        if self.storage not in self.mapped_storage_types:
+            store.close()
+
+
+def _close_collection(ref):
+    collection = ref()
+    if collection is not None:
+        collection.close()
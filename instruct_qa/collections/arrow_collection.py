@@ -0,0 +1,261 @@
+import os
+from typing import Dict, Iterator, List
+
+import numpy as np
+
+from . import PassageCollection
+from .id_index import IdIndex
+from .passage_store import PASSAGE_FIELDS
+
+_BATCH_SIZE = 1 << 14
+
+
+def resolve_columns(column_names: List[str], columns: Dict[str, str] = None) -> Dict[str, str]:
+    """
+    Map each passage field to a column of a table.
+
+    Parameters
+    ----------
+    column_names: list of strings
+        The columns of the table.
+
+    columns: dict
+        The column of each passage field, or None for fields without a column. Fields
+        that are not given are mapped to the column of the same name, if any.
+
+    Returns
+    -------
+    dict
+        The column of each field in `PASSAGE_FIELDS`, or None.
+    """
+    columns = dict(columns or {})
+    for field in PASSAGE_FIELDS:
+        if field not in columns:
+            columns[field] = field if field in column_names else None
+    missing = [c for c in columns.values() if c is not None and c not in column_names]
+    if missing:
+        raise ValueError(f"Columns {', '.join(missing)} not found in table.")
+    if columns["text"] is None:
+        raise ValueError("No column holds the passage text.")
+    return columns
+
+
+class ArrowPassages(object):
+    """
+    Read-only view of passages over the columns of a `pyarrow.Table`.
+
+    Only the columns mapped to passage fields are kept, without copy, so a
+    memory-mapped table (e.g. a `datasets` split or a Parquet file read with
+    `memory_map=True`) stays on disk until passages are accessed. Fields without a
+    column are empty strings, except for the id, which is then the row number.
+    Batches of passages are fetched with a single `take`. It behaves like the list of
+    passage dicts used by `PassageCollection`.
+    """
+
+    def __init__(self, table, columns: Dict[str, str], id_prefix: str = ""):
+        """
+        Parameters
+        ----------
+        table: pyarrow.Table
+            The table holding the passages, one per row.
+
+        columns: dict
+            The column of each passage field, or None (see `resolve_columns`).
+
+        id_prefix: str
+            If given, ids are this prefix followed by the value of the id column.
+        """
+        self.fields = PASSAGE_FIELDS
+        self.columns = columns
+        self.id_prefix = id_prefix
+        self._table = table.select(
+            list(dict.fromkeys(c for c in columns.values() if c is not None))
+        )
+
+    @property
+    def field_types(self) -> Dict[str, str]:
+        """
+        The type of each field ("str" or "int"), as in `PassageStore`.
+        """
+        import pyarrow as pa
+
+        field_types = {}
+        for field in self.fields:
+            column = self.columns[field]
+            if column is None:
+                field_types[field] = "int" if field == "id" else "str"
+            elif field == "id" and self.id_prefix:
+                field_types[field] = "str"
+            else:
+                is_int = pa.types.is_integer(self._table.schema.field(column).type)
+                field_types[field] = "int" if is_int else "str"
+        return field_types
+
+    def __len__(self):
+        return self._table.num_rows
+
+    def __getitem__(self, index: int) -> Dict[str, str]:
+        index = self._check_index(index)
+        row = self._table.slice(index, 1).to_pylist()[0]
+        return self._to_passage(row, index)
+
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        index = 0
+        for batch in self._table.to_batches(max_chunksize=_BATCH_SIZE):
+            for row in batch.to_pylist():
+                yield self._to_passage(row, index)
+                index += 1
+
+    def take(self, indices: List[int]) -> List[Dict[str, str]]:
+        """
+        Fetch the passages at the given indices with a single `take` on the table.
+        """
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        indices = np.where(indices < 0, indices + len(self), indices)
+        if ((indices < 0) | (indices >= len(self))).any():
+            raise IndexError("passage index out of range")
+        rows = self._table.take(indices).to_pylist()
+        return [self._to_passage(row, index) for row, index in zip(rows, indices.tolist())]
+
+    def get_field(self, field: str, index: int) -> str:
+        return self[index][field]
+
+    def iter_field(self, field: str) -> Iterator[str]:
+        column = self.columns[field]
+        if column is None:
+            if field == "id":
+                yield from range(len(self))
+            else:
+                yield from ("" for _ in range(len(self)))
+            return
+        for chunk in self._table.column(column).chunks:
+            for value in chunk.to_pylist():
+                yield self._to_value(field, value)
+
+    def _check_index(self, index: int) -> int:
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("passage index out of range")
+        return index
+
+    def _to_value(self, field: str, value):
+        if field == "id" and self.id_prefix:
+            return self.id_prefix + str(value)
+        return value
+
+    def _to_passage(self, row: Dict, index: int) -> Dict[str, str]:
+        passage = {}
+        for field in self.fields:
+            column = self.columns[field]
+            if column is None:
+                passage[field] = index if field == "id" else ""
+            else:
+                passage[field] = self._to_value(field, row[column])
+        passage["index"] = index
+        return passage
+
+
+class ArrowCollection(PassageCollection):
+    """
+    Collection of passages stored in an Arrow table, e.g. a local Parquet file.
+
+    With the default "arrow" storage, the table is memory-mapped and wrapped in
+    `ArrowPassages`, so passages are read from it on access and nothing is copied at
+    load time but the ids. Other storages copy the passages, see `PassageCollection`.
+    """
+
+    storage_types = ("arrow",) + PassageCollection.storage_types
+
+    def __init__(
+        self,
+        name: str = "arrow_collection",
+        file_name: str = None,
+        cachedir: str = None,
+        columns: Dict[str, str] = None,
+        id_prefix: str = "",
+        storage: str = "arrow",
+        snapshot_dir: str = None,
+    ):
+        """
+        Parameters
+        ----------
+        file_name: str
+            The Parquet file holding the passages, relative to `cachedir` if given.
+
+        columns: dict
+            The column of each passage field ("id", "text", "title" and
+            "sub_title"), or None for fields without a column. By default, fields are
+            read from the columns of the same name. See `resolve_columns`.
+
+        id_prefix: str
+            If given, ids are this prefix followed by the value of the id column.
+
+        storage: str
+            How passages are held, either "arrow" or one of the storages of
+            `PassageCollection`.
+
+        snapshot_dir: str
+            The directory of the snapshot cache, see `PassageCollection`. It is not
+            used with "arrow" storage.
+        """
+        super().__init__(name, storage=storage, snapshot_dir=snapshot_dir)
+        self.columns = columns
+        self.id_prefix = id_prefix
+        self._path = None
+        if file_name is not None:
+            path = file_name if cachedir is None else os.path.join(cachedir, file_name)
+            self.load_data(path)
+
+    def load_data(self, path_to_file: str):
+        import pyarrow.parquet as pq
+
+        self.columns = resolve_columns(pq.read_schema(path_to_file).names, self.columns)
+        # Only read the columns of passage fields.
+        table = pq.read_table(
+            path_to_file,
+            columns=list(dict.fromkeys(c for c in self.columns.values() if c is not None)),
+            memory_map=True,
+        )
+        self._path = path_to_file
+        self._load_table(table, [path_to_file])
+
+    def get_passages_from_indices(self, indices: List[int]) -> List[Dict[str, str]]:
+        if isinstance(self.passages, ArrowPassages):
+            return self.passages.take(indices)
+        return super().get_passages_from_indices(indices)
+
+    def _load_table(self, table, source_paths: List[str]):
+        """
+        Fill the collection from a table whose columns match `self.columns`.
+        """
+        passages = ArrowPassages(table, self.columns, self.id_prefix)
+        self._id_to_index = IdIndex(
+            prefix=self.id_prefix, int_ids=passages.field_types["id"] == "int"
+        )
+        if self.storage == "arrow":
+            self.passages = passages
+            for id in passages.iter_field("id"):
+                self._id_to_index.add(id)
+            return
+
+        def parse():
+            for passage in passages:
+                self.passages.append(passage)
+                self._id_to_index.add(passage["id"])
+
+        def iter_passages():
+            for passage in passages:
+                self._id_to_index.add(passage["id"])
+                yield passage
+
+        self._load_cached(source_paths, parse, iter_passages)
+
+    def _get_loader_options(self) -> Dict:
+        return {"columns": self.columns, "id_prefix": self.id_prefix}
+
+    def _get_mapped_files(self) -> List[str]:
+        if isinstance(self.passages, ArrowPassages) and self._path is not None:
+            return [self._path]
+        return []
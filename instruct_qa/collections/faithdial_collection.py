@@ -1,18 +1,35 @@
 from datasets import load_dataset
-from typing import List, Dict
+from typing import Dict
 
-from . import PassageCollection
+from .arrow_collection import ArrowCollection, resolve_columns
 
 
-class FaithDialCollection(PassageCollection):
+class FaithDialCollection(ArrowCollection):
     def __init__(
         self,
         name: str = "faithdial_wiki",
         file_name: str = None,
         cachedir: str = None,
+        storage: str = "arrow",
+        snapshot_dir: str = None,
     ):
-        super().__init__(name)
-        self._id_to_index = {}
+        """
+        Parameters
+        ----------
+        storage: str
+            How passages are held. With "arrow", passages are read on access from
+            the Arrow files in which `datasets` caches the split, without copy. See
+            `ArrowCollection`.
+
+        snapshot_dir: str
+            The directory of the snapshot cache, see `PassageCollection`.
+        """
+        super().__init__(
+            name,
+            columns={"id": None, "text": "knowledge", "title": None, "sub_title": None},
+            storage=storage,
+            snapshot_dir=snapshot_dir,
+        )
         self.load_data()
 
     def load_data(self):
@@ -20,24 +37,15 @@ class FaithDialCollection(PassageCollection):
             "McGill-NLP/FaithDial",
             split="validation",
         )
+        # Passage ids are the row numbers, so the rows must be in dataset order.
+        if hf_dataset._indices is not None:
+            hf_dataset = hf_dataset.flatten_indices()
 
-        for id_, sample in enumerate(hf_dataset):
-            index = len(self.passages)
-            self.passages.append(
-                {
-                    "id": id_,
-                    "text": sample["knowledge"],
-                    "title": "",
-                    "sub_title": "",
-                    "index": index,
-                }
-            )
-            self._id_to_index[id_] = index
-
-    def get_passage_from_id(self, id: str) -> Dict[str, str]:
-        passage = self.passages[self._id_to_index[id]]
-        assert passage["index"] == self._id_to_index[id]
-        return passage
+        table = hf_dataset.data.table
+        self.columns = resolve_columns(table.column_names, self.columns)
+        # The dataset is cached by `datasets` as Arrow files, which serve as sources.
+        source_paths = [f["filename"] for f in hf_dataset.cache_files]
+        self._load_table(table, source_paths)
 
-    def get_indices_from_ids(self, ids: List[str]) -> List[int]:
-        return [self._id_to_index[id] for id in ids]
+    def _get_loader_options(self) -> Dict:
+        return {"path": "McGill-NLP/FaithDial", "split": "validation"}
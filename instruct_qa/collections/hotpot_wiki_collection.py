@@ -1,25 +1,31 @@
 import csv
-import json
 import os
-from typing import List, Dict
+from typing import Dict
 from tqdm import tqdm
 
 import instruct_qa.experiment_utils as utils
 
 from . import PassageCollection
+from .id_index import IdIndex
+from .json_stream import iter_json_object_items
 
 HOTPOT_QA_WIKI_DOWNLOAD_URL = "https://dl.fbaipublicfiles.com/mdpr/data/hotpot_index/wiki_id2doc.json"
 
 
 class HotpotWikiCollection(PassageCollection):
+    # Each article is a single passage, so titles are unique.
+    dict_fields = ("sub_title",)
+
     def __init__(
         self,
         name: str = "hotpot_wiki",
         file_name: str = "wiki_id2doc.json",
         cachedir: str = "data/hotpot_qa/collection",
+        storage: str = "memory",
+        snapshot_dir: str = None,
     ):
-        super().__init__(name)
-        self._id_to_index = {}
+        super().__init__(name, storage=storage, snapshot_dir=snapshot_dir)
+        self._id_to_index = IdIndex()
         self.title_to_id = {}
         self.load_data(os.path.join(cachedir, file_name))
 
@@ -28,10 +34,14 @@ class HotpotWikiCollection(PassageCollection):
         if not os.path.exists(path_to_file):
             utils.wget(HOTPOT_QA_WIKI_DOWNLOAD_URL, path_to_file)
 
-        print("Loading file...")
-        with open(path_to_file) as ifile:
-            data = json.load(ifile)
-        for id, doc in tqdm(data.items()):
+        self._load_cached([path_to_file], lambda: self._parse(path_to_file))
+
+    def _parse(self, path_to_file: str):
+        # Stream the members of the file instead of `json.load`-ing it, so that the
+        # parsed file and the collection are never both held in memory.
+        for id, doc in tqdm(
+            iter_json_object_items(path_to_file), desc="Loading Hotpot Wiki"
+        ):
             index = len(self.passages)
             self.passages.append(
                 {
@@ -42,14 +52,19 @@ class HotpotWikiCollection(PassageCollection):
                     "index": index,
                 }
             )
-            self._id_to_index[id] = index
+            self._id_to_index.add(id)
             assert doc["title"] not in self.title_to_id
             self.title_to_id[doc["title"]] = id
 
-    def get_passage_from_id(self, id: str) -> Dict[str, str]:
-        passage = self.passages[self._id_to_index[id]]
-        assert passage["index"] == self._id_to_index[id]
-        return passage
+    def add_passages(self, passages):
+        indices = super().add_passages(passages)
+        for passage in self.get_passages_from_indices(indices):
+            self.title_to_id[passage["title"]] = passage["id"]
+        return indices
+
+    def load_segments(self, directory: str):
+        super().load_segments(directory)
+        self._set_snapshot_state({})
 
-    def get_indices_from_ids(self, ids: List[str]) -> List[int]:
-        return [self._id_to_index[id] for id in ids]
+    def _set_snapshot_state(self, state: Dict):
+        self.title_to_id = dict(zip(self._iter_field("title"), self._iter_field("id")))
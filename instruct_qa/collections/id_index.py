@@ -0,0 +1,245 @@
+from array import array
+from typing import Dict, Iterable, List, Tuple, Union
+
+import numpy as np
+
+
+class IdIndex(object):
+    """
+    Maps passage ids to their index in a collection, without a dict entry per passage.
+
+    Ids are expected to be a fixed prefix followed by an integer (e.g. "wiki:12345"),
+    or plain integers when `int_ids` is True. Only the integer keys are kept:
+
+    - If the keys are dense and in order (key = start + index), lookups are a
+      subtraction, and nothing but `start` is stored.
+    - Otherwise, the keys are sorted into an int64 array and looked up with
+      `numpy.searchsorted`, with a second array mapping back to indices.
+
+    If an id does not follow the pattern, the index falls back to a plain dict.
+    Ids are added in collection order with `add`; the lookup structures are built
+    lazily on the first lookup after an addition. An id added several times maps to
+    its first occurrence, whatever the structure (the dict of ids that the index
+    replaces mapped it to its last occurrence).
+    """
+
+    def __init__(self, prefix: str = "", int_ids: bool = False):
+        """
+        Parameters
+        ----------
+        prefix: str
+            The prefix shared by all ids, e.g. "wiki:".
+
+        int_ids: bool
+            Whether ids are integers rather than strings.
+        """
+        self.prefix = prefix
+        self.int_ids = int_ids
+        self._size = 0
+        self._pending = array("q")
+        self._start = None
+        self._sorted_keys = None
+        self._order = None
+        self._mapping = None
+        # The ids of the mapping that were added again, by index.
+        self._duplicates = {}
+
+    def __len__(self):
+        return self._size + len(self._pending)
+
+    def add(self, id: Union[str, int]):
+        """
+        Add the id of the next passage of the collection.
+        """
+        if self._mapping is None:
+            try:
+                self._pending.append(self._parse(id))
+                return
+            except KeyError:
+                self._mapping = self._to_mapping()
+        if id in self._mapping:
+            self._duplicates[self._size] = id
+        else:
+            self._mapping[id] = self._size
+        self._size += 1
+
+    def get_state(self) -> Tuple[Dict, Dict[str, np.ndarray]]:
+        """
+        Describe the index for persistence.
+
+        Returns
+        -------
+        tuple
+            A JSON-serializable dict and a dict of numpy arrays, from which
+            `from_state` rebuilds the index.
+        """
+        state = {"prefix": self.prefix, "int_ids": self.int_ids}
+        if self._mapping is not None:
+            state["kind"] = "mapping"
+            return state, {}
+
+        self._build()
+        state["size"] = self._size
+        if self._start is not None:
+            state.update(kind="range", start=self._start)
+            return state, {}
+        state["kind"] = "sorted"
+        return state, {"sorted_keys": self._sorted_keys, "order": self._order}
+
+    @classmethod
+    def from_state(
+        cls,
+        state: Dict,
+        arrays: Dict[str, np.ndarray],
+        ids: Iterable[Union[str, int]] = None,
+    ) -> "IdIndex":
+        """
+        Rebuild an index from the output of `get_state`. The arrays are used as is,
+        so they can be memory-mapped. Indexes that fell back to a dict are rebuilt
+        from `ids`, the ids of the collection in order.
+        """
+        index = cls(prefix=state["prefix"], int_ids=state["int_ids"])
+        if state["kind"] == "mapping":
+            for id in ids:
+                index.add(id)
+        elif state["kind"] == "range":
+            index._start = state["start"]
+            index._size = state["size"]
+        else:
+            index._sorted_keys = arrays["sorted_keys"]
+            index._order = arrays["order"]
+            index._size = state["size"]
+        return index
+
+    def update(self, other: "IdIndex"):
+        """
+        Add the ids of another index, in order, as if each was passed to `add`.
+        """
+        if (
+            self._mapping is None
+            and other._mapping is None
+            and (self.prefix, self.int_ids) == (other.prefix, other.int_ids)
+        ):
+            other._build()
+            self._pending.frombytes(other._keys().tobytes())
+            return
+        for id in other._iter_ids():
+            self.add(id)
+
+    def __getitem__(self, id: Union[str, int]) -> int:
+        return int(self.get_indices([id])[0])
+
+    def __contains__(self, id: Union[str, int]) -> bool:
+        try:
+            self[id]
+        except KeyError:
+            return False
+        return True
+
+    def get_indices(self, ids: List[Union[str, int]]) -> np.ndarray:
+        """
+        Look up the indices of a batch of ids.
+
+        Parameters
+        ----------
+        ids: list of strings or ints
+            The ids to look up.
+
+        Returns
+        -------
+        numpy.ndarray
+            The int64 indices of the ids, in the same order. A KeyError is raised
+            if any id is not in the index.
+        """
+        if self._mapping is not None:
+            return np.array([self._mapping[id] for id in ids], dtype=np.int64)
+
+        self._build()
+        keys = np.fromiter((self._parse(id) for id in ids), dtype=np.int64, count=len(ids))
+
+        if self._start is not None:
+            indices = keys - self._start
+            missing = (indices < 0) | (indices >= self._size)
+        else:
+            positions = np.searchsorted(self._sorted_keys, keys)
+            positions = np.minimum(positions, max(self._size - 1, 0))
+            if self._size == 0:
+                missing = np.ones(len(keys), dtype=bool)
+                indices = positions
+            else:
+                missing = self._sorted_keys[positions] != keys
+                indices = self._order[positions]
+
+        if missing.any():
+            raise KeyError(ids[int(np.argmax(missing))])
+        return indices
+
+    def _parse(self, id: Union[str, int]) -> int:
+        if self.int_ids:
+            if isinstance(id, (int, np.integer)) and not isinstance(id, bool):
+                return int(id)
+            raise KeyError(id)
+        if not isinstance(id, str) or not id.startswith(self.prefix):
+            raise KeyError(id)
+        key = id[len(self.prefix) :]
+        # Reject keys that `int` would accept but that don't round-trip to the same
+        # id (e.g. "+1", " 1" or "01"), so that each key maps back to a single id.
+        if not key.isdigit() or (len(key) > 1 and key[0] == "0"):
+            raise KeyError(id)
+        return int(key)
+
+    def _format(self, key: int) -> Union[str, int]:
+        return key if self.int_ids else self.prefix + str(key)
+
+    def _iter_ids(self):
+        if self._mapping is not None:
+            ids = [None] * self._size
+            for id, index in self._mapping.items():
+                ids[index] = id
+            for index, id in self._duplicates.items():
+                ids[index] = id
+            yield from ids
+            return
+        self._build()
+        for key in self._keys().tolist():
+            yield self._format(key)
+
+    def _keys(self) -> np.ndarray:
+        # Keys of the passages already built into the lookup structures, in order.
+        if self._start is not None:
+            return np.arange(self._start, self._start + self._size, dtype=np.int64)
+        if self._sorted_keys is not None:
+            keys = np.empty(self._size, dtype=np.int64)
+            keys[self._order] = self._sorted_keys
+            return keys
+        return np.empty(0, dtype=np.int64)
+
+    def _build(self):
+        if len(self._pending) == 0 and (
+            self._start is not None or self._sorted_keys is not None
+        ):
+            return
+
+        keys = np.concatenate([self._keys(), np.asarray(self._pending, dtype=np.int64)])
+        self._pending = array("q")
+        self._size = len(keys)
+        self._start = self._sorted_keys = self._order = None
+
+        if self._size > 0 and np.all(np.diff(keys) == 1):
+            self._start = int(keys[0])
+        else:
+            # Stable, so that `searchsorted` finds duplicate keys at their first index.
+            self._order = np.argsort(keys, kind="stable")
+            self._sorted_keys = keys[self._order]
+
+    def _to_mapping(self) -> Dict[Union[str, int], int]:
+        self._build()
+        mapping = {}
+        for index, key in enumerate(self._keys().tolist()):
+            id = self._format(key)
+            if id in mapping:
+                self._duplicates[index] = id
+            else:
+                mapping[id] = index
+        self._start = self._sorted_keys = self._order = None
+        return mapping
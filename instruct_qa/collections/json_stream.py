@@ -0,0 +1,99 @@
+import json
+from typing import Any, Iterator, Tuple
+
+_WHITESPACE = " \t\n\r"
+
+
+class _JsonReader(object):
+    # Buffered character stream over a text file, refilled on demand.
+
+    def __init__(self, fp, chunk_size: int):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        if self.eof:
+            return False
+        if self.pos > self.chunk_size:
+            self.buffer = self.buffer[self.pos :]
+            self.pos = 0
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer += chunk
+        return True
+
+    def peek(self) -> str:
+        # Next non-whitespace character, or "" at the end of the file.
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        char = self.peek()
+        if char == "" or char not in chars:
+            raise ValueError(
+                f"Expected one of {list(chars)} in JSON stream, got {char!r} instead."
+            )
+        self.pos += 1
+        return char
+
+    def decode(self, decoder: json.JSONDecoder) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.pos)
+                # A value ending exactly at the end of the buffer may be truncated
+                # (e.g. a number), so only accept it once more data was read.
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+def iter_json_object_items(path: str, chunk_size: int = 1 << 20) -> Iterator[Tuple[str, Any]]:
+    """
+    Incrementally parse a file holding a single JSON object, and yield its members.
+
+    This is equivalent to `json.load(f).items()`, but only one member is decoded at a
+    time, so memory stays bounded by the largest member rather than the whole file,
+    and members are available as soon as they are read.
+
+    Parameters
+    ----------
+    path: str
+        The path of the JSON file. Its top-level value must be an object.
+
+    chunk_size: int
+        The number of characters read from the file at a time.
+
+    Returns
+    -------
+    iterator of tuples
+        The `(key, value)` pairs of the object, in file order.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as fp:
+        reader = _JsonReader(fp, chunk_size)
+        reader.expect("{")
+        if reader.peek() == "}":
+            return
+        while True:
+            key = reader.decode(decoder)
+            if not isinstance(key, str):
+                raise ValueError(f"Expected a string key in JSON stream, got {key!r}.")
+            reader.expect(":")
+            yield key, reader.decode(decoder)
+            if reader.expect(",}") == "}":
+                return
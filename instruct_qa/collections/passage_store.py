@@ -0,0 +1,745 @@
+import json
+import lzma
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from array import array
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List
+
+import numpy as np
+
+STORE_MAGIC = b"IQAPSTOR"
+STORE_VERSION = 3
+STORE_SUFFIX = ".store"
+PASSAGE_FIELDS = ("id", "text", "title", "sub_title")
+# Fields repeated across the passages of an article, which are dictionary-encoded.
+DICT_FIELDS = ("title", "sub_title")
+# Block compression codecs, as (compress, decompress) functions.
+COMPRESSION_CODECS = {
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+_HEADER_PREFIX = struct.Struct("<8sQ")
+_ALIGNMENT = 8
+_FLUSH_EVERY = 1 << 16
+
+
+def _align(n: int) -> int:
+    return (n + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def _get_field_type(value, field: str, dict_fields, compressed_fields=()) -> str:
+    if isinstance(value, int) and not isinstance(value, bool):
+        return "int"
+    if field in dict_fields:
+        return "dict"
+    return "compressed" if field in compressed_fields else "str"
+
+
+def write_passage_store(
+    passages: Iterable[Dict[str, str]],
+    path: str,
+    metadata: Dict = None,
+    arrays: Dict[str, np.ndarray] = None,
+    fields=PASSAGE_FIELDS,
+    dict_fields=DICT_FIELDS,
+    compression: str = None,
+    compressed_fields=("text",),
+    block_size: int = 64,
+) -> int:
+    """
+    Write passages to the binary passage store format.
+
+    The store is a single file made of a small JSON header followed by, for each
+    string field, an int64 offsets array of length `n + 1` and a blob holding the
+    UTF-8 encoded values back to back. Integer fields (e.g. FaithDial ids) are stored
+    as a single int64 array. Dictionary-encoded fields are stored as an int32 array of
+    codes, plus the table of their unique values, laid out like a string field. The
+    `index` of a passage is implied by its position.
+
+    With `compression`, the values of `compressed_fields` are compressed in blocks
+    of `block_size` consecutive passages. Their offsets still index the uncompressed
+    values, and an int64 array of length `num_blocks + 1` holds the offsets of the
+    compressed blocks in the blob, so a passage is read by decompressing one block.
+
+    Parameters
+    ----------
+    passages: iterable of dicts
+        The passages to write. They are consumed in a single pass, so a generator can
+        be used to convert a corpus without holding it in memory.
+
+    path: str
+        The path of the store file. It is written to a temporary file first and moved
+        in place at the end, so an interrupted conversion never leaves a partial store.
+
+    metadata: dict
+        JSON-serializable metadata saved in the header (e.g. the loader options).
+
+    arrays: dict
+        Additional numpy arrays to save in the store, by name (e.g. the arrays of an
+        `IdIndex`). They can be read back without copy from `PassageStore.arrays`.
+
+    fields: tuple of strings
+        The passage fields to store.
+
+    dict_fields: tuple of strings
+        The string fields to dictionary-encode, i.e. whose values are mostly repeated
+        (e.g. the title of an article split into many passages).
+
+    compression: str
+        The codec used to compress `compressed_fields`, one of `COMPRESSION_CODECS`.
+        If None, nothing is compressed.
+
+    compressed_fields: tuple of strings
+        The string fields to compress. Large fields (the passage text) gain the most.
+
+    block_size: int
+        The number of passages per compressed block. Larger blocks compress better,
+        but more data is decompressed to read a single passage.
+
+    Returns
+    -------
+    int
+        The number of passages written.
+
+    Notes
+    -----
+    `metadata` and `arrays` are only read after `passages` is exhausted, so loaders
+    can fill them in with values that are only known once parsing is done.
+    """
+    if compression is None:
+        compressed_fields = ()
+    elif compression not in COMPRESSION_CODECS:
+        raise ValueError(
+            f"Unknown compression {compression}. Use one of {', '.join(COMPRESSION_CODECS)}."
+        )
+    else:
+        compress = COMPRESSION_CODECS[compression][0]
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    with tempfile.TemporaryDirectory(dir=directory) as tmpdir:
+        files = {}
+        # Arrays buffered until the next flush, by section name.
+        pending = {}
+        # Sizes of the string blobs, by column ("{f}" or "{f}.table").
+        sizes = {}
+        # Codes of the values of dictionary-encoded fields.
+        tables = {}
+        # Uncompressed values of the current block of compressed fields.
+        blocks = {}
+        compressed_sizes = {f: 0 for f in fields}
+        field_types = {f: "str" for f in fields}
+
+        def open_sections():
+            for f in fields:
+                if field_types[f] == "int":
+                    columns = []
+                    pending[f"{f}.values"] = array("q")
+                elif field_types[f] == "dict":
+                    columns = [f"{f}.table"]
+                    pending[f"{f}.codes"] = array("i")
+                    tables[f] = {}
+                else:
+                    columns = [f]
+                    if field_types[f] == "compressed":
+                        pending[f"{f}.blocks"] = array("q", [0])
+                        blocks[f] = bytearray()
+                for column in columns:
+                    pending[f"{column}.offsets"] = array("q", [0])
+                    sizes[column] = 0
+                for name in pending:
+                    if name not in files:
+                        files[name] = open(os.path.join(tmpdir, name), "wb")
+                for column in columns:
+                    files[f"{column}.data"] = open(os.path.join(tmpdir, f"{column}.data"), "wb")
+
+        def write_string(column, value):
+            value = str(value).encode("utf-8")
+            if column in blocks:
+                blocks[column] += value
+            else:
+                files[f"{column}.data"].write(value)
+            sizes[column] += len(value)
+            pending[f"{column}.offsets"].append(sizes[column])
+
+        def write_blocks():
+            for f, block in blocks.items():
+                value = compress(bytes(block))
+                files[f"{f}.data"].write(value)
+                compressed_sizes[f] += len(value)
+                pending[f"{f}.blocks"].append(compressed_sizes[f])
+                del block[:]
+
+        def flush():
+            for name, values in pending.items():
+                files[name].write(values.tobytes())
+                del values[:]
+
+        num_passages = 0
+        try:
+            for passage in passages:
+                if num_passages == 0:
+                    for f in fields:
+                        field_types[f] = _get_field_type(
+                            passage[f], f, dict_fields, compressed_fields
+                        )
+                    open_sections()
+
+                for f in fields:
+                    if field_types[f] == "int":
+                        pending[f"{f}.values"].append(passage[f])
+                    elif field_types[f] == "dict":
+                        code = tables[f].get(passage[f])
+                        if code is None:
+                            code = tables[f][passage[f]] = len(tables[f])
+                            write_string(f"{f}.table", passage[f])
+                        pending[f"{f}.codes"].append(code)
+                    else:
+                        write_string(f, passage[f])
+                num_passages += 1
+
+                if num_passages % block_size == 0:
+                    write_blocks()
+
+                if num_passages % _FLUSH_EVERY == 0:
+                    flush()
+            if num_passages == 0:
+                open_sections()
+            if num_passages % block_size:
+                write_blocks()
+            flush()
+        finally:
+            for fp in files.values():
+                fp.close()
+
+        sections = {}
+        sources = {}
+        position = 0
+
+        def add_section(name, dtype, shape, source):
+            nonlocal position
+            sections[name] = {"offset": position, "dtype": dtype, "shape": list(shape)}
+            sources[name] = source
+            position = _align(position + int(np.prod(shape)) * np.dtype(dtype).itemsize)
+
+        for f in fields:
+            if field_types[f] == "int":
+                add_section(f"{f}.values", "<i8", (num_passages,), None)
+            elif field_types[f] == "dict":
+                add_section(f"{f}.codes", "<i4", (num_passages,), None)
+                add_section(f"{f}.table.offsets", "<i8", (len(tables[f]) + 1,), None)
+                add_section(f"{f}.table.data", "|u1", (sizes[f"{f}.table"],), None)
+            elif field_types[f] == "compressed":
+                num_blocks = (num_passages + block_size - 1) // block_size
+                add_section(f"{f}.offsets", "<i8", (num_passages + 1,), None)
+                add_section(f"{f}.blocks", "<i8", (num_blocks + 1,), None)
+                add_section(f"{f}.data", "|u1", (compressed_sizes[f],), None)
+            else:
+                add_section(f"{f}.offsets", "<i8", (num_passages + 1,), None)
+                add_section(f"{f}.data", "|u1", (sizes[f],), None)
+        for name, values in (arrays or {}).items():
+            values = np.ascontiguousarray(values)
+            add_section(f"arrays.{name}", values.dtype.str, values.shape, values)
+
+        header = json.dumps(
+            {
+                "version": STORE_VERSION,
+                "num_passages": num_passages,
+                "fields": list(fields),
+                "field_types": field_types,
+                "compression": {"codec": compression, "block_size": block_size}
+                if compressed_fields
+                else None,
+                "sections": sections,
+                "metadata": metadata or {},
+            }
+        ).encode("utf-8")
+        data_start = _align(_HEADER_PREFIX.size + len(header))
+
+        tmp_path = os.path.join(tmpdir, "store")
+        with open(tmp_path, "wb") as out:
+            out.write(_HEADER_PREFIX.pack(STORE_MAGIC, len(header)))
+            out.write(header)
+            for name, section in sections.items():
+                out.seek(data_start + section["offset"])
+                if sources[name] is not None:
+                    out.write(memoryview(sources[name]).cast("B"))
+                else:
+                    with open(os.path.join(tmpdir, name), "rb") as section_file:
+                        shutil.copyfileobj(section_file, out, 1 << 24)
+            out.truncate(data_start + position)
+        os.replace(tmp_path, path)
+
+    return num_passages
+
+
+class PassageStore(object):
+    """
+    Read-only view over a passage store (see `write_passage_store`).
+
+    The store works on any buffer, but is usually opened from disk with `open`, which
+    memory-maps the file. Nothing is parsed up front: passages are decoded only when
+    they are accessed, and processes mapping the same file share the OS page cache.
+    It behaves like the list of passage dicts used by `PassageCollection`.
+
+    Blocks of compressed fields are decompressed on access, and the most recently
+    used ones are kept in an LRU cache of `cache_blocks` blocks, so that reading
+    nearby passages only decompresses each block once. Its hit and miss counts are
+    returned by `cache_info`.
+    """
+
+    def __init__(self, buffer, mmap_obj: mmap.mmap = None, cache_blocks: int = 1024):
+        self._buffer = memoryview(buffer)
+        self._mmap = mmap_obj
+
+        magic, header_len = _HEADER_PREFIX.unpack_from(self._buffer, 0)
+        if magic != STORE_MAGIC:
+            raise ValueError("Buffer does not contain a passage store.")
+        header = json.loads(
+            str(self._buffer[_HEADER_PREFIX.size : _HEADER_PREFIX.size + header_len], "utf-8")
+        )
+        if header["version"] != STORE_VERSION:
+            raise ValueError(
+                f"Unsupported passage store version {header['version']}, expected {STORE_VERSION}."
+            )
+
+        self._num_passages = header["num_passages"]
+        self.fields = tuple(header["fields"])
+        self.field_types = header["field_types"]
+        self.metadata = header["metadata"]
+        self.compression = header["compression"]
+
+        data_start = _align(_HEADER_PREFIX.size + header_len)
+        sections = {}
+        for name, section in header["sections"].items():
+            sections[name] = np.frombuffer(
+                self._buffer,
+                dtype=section["dtype"],
+                count=int(np.prod(section["shape"])),
+                offset=data_start + section["offset"],
+            ).reshape(section["shape"])
+
+        # String columns ("{f}" or "{f}.table" for dictionary-encoded fields).
+        self._offsets = {}
+        self._data_start = {}
+        self._values = {}
+        self._codes = {}
+        self._blocks = {}
+        for f in self.fields:
+            if self.field_types[f] == "int":
+                self._values[f] = sections[f"{f}.values"]
+                continue
+            column = f
+            if self.field_types[f] == "dict":
+                self._codes[f] = sections[f"{f}.codes"]
+                column = f"{f}.table"
+            elif self.field_types[f] == "compressed":
+                self._blocks[f] = sections[f"{f}.blocks"]
+            self._offsets[column] = sections[f"{column}.offsets"]
+            self._data_start[column] = data_start + header["sections"][f"{column}.data"]["offset"]
+        self.arrays = {
+            name[len("arrays.") :]: values
+            for name, values in sections.items()
+            if name.startswith("arrays.")
+        }
+
+        if self.compression is not None:
+            self._decompress = COMPRESSION_CODECS[self.compression["codec"]][1]
+            self._block_size = self.compression["block_size"]
+        self._get_block = lru_cache(maxsize=cache_blocks)(self._decompress_block)
+
+    @classmethod
+    def open(cls, path: str, cache_blocks: int = 1024) -> "PassageStore":
+        with open(path, "rb") as f:
+            mmap_obj = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mmap_obj, mmap_obj=mmap_obj, cache_blocks=cache_blocks)
+
+    @property
+    def mmap_obj(self) -> mmap.mmap:
+        """
+        The memory map of the store file, or None if the store is read from another
+        buffer, e.g. shared memory.
+        """
+        return self._mmap
+
+    @property
+    def buffer(self) -> memoryview:
+        """
+        The buffer holding the whole store, e.g. to copy it elsewhere.
+        """
+        return self._buffer
+
+    def close(self):
+        self._offsets = {}
+        self._values = {}
+        self._codes = {}
+        self._blocks = {}
+        self._get_block.cache_clear()
+        self.arrays = {}
+        self._buffer.release()
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __len__(self):
+        return self._num_passages
+
+    def __getitem__(self, index: int) -> Dict[str, str]:
+        index = self._check_index(index)
+        passage = {f: self._get_value(f, index) for f in self.fields}
+        passage["index"] = index
+        return passage
+
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        for i in range(self._num_passages):
+            yield self[i]
+
+    def get_field(self, field: str, index: int) -> str:
+        return self._get_value(field, self._check_index(index))
+
+    def iter_field(self, field: str) -> Iterator[str]:
+        if field in self._codes:
+            table = self.get_table(field)
+            for code in self._codes[field]:
+                yield table[code]
+            return
+        for i in range(self._num_passages):
+            yield self._get_value(field, i)
+
+    def get_codes(self, field: str) -> np.ndarray:
+        """
+        The int32 codes of a dictionary-encoded field, one per passage. Passages with
+        the same value (e.g. from the same article) have the same code.
+        """
+        return self._codes[field]
+
+    def cache_info(self):
+        """
+        Statistics of the cache of decompressed blocks, as a named tuple with the
+        `hits`, `misses`, `maxsize` and `currsize` fields of `functools.lru_cache`.
+        """
+        return self._get_block.cache_info()
+
+    def get_table(self, field: str) -> List[str]:
+        """
+        The unique values of a dictionary-encoded field, indexed by code.
+        """
+        column = f"{field}.table"
+        return [self._get_string(column, i) for i in range(len(self._offsets[column]) - 1)]
+
+    def _check_index(self, index: int) -> int:
+        index = int(index)
+        if index < 0:
+            index += self._num_passages
+        if not 0 <= index < self._num_passages:
+            raise IndexError("passage index out of range")
+        return index
+
+    def _get_value(self, field: str, index: int) -> str:
+        if field in self._values:
+            return int(self._values[field][index])
+        if field in self._codes:
+            return self._get_string(f"{field}.table", int(self._codes[field][index]))
+        return self._get_string(field, index)
+
+    def _get_string(self, column: str, index: int) -> str:
+        offsets = self._offsets[column]
+        if column in self._blocks:
+            block = index // self._block_size
+            block_start = int(offsets[block * self._block_size])
+            start = int(offsets[index]) - block_start
+            end = int(offsets[index + 1]) - block_start
+            return str(self._get_block(column, block)[start:end], "utf-8")
+        start = self._data_start[column] + int(offsets[index])
+        end = self._data_start[column] + int(offsets[index + 1])
+        return str(self._buffer[start:end], "utf-8")
+
+    def _get_data(self, column: str) -> bytes:
+        # The whole uncompressed blob of a string column.
+        if column in self._blocks:
+            return b"".join(
+                self._decompress_block(column, block)
+                for block in range(len(self._blocks[column]) - 1)
+            )
+        start = self._data_start[column]
+        return self._buffer[start : start + int(self._offsets[column][-1])]
+
+    def _decompress_block(self, field: str, block: int) -> bytes:
+        blocks = self._blocks[field]
+        start = self._data_start[field] + int(blocks[block])
+        end = self._data_start[field] + int(blocks[block + 1])
+        return self._decompress(self._buffer[start:end])
+
+
+class ColumnarPassages(object):
+    """
+    Growable in-memory struct-of-arrays container for passages.
+
+    Each string field is kept as one UTF-8 `bytearray` plus an int64 offsets array,
+    and integer fields (e.g. FaithDial ids) as an int64 array, instead of one dict and
+    several string objects per passage. Fields in `dict_fields` (the title and
+    sub-title by default) are dictionary-encoded: each passage holds an int32 code
+    into a table of unique values, so an article title is stored once however many
+    passages the article is split into, and passages can be grouped by article from
+    the codes alone. The `index` of a passage is implied by its position, and passage
+    dicts are only materialized when they are accessed. It behaves like the list of
+    passage dicts used by `PassageCollection`.
+    """
+
+    def __init__(self, fields=PASSAGE_FIELDS, dict_fields=DICT_FIELDS):
+        self.fields = tuple(fields)
+        self.dict_fields = tuple(dict_fields)
+        self._data = {}
+        self._offsets = {}
+        self._ints = {}
+        self._codes = {}
+        self._tables = {}
+        self._lookups = {}
+        self._num_passages = 0
+
+    @classmethod
+    def from_store(cls, store: PassageStore) -> "ColumnarPassages":
+        """
+        Copy the columns of a `PassageStore` into memory, without decoding passages.
+        """
+        dict_fields = [f for f in store.fields if store.field_types[f] == "dict"]
+        passages = cls(store.fields, dict_fields)
+        for f in store.fields:
+            if store.field_types[f] == "int":
+                passages._ints[f] = array("q", store._values[f].tobytes())
+            elif store.field_types[f] == "dict":
+                passages._codes[f] = array("i", store._codes[f].tobytes())
+                passages._tables[f] = store.get_table(f)
+                passages._lookups[f] = {v: i for i, v in enumerate(passages._tables[f])}
+            else:
+                passages._offsets[f] = array("q", store._offsets[f].tobytes())
+                passages._data[f] = bytearray(store._get_data(f))
+        passages._num_passages = len(store)
+        return passages
+
+    @property
+    def field_types(self) -> Dict[str, str]:
+        """
+        The storage type of each field ("str", "int" or "dict"), as in `PassageStore`.
+        """
+        return {
+            f: "int" if f in self._ints else "dict" if f in self._codes else "str"
+            for f in self.fields
+        }
+
+    def __len__(self):
+        return self._num_passages
+
+    def append(self, passage: Dict[str, str]):
+        if self._num_passages == 0:
+            self._init_columns(passage)
+        for f in self.fields:
+            self._append_value(f, passage[f])
+        self._num_passages += 1
+
+    def extend(self, passages: Iterable[Dict[str, str]]):
+        if not isinstance(passages, ColumnarPassages):
+            for passage in passages:
+                self.append(passage)
+            return
+
+        # Concatenate the columns directly, shifting the offsets and remapping the
+        # codes of the other container.
+        if len(passages) == 0:
+            return
+        if self._num_passages == 0:
+            self._init_columns(passages[0])
+        for f in self.fields:
+            if f in self._ints and f in passages._ints:
+                self._ints[f].extend(passages._ints[f])
+            elif f in self._codes and f in passages._codes:
+                mapping = np.array(
+                    [self._encode(f, value) for value in passages._tables[f]], dtype=np.int32
+                )
+                codes = mapping[np.asarray(passages._codes[f], dtype=np.int32)]
+                self._codes[f].frombytes(codes.tobytes())
+            elif f in self._data and f in passages._data:
+                shifted = np.asarray(passages._offsets[f][1:], dtype=np.int64) + len(self._data[f])
+                self._offsets[f].frombytes(shifted.tobytes())
+                self._data[f] += passages._data[f]
+            else:
+                for value in passages.iter_field(f):
+                    self._append_value(f, value)
+        self._num_passages += len(passages)
+
+    def __getitem__(self, index: int) -> Dict[str, str]:
+        index = self._check_index(index)
+        passage = {f: self._get_value(f, index) for f in self.fields}
+        passage["index"] = index
+        return passage
+
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        for i in range(self._num_passages):
+            yield self[i]
+
+    def get_field(self, field: str, index: int) -> str:
+        return self._get_value(field, self._check_index(index))
+
+    def iter_field(self, field: str) -> Iterator[str]:
+        for i in range(self._num_passages):
+            yield self._get_value(field, i)
+
+    def get_codes(self, field: str) -> np.ndarray:
+        """
+        The int32 codes of a dictionary-encoded field, one per passage. Passages with
+        the same value (e.g. from the same article) have the same code.
+        """
+        return np.frombuffer(self._codes[field], dtype=np.int32)
+
+    def get_table(self, field: str) -> List[str]:
+        """
+        The unique values of a dictionary-encoded field, indexed by code.
+        """
+        return self._tables[field]
+
+    def nbytes(self) -> int:
+        """
+        Number of bytes held by the columns, including over-allocated capacity and the
+        tables of dictionary-encoded fields.
+        """
+        columns = (
+            list(self._data.values())
+            + list(self._offsets.values())
+            + list(self._ints.values())
+            + list(self._codes.values())
+        )
+        nbytes = sum(c.__sizeof__() for c in columns)
+        for f, table in self._tables.items():
+            nbytes += table.__sizeof__() + self._lookups[f].__sizeof__()
+            nbytes += sum(value.__sizeof__() for value in table)
+        return nbytes
+
+    def _init_columns(self, passage: Dict[str, str]):
+        for f in self.fields:
+            field_type = _get_field_type(passage[f], f, self.dict_fields)
+            if field_type == "int":
+                self._ints[f] = array("q")
+            elif field_type == "dict":
+                self._codes[f] = array("i")
+                self._tables[f] = []
+                self._lookups[f] = {}
+            else:
+                self._data[f] = bytearray()
+                self._offsets[f] = array("q", [0])
+
+    def _encode(self, field: str, value: str) -> int:
+        code = self._lookups[field].get(value)
+        if code is None:
+            code = self._lookups[field][value] = len(self._tables[field])
+            self._tables[field].append(value)
+        return code
+
+    def _append_value(self, field: str, value):
+        if field in self._ints:
+            self._ints[field].append(value)
+        elif field in self._codes:
+            self._codes[field].append(self._encode(field, value))
+        else:
+            self._data[field] += str(value).encode("utf-8")
+            self._offsets[field].append(len(self._data[field]))
+
+    def _check_index(self, index: int) -> int:
+        index = int(index)
+        if index < 0:
+            index += self._num_passages
+        if not 0 <= index < self._num_passages:
+            raise IndexError("passage index out of range")
+        return index
+
+    def _get_value(self, field: str, index: int) -> str:
+        if field in self._ints:
+            return self._ints[field][index]
+        if field in self._codes:
+            return self._tables[field][self._codes[field][index]]
+        offsets = self._offsets[field]
+        return self._data[field][offsets[index] : offsets[index + 1]].decode("utf-8")
+
+
+class ChainedPassages(object):
+    """
+    Concatenation of passage containers, e.g. a memory-mapped `PassageStore` followed
+    by the passages appended to the collection since it was loaded.
+
+    Containers are not copied. Passages are appended to the last container, or to a
+    new `ColumnarPassages` if the last container is read-only. It behaves like the list
+    of passage dicts used by `PassageCollection`.
+    """
+
+    def __init__(self, segments: List, dict_fields=DICT_FIELDS):
+        self.segments = list(segments)
+        self.dict_fields = tuple(dict_fields)
+        self.fields = self.segments[0].fields if self.segments else PASSAGE_FIELDS
+
+    @property
+    def field_types(self) -> Dict[str, str]:
+        """
+        The type of each field, as in `PassageStore`. Dictionary-encoded fields are
+        reported as "str", since each container has its own codes.
+        """
+        if not self.segments:
+            return {f: "str" for f in self.fields}
+        field_types = dict(self.segments[0].field_types)
+        for f, field_type in field_types.items():
+            if field_type in ("dict", "compressed"):
+                field_types[f] = "str"
+        return field_types
+
+    def __len__(self):
+        return sum(len(segment) for segment in self.segments)
+
+    def append(self, passage: Dict[str, str]):
+        if not self.segments or not hasattr(self.segments[-1], "append"):
+            self.segments.append(ColumnarPassages(self.fields, self.dict_fields))
+        self.segments[-1].append(passage)
+
+    def extend(self, passages: Iterable[Dict[str, str]]):
+        for passage in passages:
+            self.append(passage)
+
+    def __getitem__(self, index: int) -> Dict[str, str]:
+        segment, offset, local_index = self._locate(index)
+        passage = segment[local_index]
+        passage["index"] = offset + local_index
+        return passage
+
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        offset = 0
+        for segment in self.segments:
+            for passage in segment:
+                passage["index"] += offset
+                yield passage
+            offset += len(segment)
+
+    def get_field(self, field: str, index: int) -> str:
+        segment, _, local_index = self._locate(index)
+        return segment.get_field(field, local_index)
+
+    def iter_field(self, field: str) -> Iterator[str]:
+        for segment in self.segments:
+            yield from segment.iter_field(field)
+
+    def _locate(self, index: int):
+        # The segment holding a passage, its offset and the index within the segment.
+        index = int(index)
+        size = len(self)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("passage index out of range")
+        offset = 0
+        for segment in self.segments:
+            if index < offset + len(segment):
+                return segment, offset, index - offset
+            offset += len(segment)
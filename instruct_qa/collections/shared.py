@@ -0,0 +1,52 @@
+import os
+from multiprocessing import resource_tracker, shared_memory
+
+_COPY_SIZE = 1 << 26
+
+
+def copy_to_shared_memory(buffer, name: str = None) -> shared_memory.SharedMemory:
+    """
+    Create a shared memory segment holding a copy of `buffer`.
+
+    The caller owns the segment: it must keep the returned object alive while other
+    processes use the segment, then call its `close` and `unlink` methods.
+    """
+    buffer = memoryview(buffer).cast("B")
+    segment = shared_memory.SharedMemory(name=name, create=True, size=max(len(buffer), 1))
+    for start in range(0, len(buffer), _COPY_SIZE):
+        end = min(start + _COPY_SIZE, len(buffer))
+        segment.buf[start:end] = buffer[start:end]
+    return segment
+
+
+def copy_file_to_shared_memory(path: str, name: str = None) -> shared_memory.SharedMemory:
+    """
+    Like `copy_to_shared_memory`, but copies the content of a file.
+    """
+    size = os.path.getsize(path)
+    segment = shared_memory.SharedMemory(name=name, create=True, size=max(size, 1))
+    with open(path, "rb") as f:
+        start = 0
+        while start < size:
+            read = f.readinto(segment.buf[start : min(start + _COPY_SIZE, size)])
+            if not read:
+                break
+            start += read
+    return segment
+
+
+def attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """
+    Attach to an existing shared memory segment without taking ownership of it.
+
+    Before Python 3.13, attaching registers the segment with the resource tracker,
+    which unlinks it when the attaching process exits, and would pull the segment
+    from under every other process. It is unregistered here, so only the process
+    that created the segment removes it.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        segment = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(segment._name, "shared_memory")
+        return segment
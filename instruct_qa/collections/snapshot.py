@@ -0,0 +1,72 @@
+import hashlib
+import json
+import os
+from typing import Dict, List
+
+from .passage_store import STORE_SUFFIX, STORE_VERSION
+
+
+def fingerprint_file(path: str, num_samples: int = 16, sample_size: int = 1 << 16) -> Dict:
+    """
+    Identify the content of a file without reading all of it.
+
+    Parameters
+    ----------
+    path: str
+        The path of the file.
+
+    num_samples: int
+        The number of evenly spaced blocks hashed, in addition to the first and last
+        blocks of the file.
+
+    sample_size: int
+        The size in bytes of each hashed block.
+
+    Returns
+    -------
+    dict
+        The size, modification time (in nanoseconds) and a BLAKE2 hash of the sampled
+        blocks of the file. Hashing samples rather than the full file keeps this fast
+        for multi-GB corpora, while the size and mtime catch regular rewrites.
+    """
+    stat = os.stat(path)
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        positions = {0, max(stat.st_size - sample_size, 0)}
+        positions.update(
+            stat.st_size * i // (num_samples + 1) for i in range(1, num_samples + 1)
+        )
+        for position in sorted(positions):
+            f.seek(position)
+            hasher.update(f.read(sample_size))
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "hash": hasher.hexdigest(),
+    }
+
+
+def get_snapshot_path(
+    snapshot_dir: str,
+    collection_cls: str,
+    source_paths: List[str],
+    options: Dict,
+) -> str:
+    """
+    Path of the snapshot of a collection loaded from the given source files with the
+    given loader options. The file name embeds a hash of the collection class, the
+    fingerprints of the sources (see `fingerprint_file`), the loader options and the
+    passage store version, so any change to them leads to a new snapshot.
+    """
+    key = json.dumps(
+        {
+            "collection": collection_cls,
+            "sources": [fingerprint_file(p) for p in source_paths],
+            "options": options,
+            "store_version": STORE_VERSION,
+        },
+        sort_keys=True,
+    )
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+    basename = os.path.basename(source_paths[0]) if source_paths else collection_cls
+    return os.path.join(snapshot_dir, f"{basename}.{digest}{STORE_SUFFIX}")
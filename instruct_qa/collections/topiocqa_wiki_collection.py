@@ -1,13 +1,15 @@
-import csv
 import os
-from typing import Dict, List
+import sys
+from functools import partial
+from typing import Dict
 
 import requests
-from tqdm import tqdm
 
 import instruct_qa.experiment_utils as utils
 
 from . import PassageCollection
+from .id_index import IdIndex
+from .tsv_loader import TsvPassageReader
 
 TOPIOCQA_WIKI_DOWNLOAD_URL = "https://zenodo.org/records/6149599/files/data/wikipedia_split/full_wiki_segments.tsv"
 
@@ -23,14 +25,36 @@ class TopiocqaWikiCollection(PassageCollection):
         title_col: int = 2,
         id_prefix: str = "wiki:",
         normalize: bool = True,
+        storage: str = "memory",
+        n_jobs: int = 1,
+        snapshot_dir: str = None,
+        max_words: int = 250,
     ):
-        super().__init__(name)
+        """
+        Parameters
+        ----------
+        storage: str
+            How passages are held, see `PassageCollection`.
+
+        n_jobs: int
+            The number of processes used to parse the TSV file. If -1, use all
+            available CPUs. See `TsvPassageReader`.
+
+        snapshot_dir: str
+            The directory of the snapshot cache, see `PassageCollection`.
+
+        max_words: int
+            Passages are truncated to their first `max_words` words.
+        """
+        super().__init__(name, storage=storage, snapshot_dir=snapshot_dir)
         self.id_col = id_col
         self.text_col = text_col
         self.title_col = title_col
         self.id_prefix = id_prefix
         self.normalize = normalize
-        self._id_to_index = {}
+        self.n_jobs = n_jobs
+        self.max_words = max_words
+        self._id_to_index = IdIndex(prefix=id_prefix)
         self.header_included = False
         self.load_data(os.path.join(cachedir, file_name))
 
@@ -39,37 +63,68 @@ class TopiocqaWikiCollection(PassageCollection):
         if not os.path.exists(path_to_file):
             utils.wget(TOPIOCQA_WIKI_DOWNLOAD_URL, path_to_file)
 
-        with open(path_to_file) as ifile:
-            reader = csv.reader(ifile, delimiter="\t")
-            for i, row in enumerate(tqdm(reader, desc="Loading TopiOCQA Wiki")):
-                if row[self.id_col] == "id":
-                    self.header_included = True
-                    continue
-                sample_id = self.id_prefix + str(row[self.id_col])
-                passage = row[self.text_col]
-                title = row[self.title_col].split("[SEP]")[0].strip()
-                sub_title = row[self.title_col].split("[SEP]")[1].strip()
-                if self.normalize:
-                    passage = normalize_passage(passage)
-                index = i - 1 if self.header_included else i
-                self.passages.append(
-                    {
-                        "id": sample_id,
-                        "text": " ".join(passage.split(" ")[:250]),
-                        "title": title,
-                        "sub_title": sub_title,
-                        "index": index,
-                    }
-                )
-                self._id_to_index[sample_id] = index
-
-    def get_passage_from_id(self, id: str) -> Dict[str, str]:
-        passage = self.passages[self._id_to_index[id]]
-        assert passage["index"] == self._id_to_index[id]
-        return passage
-
-    def get_indices_from_ids(self, ids: List[str]) -> List[int]:
-        return [self._id_to_index[id] for id in ids]
+        parse_row = partial(
+            parse_topiocqa_row,
+            id_col=self.id_col,
+            text_col=self.text_col,
+            title_col=self.title_col,
+            id_prefix=self.id_prefix,
+            normalize=self.normalize,
+            max_words=self.max_words,
+        )
+        reader = TsvPassageReader(
+            path_to_file,
+            parse_row,
+            id_col=self.id_col,
+            id_prefix=self.id_prefix,
+            n_jobs=self.n_jobs,
+            desc="Loading TopiOCQA Wiki",
+        )
+
+        def parse():
+            reader.read_into(self.passages, self._id_to_index)
+            self.header_included = reader.header_included
+
+        def iter_passages():
+            for passage in reader:
+                self._id_to_index.add(passage["id"])
+                yield passage
+            self.header_included = reader.header_included
+
+        self._load_cached([path_to_file], parse, iter_passages)
+
+    def _get_loader_options(self) -> Dict:
+        return {
+            "id_col": self.id_col,
+            "text_col": self.text_col,
+            "title_col": self.title_col,
+            "id_prefix": self.id_prefix,
+            "normalize": self.normalize,
+            "max_words": self.max_words,
+        }
+
+    def _get_snapshot_state(self) -> Dict:
+        return {"header_included": self.header_included}
+
+    def _set_snapshot_state(self, state: Dict):
+        self.header_included = state["header_included"]
+
+
+def parse_topiocqa_row(
+    row, id_col, text_col, title_col, id_prefix, normalize, max_words=250
+):
+    passage = row[text_col]
+    title = row[title_col].split("[SEP]")[0].strip()
+    sub_title = row[title_col].split("[SEP]")[1].strip()
+    if normalize:
+        passage = normalize_passage(passage)
+    return {
+        "id": id_prefix + str(row[id_col]),
+        "text": " ".join(passage.split(" ")[:max_words]),
+        # Interned, since all the passages of an article share the titles.
+        "title": sys.intern(title),
+        "sub_title": sys.intern(sub_title),
+    }
 
 
 def normalize_passage(ctx_text: str):
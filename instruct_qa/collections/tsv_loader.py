@@ -0,0 +1,222 @@
+import csv
+import io
+import multiprocessing as mp
+import os
+import warnings
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from tqdm import tqdm
+
+from .id_index import IdIndex
+from .passage_store import ColumnarPassages
+
+
+def find_chunk_boundaries(path: str, n_chunks: int) -> List[Tuple[int, int]]:
+    """
+    Split a file into byte ranges that start and end on line boundaries.
+
+    Parameters
+    ----------
+    path: str
+        The path of the file to split.
+
+    n_chunks: int
+        The number of ranges to aim for. Fewer ranges are returned for small files
+        or very long lines.
+
+    Returns
+    -------
+    list of tuples
+        The `(start, end)` byte offsets of each range, in file order. Together, the
+        ranges cover the whole file.
+    """
+    file_size = os.path.getsize(path)
+    boundaries = [0]
+    with open(path, "rb") as f:
+        for i in range(1, n_chunks):
+            f.seek(max(file_size * i // n_chunks, boundaries[-1]))
+            f.readline()
+            position = f.tell()
+            if position >= file_size:
+                break
+            if position > boundaries[-1]:
+                boundaries.append(position)
+    boundaries.append(file_size)
+    return [(start, end) for start, end in zip(boundaries[:-1], boundaries[1:]) if end > start]
+
+
+def _parse_chunk(args):
+    # Parses the rows of a byte range, or of the rest of the file if `end` is None.
+    # Also returns whether a row spans several lines (a quoted field with newlines),
+    # in which case the range may end inside a field.
+    path, start, end, parse_row, id_col, id_prefix = args
+
+    passages = ColumnarPassages()
+    id_index = IdIndex(prefix=id_prefix)
+    header_rows = []
+    n_rows = 0
+    row = None
+    with open(path, "rb") as f:
+        f.seek(start)
+        if end is None:
+            lines = io.TextIOWrapper(f, encoding="utf-8", newline=None)
+        else:
+            lines = io.StringIO(f.read(end - start).decode("utf-8"), newline=None)
+        reader = csv.reader(lines, delimiter="\t")
+        for i, row in enumerate(reader):
+            n_rows += 1
+            if row[id_col] == "id":
+                header_rows.append(i)
+                continue
+            passage = parse_row(row)
+            passages.append(passage)
+            id_index.add(passage["id"])
+        # A quoted field left open on the last line ends with its newline.
+        multiline = reader.line_num != n_rows or (
+            row is not None and any("\n" in field for field in row)
+        )
+    return passages, id_index, header_rows, multiline
+
+
+class TsvPassageReader(object):
+    """
+    Reads passages from a Wikipedia TSV file, optionally with a process pool.
+
+    With `n_jobs=1`, the file is read sequentially with `csv.reader`. Otherwise, it
+    is split into byte ranges aligned on newlines (see `find_chunk_boundaries`),
+    which are parsed in parallel and concatenated in file order. Passages are
+    numbered exactly as in the sequential reader, with a header row (a row whose id
+    column is "id") skipped. The parallel reader requires that a header, if any, is
+    the first line of the file. Since ranges are split on newlines, a quoted field
+    spanning several lines may be split across ranges: from the first range with
+    such a field, the rest of the file is parsed sequentially instead.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        parse_row: Callable[[List[str]], Dict[str, str]],
+        id_col: int = 0,
+        id_prefix: str = "",
+        n_jobs: int = 1,
+        chunks_per_job: int = 4,
+        desc: str = None,
+    ):
+        """
+        Parameters
+        ----------
+        path: str
+            The path of the TSV file.
+
+        parse_row: callable
+            Converts a row (list of strings) into a passage dict with the "id",
+            "text", "title" and "sub_title" keys. It must be picklable (e.g. a
+            module-level function or a `functools.partial` of one) when n_jobs > 1.
+
+        id_col: int
+            The column holding the passage id, used to detect the header row.
+
+        id_prefix: str
+            The prefix of the passage ids, used to build an `IdIndex` per chunk.
+
+        n_jobs: int
+            The number of processes to use. If -1, use all available CPUs.
+
+        chunks_per_job: int
+            The number of byte ranges per process. More ranges balance the work
+            better, at the cost of more results to pass between processes.
+
+        desc: str
+            The description of the progress bar.
+        """
+        self.path = path
+        self.parse_row = parse_row
+        self.id_col = id_col
+        self.id_prefix = id_prefix
+        self.n_jobs = n_jobs if n_jobs > 0 else mp.cpu_count()
+        self.chunks_per_job = chunks_per_job
+        self.desc = desc
+        self.header_included = False
+
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        if self.n_jobs == 1:
+            yield from self._iter_sequential()
+            return
+
+        offset = 0
+        for passages, _ in self.iter_chunks():
+            for passage in passages:
+                passage["index"] += offset
+                yield passage
+            offset += len(passages)
+
+    def read_into(self, passages, id_index: IdIndex):
+        """
+        Append all passages to `passages` (a list or `ColumnarPassages`) and their
+        ids to `id_index`. With several processes, the parsed chunks are added
+        directly, without building a dict per passage for columnar storage.
+        """
+        if self.n_jobs == 1:
+            for passage in self._iter_sequential():
+                passages.append(passage)
+                id_index.add(passage["id"])
+            return
+
+        for chunk, chunk_id_index in self.iter_chunks():
+            offset = len(passages)
+            if isinstance(passages, ColumnarPassages):
+                passages.extend(chunk)
+            else:
+                for passage in chunk:
+                    passage["index"] += offset
+                    passages.append(passage)
+            id_index.update(chunk_id_index)
+
+    def iter_chunks(self) -> Iterator[Tuple[ColumnarPassages, IdIndex]]:
+        """
+        Parse the file with a process pool and yield, in file order, the passages
+        of each chunk and the `IdIndex` of their ids. Passage indices restart at 0
+        in each chunk.
+        """
+        ranges = find_chunk_boundaries(self.path, self.n_jobs * self.chunks_per_job)
+        args = [
+            (self.path, start, end, self.parse_row, self.id_col, self.id_prefix)
+            for start, end in ranges
+        ]
+
+        with mp.Pool(self.n_jobs) as pool:
+            results = pool.imap(_parse_chunk, args)
+            for i, (passages, id_index, header_rows, multiline) in enumerate(
+                tqdm(results, total=len(args), desc=self.desc)
+            ):
+                if multiline:
+                    # The previous ranges end on row boundaries, so the range starts on
+                    # one, but it may end inside a field.
+                    warnings.warn(
+                        f"Found a field spanning several lines in {self.path}, parsing the "
+                        "rest of the file sequentially."
+                    )
+                    passages, id_index, header_rows, _ = _parse_chunk(
+                        (self.path, ranges[i][0], None) + args[i][3:]
+                    )
+                if header_rows:
+                    if i > 0 or header_rows != [0]:
+                        raise ValueError(
+                            f"Found a header row after the first line of {self.path}. "
+                            "Load it with n_jobs=1."
+                        )
+                    self.header_included = True
+                yield passages, id_index
+                if multiline:
+                    break
+
+    def _iter_sequential(self) -> Iterator[Dict[str, str]]:
+        with open(self.path) as ifile:
+            reader = csv.reader(ifile, delimiter="\t")
+            for i, row in enumerate(tqdm(reader, desc=self.desc)):
+                if row[self.id_col] == "id":
+                    self.header_included = True
+                    continue
+                passage = self.parse_row(row)
+                passage["index"] = i - 1 if self.header_included else i
+                yield passage
@@ -2,15 +2,23 @@ from instruct_qa.collections.dpr_wiki_collection import DPRWikiCollection
 from instruct_qa.collections.hotpot_wiki_collection import HotpotWikiCollection
 from instruct_qa.collections.topiocqa_wiki_collection import TopiocqaWikiCollection
 from instruct_qa.collections.faithdial_collection import FaithDialCollection
+from instruct_qa.collections.arrow_collection import ArrowCollection
 
 
-def load_collection(document_collection_name, **kwargs):
+def load_collection(document_collection_name, shared_memory_name=None, warmup=False, **kwargs):
     """
     Loads a document collection.
 
     Args:
         document_collection_name (str): The name of the document collection to load.
+        shared_memory_name (str): If given, attach to a collection that another process
+            published under this name with `PassageCollection.publish_shared_memory`,
+            instead of loading it. kwargs are ignored in that case.
+        warmup (bool): Whether to read memory-mapped passages into memory in a
+            background thread after loading, see `PassageCollection.start_warmup`.
+            `collection.warmup.ready` is set when it is done.
         kwargs: Additional parameters for the document collection e.g., cachedir, file_name.
+            With "arrow_collection", file_name is a Parquet file of passages.
 
     Returns:
         PassageCollection: The loaded document collection.
@@ -20,6 +28,7 @@ def load_collection(document_collection_name, **kwargs):
         "topiocqa_wiki_collection": TopiocqaWikiCollection,
         "hotpot_wiki_collection": HotpotWikiCollection,
         "faithdial_collection": FaithDialCollection,
+        "arrow_collection": ArrowCollection,
     }
 
     if document_collection_name not in document_collection_mapping:
@@ -27,4 +36,12 @@ def load_collection(document_collection_name, **kwargs):
             f"Document collection {document_collection_name} not supported."
         )
 
-    return document_collection_mapping[document_collection_name](name=document_collection_name, **kwargs)
+    collection_cls = document_collection_mapping[document_collection_name]
+    if shared_memory_name is not None:
+        collection = collection_cls.from_shared_memory(shared_memory_name)
+    else:
+        collection = collection_cls(name=document_collection_name, **kwargs)
+
+    if warmup:
+        collection.start_warmup()
+    return collection
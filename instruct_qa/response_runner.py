@@ -86,14 +86,23 @@ class ResponseRunner:
                 retrieved_indices = r_dict["indices"]
             elif self._use_cached_retrieved_results:
                 retrieved_ctx_ids = self._retriever.retrieve(queries, k=self._k)
-                retrieved_indices = [
-                    self._document_collection.get_indices_from_ids(x)
-                    for x in retrieved_ctx_ids
-                ]
+                # Resolve the ids of the whole batch in a single call.
+                flat_indices = self._document_collection.get_indices_from_ids(
+                    [ctx_id for ctx_ids in retrieved_ctx_ids for ctx_id in ctx_ids]
+                )
+                retrieved_indices = np.split(
+                    np.asarray(flat_indices, dtype=np.int64),
+                    np.cumsum([len(x) for x in retrieved_ctx_ids])[:-1],
+                )
             else:
                 r_dict = self._retriever.retrieve(queries, k=self._k)
                 retrieved_indices = r_dict["indices"]
 
+            # Indexes pad queries with fewer than k results with an index of -1.
+            retrieved_indices = [
+                np.asarray(indices)[np.asarray(indices) >= 0] for indices in retrieved_indices
+            ]
+
             # Get the document texts.
             passages = [
                 self._document_collection.get_passages_from_indices(indices)
@@ -1,4 +1,5 @@
 import json
+from inspect import signature
 import numpy as np
 
 from instruct_qa.retrieval.index import IndexBase, IndexTorchFlat, IndexFaissFlatIP
@@ -97,6 +98,32 @@ class SentenceTransformerRetriever(RetrieverBase):
         self.index = index_cls(self.encode_documents(documents))
         return self.index
 
+    def add_documents(self, documents, **kwargs):
+        """
+        Encode new documents and append them to the index in place, without
+        re-encoding the documents already in it.
+
+        Parameters
+        ----------
+        documents: list of strings
+            The new documents, in the order in which they are appended to the
+            collection (see `PassageCollection.add_passages`).
+
+        **kwargs: dict
+            Additional keyword arguments to pass to the document encoder.
+
+        Returns
+        -------
+        range
+            The indices of the new documents in the index.
+        """
+        if self.index is None:
+            raise ValueError("You must create an index first. Use `build_index`.")
+
+        start_ix = len(self.index)
+        self.index.add(self.encode_documents(documents, **kwargs))
+        return range(start_ix, len(self.index))
+
     def retrieve(self, queries, k=10, **kwargs):
         """
         Retrieve documents for a given query.
@@ -151,7 +178,7 @@ class BM25Retriever(RetrieverBase):
         self,
         documents,
         directory="",
-        index_subdir="bm25_pyserini",
+        index_subdir=None,
         index_cls=index.IndexPyseriniBM25,
         **kwargs,
     ):
@@ -159,9 +186,10 @@ class BM25Retriever(RetrieverBase):
         This is a convenience method that builds an index and saves it to disk,
         then loads it into memory. This is useful if you want to build an index
         once and then use it multiple times. Behind the scene, this uses the
-        `IndexPyseriniBM25` class. Specifically, it calls the `build_index` and
-        `load` methods of that class in succession. See the documentation for
-        those methods for more details.
+        `IndexPyseriniBM25` class by default, or `IndexNumpyBM25`, which does not
+        need Java. Specifically, it calls the `build_index` and `load` methods of
+        that class in succession. See the documentation for those methods for
+        more details.
 
         Parameters
         ----------
@@ -176,9 +204,10 @@ class BM25Retriever(RetrieverBase):
 
         index_subdir: str
             This is the name of the subdirectory where the index will be saved.
+            Defaults to that of the index class, "bm25_pyserini" or "bm25_numpy".
 
         index_cls: instruct_qa.retrieval.index.IndexBase
-            The index class to use.
+            The index class to use, `IndexPyseriniBM25` or `IndexNumpyBM25`.
 
         **kwargs: dict
             Additional keyword arguments to pass to the `build_index` method of
@@ -186,17 +215,231 @@ class BM25Retriever(RetrieverBase):
         """
         records = [{"index": i, "text": doc} for i, doc in enumerate(documents)]
 
-        index_cls.build_index(records, directory, index_subdir=index_subdir, **kwargs)
-        index = index_cls.load(directory, index_subdir=index_subdir)
+        subdir_kwargs = {} if index_subdir is None else {"index_subdir": index_subdir}
+        index_cls.build_index(records, directory, **subdir_kwargs, **kwargs)
+        index = index_cls.load(directory, **subdir_kwargs)
         self.index = index
 
         return self.index
 
-    def retrieve(self, queries, k=10):
+    def retrieve(self, queries, k=10, threads=None):
+        """
+        Retrieve documents for text queries.
+
+        Parameters
+        ----------
+        queries: list of strings or string
+            The queries to search for.
+
+        k: int
+            The number of documents to retrieve for each query.
+
+        threads: int
+            If given, the number of threads searching the queries, see
+            `IndexPyseriniBM25.search`. Ignored by indexes that search on one thread.
+
+        Returns
+        -------
+        dict
+            A dictionary containing the scores and indices of the retrieved documents.
+        """
         if isinstance(queries, str):
             queries = [queries]
 
         if self.index is None:
             raise ValueError("You must create an index first. Use `build_index`.")
 
+        if threads is not None and "threads" in signature(self.index.search).parameters:
+            return self.index.search(queries, k=k, threads=threads)
         return self.index.search(queries, k=k)
+
+
+class HybridRetriever(RetrieverBase):
+    def __init__(
+        self,
+        dense_retriever: SentenceTransformerRetriever,
+        sparse_retriever: BM25Retriever,
+        fusion="rrf",
+        weights=(1.0, 1.0),
+        rrf_k=60,
+        n_candidates=100,
+        bm25_threads=None,
+    ):
+        """
+        Parameters
+        ----------
+        dense_retriever: SentenceTransformerRetriever
+            The retriever searching embeddings of the queries.
+
+        sparse_retriever: BM25Retriever
+            The retriever searching the terms of the queries. Its index must number
+            documents like the index of the dense retriever.
+
+        fusion: str
+            How the rankings of the two retrievers are fused, "rrf" for reciprocal
+            rank fusion or "weighted" for a weighted sum of their scores, min-max
+            normalized per query.
+
+        weights: tuple of floats
+            The weights of the dense and sparse retrievers in the fusion.
+
+        rrf_k: int
+            The constant added to ranks in reciprocal rank fusion. Larger values
+            flatten the difference between the top ranks and the others.
+
+        n_candidates: int
+            The number of documents retrieved by each retriever before fusion, at
+            least the number of documents to retrieve.
+
+        bm25_threads: int
+            If given, the number of threads searching the queries of the sparse
+            retriever, see `BM25Retriever.retrieve`.
+
+        Notes
+        -----
+        The two retrievers search each batch of queries concurrently, on separate
+        threads, so retrieval takes about as long as the slower of the two. The
+        encoder, faiss and Lucene release the GIL while they work.
+        """
+        if fusion not in ("rrf", "weighted"):
+            raise ValueError(f"fusion must be 'rrf' or 'weighted', got {fusion!r}.")
+
+        self.dense_retriever = dense_retriever
+        self.sparse_retriever = sparse_retriever
+        self.fusion = fusion
+        self.weights = tuple(weights)
+        self.rrf_k = rrf_k
+        self.n_candidates = n_candidates
+        self.bm25_threads = bm25_threads
+
+    def encode_queries(self, queries, **kwargs):
+        return self.dense_retriever.encode_queries(queries, **kwargs)
+
+    def retrieve(self, queries, k=10, **kwargs):
+        """
+        Retrieve documents for text queries with both retrievers and fuse them.
+
+        Parameters
+        ----------
+        queries: list of strings or string
+            The queries to search for.
+
+        k: int
+            The number of documents to retrieve for each query.
+
+        **kwargs: dict
+            Additional keyword arguments to pass to the query encoder.
+
+        Returns
+        -------
+        dict
+            A dictionary containing the fused scores and indices of the retrieved
+            documents, see `fuse_results`.
+
+            - scores: numpy.ndarray of shape (n_queries, k)
+            - indices: numpy.ndarray of shape (n_queries, k)
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        if isinstance(queries, str):
+            queries = [queries]
+
+        n_candidates = max(k, self.n_candidates)
+        with ThreadPoolExecutor(2) as executor:
+            dense = executor.submit(
+                self.dense_retriever.retrieve, queries, k=n_candidates, **kwargs
+            )
+            sparse_kwargs = {}
+            if self.bm25_threads is not None:
+                sparse_kwargs["threads"] = self.bm25_threads
+            sparse = executor.submit(
+                self.sparse_retriever.retrieve, queries, k=n_candidates, **sparse_kwargs
+            )
+            results = [dense.result(), sparse.result()]
+
+        return self.fuse_results(
+            results,
+            k=k,
+            fusion=self.fusion,
+            weights=self.weights,
+            rrf_k=self.rrf_k,
+            higher_is_better=[
+                getattr(retriever.index, "higher_is_better", True)
+                for retriever in (self.dense_retriever, self.sparse_retriever)
+            ],
+        )
+
+    @staticmethod
+    def fuse_results(results, k=10, fusion="rrf", weights=None, rrf_k=60, higher_is_better=None):
+        """
+        Fuse the rankings of several retrievers into one.
+
+        Parameters
+        ----------
+        results: list of dicts
+            The results of each retriever, with scores and indices of shape
+            (n_queries, n_candidates), ranked best first. Indices of -1 are ignored.
+
+        k: int
+            The number of documents to keep for each query.
+
+        fusion: str
+            "rrf" to score documents by the sum of `weight / (rrf_k + rank)` over
+            the retrievers that found them, with ranks starting at 1. "weighted" to
+            score them by the sum of their weighted scores, min-max normalized per
+            query and retriever, so that the worst candidate of a retriever counts
+            as much as a document it did not find.
+
+        weights: list of floats
+            The weight of each retriever. Defaults to 1 for all.
+
+        rrf_k: int
+            The constant added to ranks in reciprocal rank fusion.
+
+        higher_is_better: list of bools
+            Whether each retriever ranks documents by decreasing score. Defaults to
+            True for all.
+
+        Returns
+        -------
+        dict
+            The fused scores and indices, of shape (n_queries, k), ranked by
+            decreasing fused score, then by increasing index. Queries with fewer
+            than `k` candidates are padded with an index of -1 and a score of -inf.
+        """
+        if weights is None:
+            weights = [1.0] * len(results)
+        if higher_is_better is None:
+            higher_is_better = [True] * len(results)
+
+        n_queries = len(results[0]["indices"])
+        fused_scores = np.full((n_queries, k), -np.inf, dtype=np.float32)
+        fused_indices = np.full((n_queries, k), -1, dtype=np.int64)
+        for i in range(n_queries):
+            candidates = []
+            contributions = []
+            for result, weight, higher in zip(results, weights, higher_is_better):
+                indices = np.asarray(result["indices"][i], dtype=np.int64)
+                scores = np.asarray(result["scores"][i], dtype=np.float64)
+                valid = indices >= 0
+                indices, scores = indices[valid], scores[valid]
+                if fusion == "rrf":
+                    contribution = weight / (rrf_k + np.arange(1, len(indices) + 1))
+                else:
+                    scores = scores if higher else -scores
+                    spread = scores.max() - scores.min() if len(scores) else 0.0
+                    if spread > 0:
+                        contribution = weight * (scores - scores.min()) / spread
+                    else:
+                        contribution = np.full(len(scores), float(weight))
+                candidates.append(indices)
+                contributions.append(contribution)
+
+            candidates, inverse = np.unique(np.concatenate(candidates), return_inverse=True)
+            scores = np.zeros(len(candidates))
+            np.add.at(scores, inverse, np.concatenate(contributions))
+            order = np.lexsort((candidates, -scores))[:k]
+            fused_scores[i, : len(order)] = scores[order]
+            fused_indices[i, : len(order)] = candidates[order]
+
+        return {"scores": fused_scores, "indices": fused_indices}
@@ -0,0 +1,464 @@
+"""
+Benchmarks of the build time, memory, query latency and recall of indexes, to pick
+index types and parameters for a corpus on given hardware.
+
+Each index is built and searched in a fresh process, so that its memory is measured
+on its own. Dense indexes are compared to exact inner product search over the same
+embeddings, and BM25 indexes to `IndexNumpyBM25`, whose scoring is exact.
+
+Examples
+--------
+>>> from instruct_qa.retrieval.benchmark import run_benchmark
+>>> report = run_benchmark(
+...     ["faiss-flat", "hnsw"],
+...     num_documents=10000,
+...     dim=64,
+...     index_params={"hnsw": [{"ef_search": 32}, {"ef_search": 128}]},
+... )
+>>> [(run["name"], run["recall"]) for run in report["runs"]]
+"""
+import logging
+import multiprocessing as mp
+import os
+import platform
+import queue
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from instruct_qa.retrieval.index import (
+    IndexBase,
+    IndexFaissFlatIP,
+    IndexFaissFlatSQ,
+    IndexFaissHNSW,
+    IndexFaissIVFPQ,
+    IndexNumpyBM25,
+    IndexPyseriniBM25,
+    IndexTorchFlat,
+)
+
+logger = logging.getLogger(__name__)
+
+DENSE_INDEX_TYPES = ["torch-flat", "faiss-flat", "hnsw", "ivfpq", "sq8", "fp16"]
+SPARSE_INDEX_TYPES = ["bm25-numpy", "bm25-pyserini"]
+INDEX_TYPES = DENSE_INDEX_TYPES + SPARSE_INDEX_TYPES
+
+
+def get_memory_usage():
+    """
+    Resident memory of the current process in MiB, split into anonymous memory and
+    file pages, which memory-mapped indexes share with other processes, and its peak
+    (VmHWM). The split and the peak are only available on Linux.
+    """
+    usage = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, value = line.split(":", 1)
+                if key in ("VmRSS", "VmHWM", "RssAnon", "RssFile"):
+                    usage[key] = int(value.split()[0]) / 1024
+    except OSError:
+        import resource
+
+        usage["VmRSS"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return usage
+
+
+def write_synthetic_embeddings(
+    path, num_documents, dim, n_clusters=1000, chunk_size=100000, seed=0
+):
+    """
+    Write embeddings drawn around random cluster centers to a .npy file, `chunk_size`
+    at a time. Clustered embeddings are closer to those of real encoders than i.i.d.
+    Gaussian ones, on which approximate indexes have a pessimistic recall.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim)).astype(np.float32)
+    embeddings = np.lib.format.open_memmap(
+        path, mode="w+", dtype=np.float32, shape=(num_documents, dim)
+    )
+    for start in range(0, num_documents, chunk_size):
+        stop = min(start + chunk_size, num_documents)
+        clusters = rng.integers(n_clusters, size=stop - start)
+        noise = rng.normal(scale=0.5, size=(stop - start, dim))
+        embeddings[start:stop] = centers[clusters] + noise
+    embeddings.flush()
+    return np.load(path, mmap_mode="r")
+
+
+def write_sampled_embeddings(path, source_path, num_documents, chunk_size=100000, seed=0):
+    """
+    Write `num_documents` embeddings sampled from a .npy file, e.g. the embeddings
+    exported from an index with `export_embeddings`, to another .npy file.
+    """
+    source = np.load(source_path, mmap_mode="r")
+    if num_documents is None or num_documents >= len(source):
+        num_documents = len(source)
+    rows = np.sort(
+        np.random.default_rng(seed).choice(len(source), size=num_documents, replace=False)
+    )
+    embeddings = np.lib.format.open_memmap(
+        path, mode="w+", dtype=np.float32, shape=(num_documents, source.shape[1])
+    )
+    for start in range(0, num_documents, chunk_size):
+        embeddings[start : start + chunk_size] = source[rows[start : start + chunk_size]]
+    embeddings.flush()
+    return np.load(path, mmap_mode="r")
+
+
+def make_queries(embeddings, num_queries, noise=1.0, seed=0):
+    """
+    Queries near documents: embeddings of sampled documents, perturbed with Gaussian
+    noise scaled by `noise` times the standard deviation of the embeddings.
+    """
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(len(embeddings), size=num_queries, replace=False))
+    sample = np.asarray(embeddings[rows], dtype=np.float32)
+    return (sample + rng.normal(scale=noise * sample.std(), size=sample.shape)).astype(
+        np.float32
+    )
+
+
+def make_synthetic_texts(
+    num_documents, num_queries, vocab_size=50000, doc_length=100, query_length=8, seed=0
+):
+    """
+    Documents and queries of words drawn from a Zipf distribution over a vocabulary
+    of `vocab_size` words, which approximates the term statistics of real text.
+    Queries are sampled from the words of a random document.
+    """
+    rng = np.random.default_rng(seed)
+    ranks = np.arange(1, vocab_size + 1)
+    probabilities = 1 / ranks / np.sum(1 / ranks)
+    vocab = np.array([f"w{i}" for i in range(vocab_size)])
+    lengths = rng.poisson(doc_length, size=num_documents).clip(1)
+    documents = []
+    for length in lengths:
+        documents.append(" ".join(vocab[rng.choice(vocab_size, size=length, p=probabilities)]))
+    queries = []
+    for i in rng.integers(num_documents, size=num_queries):
+        words = documents[i].split()
+        queries.append(" ".join(rng.choice(words, size=min(query_length, len(words)))))
+    return documents, queries
+
+
+def exact_search(embeddings, queries, k=10, chunk_size=100000):
+    """
+    The indices of the top `k` documents of each query by inner product, scoring
+    `chunk_size` documents at a time. The embeddings of the documents can be an
+    array, or an index to read them from with `get_embeddings`.
+    """
+    if isinstance(embeddings, IndexBase):
+        embeddings = _IndexEmbeddings(embeddings)
+
+    top_scores = np.empty((len(queries), 0), dtype=np.float32)
+    top_indices = np.empty((len(queries), 0), dtype=np.int64)
+    for start in range(0, len(embeddings), chunk_size):
+        scores = queries @ np.asarray(embeddings[start : start + chunk_size]).T
+        indices = np.broadcast_to(np.arange(start, start + scores.shape[1]), scores.shape)
+        scores = np.concatenate([top_scores, scores], axis=1)
+        indices = np.concatenate([top_indices, indices], axis=1)
+        order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        top_scores = np.take_along_axis(scores, order, axis=1)
+        top_indices = np.take_along_axis(indices, order, axis=1)
+    return top_indices
+
+
+class _IndexEmbeddings(object):
+    # Slices of the embeddings of an index, like those of an array.
+    def __init__(self, index):
+        self.index = index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, item):
+        return self.index.get_embeddings(item.start, item.stop)
+
+
+def recall_at_k(indices, exact_indices, k=10):
+    """
+    The mean fraction of the exact top `k` documents of each query found in the top
+    `k` documents retrieved for it.
+    """
+    return float(
+        np.mean(
+            [
+                len(set(retrieved[:k]) & set(exact[:k]) - {-1}) / k
+                for retrieved, exact in zip(indices, exact_indices)
+            ]
+        )
+    )
+
+
+def measure_latency(index, queries, k=10, batch_sizes=(1, 16, 128), max_batches=100):
+    """
+    Time searches of batches of queries of each size, after one untimed search.
+
+    Returns
+    -------
+    dict
+        For each batch size, the median and 99th percentile of the latency of a
+        search in milliseconds, and the number of queries searched per second.
+    """
+    latency = {}
+    for batch_size in batch_sizes:
+        starts = list(range(0, len(queries) - batch_size + 1, batch_size))[:max_batches]
+        if not starts:
+            continue
+        index.search(queries[:batch_size], k=k)
+        times = []
+        for start in starts:
+            begin = time.perf_counter()
+            index.search(queries[start : start + batch_size], k=k)
+            times.append(time.perf_counter() - begin)
+        times = np.array(times)
+        latency[batch_size] = {
+            "p50_ms": float(np.percentile(times, 50) * 1000),
+            "p99_ms": float(np.percentile(times, 99) * 1000),
+            "queries_per_s": float(batch_size * len(times) / times.sum()),
+            "n_batches": len(times),
+        }
+    return latency
+
+
+def build_index(index_type, data, directory=None, **params):
+    """
+    Build an index of the given type over embeddings (for dense index types) or the
+    texts of documents (for BM25 index types). Pyserini indexes are built on disk,
+    in `directory`.
+    """
+    if index_type == "torch-flat":
+        return IndexTorchFlat(np.asarray(data), **params)
+    if index_type == "faiss-flat":
+        return IndexFaissFlatIP(np.asarray(data), **params)
+    if index_type == "hnsw":
+        return IndexFaissHNSW(data, **params)
+    if index_type == "ivfpq":
+        return IndexFaissIVFPQ(data, **params)
+    if index_type in ("sq8", "fp16"):
+        return IndexFaissFlatSQ(data, qtype="int8" if index_type == "sq8" else "fp16", **params)
+    if index_type == "bm25-numpy":
+        return IndexNumpyBM25(data, **params)
+    if index_type == "bm25-pyserini":
+        records = [{"index": i, "text": text} for i, text in enumerate(data)]
+        IndexPyseriniBM25.build_index(records, directory, **params)
+        return IndexPyseriniBM25.load(directory)
+    raise ValueError(f"Unknown index type {index_type}. Use one of {INDEX_TYPES}.")
+
+
+def benchmark_index(
+    index_type, data_dir, k=10, batch_sizes=(1, 16, 128), max_batches=100, **params
+):
+    """
+    Build an index over the data written to `data_dir` by `run_benchmark`, and
+    measure it. Called in a fresh process by `run_benchmark`.
+    """
+    data_dir = Path(data_dir)
+    if index_type in DENSE_INDEX_TYPES:
+        data = np.load(data_dir / "embeddings.npy", mmap_mode="r")
+        queries = np.load(data_dir / "queries.npy")
+    else:
+        with open(data_dir / "documents.txt") as f:
+            data = [line.rstrip("\n") for line in f]
+        with open(data_dir / "queries.txt") as f:
+            queries = [line.rstrip("\n") for line in f]
+    exact_indices = np.load(data_dir / "exact.npy")
+
+    # Libraries are imported before measuring memory, which then grows by the index.
+    if index_type in DENSE_INDEX_TYPES:
+        import torch  # noqa: F401
+
+        if index_type != "torch-flat":
+            import faiss  # noqa: F401
+    before = get_memory_usage()
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(dir=data_dir) as directory:
+        index = build_index(index_type, data, directory=directory, **params)
+        build_time = time.perf_counter() - start
+        after = get_memory_usage()
+        del data
+
+        indices = index.search(queries, k=k)["indices"]
+        return {
+            "build_s": build_time,
+            "memory_mib": {key: after[key] - before.get(key, 0) for key in after},
+            "recall": recall_at_k(indices, exact_indices, k),
+            "latency": measure_latency(index, queries, k, batch_sizes, max_batches),
+        }
+
+
+def _run(index_type, data_dir, kwargs, results):
+    try:
+        results.put(benchmark_index(index_type, data_dir, **kwargs))
+    except Exception as e:
+        results.put({"error": f"{type(e).__name__}: {' '.join(str(e).split())}"})
+
+
+def _run_name(index_type, params):
+    if not params:
+        return index_type
+    return index_type + " " + " ".join(f"{key}={value}" for key, value in params.items())
+
+
+def run_benchmark(
+    index_types: List[str],
+    num_documents=100000,
+    dim=768,
+    num_queries=1000,
+    k=10,
+    batch_sizes=(1, 16, 128),
+    max_batches=100,
+    embeddings_file=None,
+    index_params: Dict = None,
+    work_dir=None,
+    seed=0,
+):
+    """
+    Benchmark index types, each in a fresh process, on the same data.
+
+    Parameters
+    ----------
+    index_types: list of strings
+        The index types to benchmark, from `INDEX_TYPES`.
+
+    num_documents: int
+        The number of documents to index. With `embeddings_file`, they are sampled
+        from it, and all its embeddings are used if None.
+
+    dim: int
+        The dimension of synthetic embeddings.
+
+    num_queries: int
+        The number of queries used to measure recall and latency.
+
+    k: int
+        The number of documents retrieved per query.
+
+    batch_sizes: list of ints
+        The numbers of queries searched at a time when measuring latency.
+
+    max_batches: int
+        The maximum number of searches timed for each batch size.
+
+    embeddings_file: str
+        Optional path to a .npy file of document embeddings to sample from instead of
+        generating synthetic ones. Queries are perturbed sampled documents either way.
+
+    index_params: dict
+        Keyword arguments of the constructor of each index type. A list of dicts
+        benchmarks each set of arguments in turn, e.g. to sweep a parameter.
+
+    work_dir: str
+        The directory in which the data and the indexes built on disk are written.
+        A temporary directory is used if None.
+
+    seed: int
+        Seed for RNG.
+
+    Returns
+    -------
+    dict
+        The configuration of the benchmark, a description of the machine, and one
+        entry per run with its build time, memory growth in MiB while building,
+        recall@k, and latency for each batch size (see `measure_latency`). Runs that
+        fail have an error instead.
+    """
+    unknown = set(index_types) - set(INDEX_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown index types {sorted(unknown)}. Use some of {INDEX_TYPES}.")
+    index_params = index_params or {}
+
+    with tempfile.TemporaryDirectory(dir=work_dir) as data_dir:
+        data_dir = Path(data_dir)
+        config = {
+            "num_documents": num_documents,
+            "dim": dim,
+            "num_queries": num_queries,
+            "k": k,
+            "batch_sizes": list(batch_sizes),
+            "embeddings_file": embeddings_file,
+            "seed": seed,
+        }
+
+        runs = []
+        if any(index_type in DENSE_INDEX_TYPES for index_type in index_types):
+            logger.info("Generating embeddings...")
+            path = data_dir / "embeddings.npy"
+            if embeddings_file is not None:
+                embeddings = write_sampled_embeddings(
+                    path, embeddings_file, num_documents, seed=seed
+                )
+            else:
+                embeddings = write_synthetic_embeddings(path, num_documents, dim, seed=seed)
+            config["num_documents"], config["dim"] = embeddings.shape
+            queries = make_queries(embeddings, num_queries, seed=seed)
+            np.save(data_dir / "queries.npy", queries)
+            np.save(data_dir / "exact.npy", exact_search(embeddings, queries, k))
+            del embeddings
+            runs += _run_all(
+                [t for t in index_types if t in DENSE_INDEX_TYPES],
+                data_dir,
+                index_params,
+                dict(k=k, batch_sizes=batch_sizes, max_batches=max_batches),
+            )
+
+        if any(index_type in SPARSE_INDEX_TYPES for index_type in index_types):
+            logger.info("Generating texts...")
+            documents, queries = make_synthetic_texts(num_documents, num_queries, seed=seed)
+            with open(data_dir / "documents.txt", "w") as f:
+                f.writelines(document + "\n" for document in documents)
+            with open(data_dir / "queries.txt", "w") as f:
+                f.writelines(query + "\n" for query in queries)
+            reference = IndexNumpyBM25(documents).search(queries, k=k)["indices"]
+            np.save(data_dir / "exact.npy", reference)
+            del documents, reference
+            runs += _run_all(
+                [t for t in index_types if t in SPARSE_INDEX_TYPES],
+                data_dir,
+                index_params,
+                dict(k=k, batch_sizes=batch_sizes, max_batches=max_batches),
+            )
+
+    return {
+        "config": config,
+        "machine": {
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+        },
+        "runs": runs,
+    }
+
+
+def _run_all(index_types, data_dir, index_params, kwargs):
+    context = mp.get_context("spawn")
+    runs = []
+    for index_type in index_types:
+        param_sets = index_params.get(index_type, {})
+        if isinstance(param_sets, dict):
+            param_sets = [param_sets]
+        for params in param_sets:
+            name = _run_name(index_type, params)
+            logger.info(f"Benchmarking {name}...")
+            results = context.Queue()
+            process = context.Process(
+                target=_run, args=(index_type, data_dir, {**kwargs, **params}, results)
+            )
+            process.start()
+            while True:
+                try:
+                    run = results.get(timeout=1)
+                    break
+                except queue.Empty:
+                    if not process.is_alive():
+                        exitcode = process.exitcode
+                        run = {"error": f"The process exited with code {exitcode}."}
+                        break
+            process.join()
+            runs.append({"name": name, "index_type": index_type, "params": params, **run})
+            logger.info(f"{name}: {run}")
+    return runs
@@ -1,10 +1,30 @@
 import abc
+import array
+import bisect
+import json
 from pathlib import Path
+import os
+import re
 import sys
-from typing import Dict, List
+import warnings
+from typing import Dict, Iterable, List
 
 import numpy as np
 
+from instruct_qa.segments import check_segment_start, get_segment_path, list_segments
+
+SEGMENT_SUFFIX = ".npy"
+SHARD_PREFIX = "shard-"
+# Suffix of the file of tuned search parameters saved next to an index file.
+SEARCH_PARAMS_SUFFIX = ".search.json"
+# The default stop words of Lucene's English analyzer, which Pyserini uses.
+ENGLISH_STOPWORDS = frozenset(
+    "a an and are as at be but by for if in into is it no not of on or such that the "
+    "their then there these they this to was will with".split()
+)
+BM25_VERSION = 1
+_BM25_CHUNK_SIZE = 100000
+
 
 def _to_np(tensor):
     import torch
@@ -15,8 +35,78 @@ def _to_np(tensor):
         return np.array(tensor)
 
 
+def _read_faiss_index(path, mmap=False, ivf=False):
+    """
+    Read a faiss index from a file.
+
+    With `mmap`, the vectors of flat and HNSW indexes, or the inverted lists of IVF
+    indexes (`ivf`), are memory-mapped read-only instead of being read into memory.
+    Pages are then read on first access and shared by all the processes that map the
+    same file, but the index can no longer be added to.
+
+    Versions of faiss before 1.8 cannot memory-map flat and HNSW indexes, which are
+    then read into memory with a warning.
+
+    Returns
+    -------
+    tuple
+        The faiss index, and whether it is memory-mapped.
+    """
+    import faiss
+
+    if not mmap:
+        return faiss.read_index(str(path)), False
+    if ivf:
+        flags = faiss.IO_FLAG_MMAP
+    else:
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+        if flags is None:
+            warnings.warn(
+                f"This version of faiss ({faiss.__version__}) cannot memory-map flat "
+                "and HNSW indexes, reading the index into memory instead."
+            )
+            return faiss.read_index(str(path)), False
+    return faiss.read_index(str(path), flags), True
+
+
+def save_search_params(path, params: Dict):
+    """
+    Save search parameters of the index file at `path` next to it, e.g. as chosen by
+    `instruct_qa.retrieval.tuning.tune_search_param`. Indexes with a `search_param`
+    apply its value when loaded from that file.
+    """
+    with open(str(path) + SEARCH_PARAMS_SUFFIX, "w") as f:
+        json.dump(params, f, indent=2)
+
+
+def load_search_params(path) -> Dict:
+    """
+    Load the search parameters saved next to the index file at `path` with
+    `save_search_params`, or an empty dict if there are none.
+    """
+    path = str(path) + SEARCH_PARAMS_SUFFIX
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _check_not_mmapped(index):
+    # Adding to memory-mapped vectors aborts the process in faiss, rather than raising.
+    if index.mmap:
+        raise ValueError("Cannot add to an index loaded with mmap=True.")
+
+
 class IndexBase(metaclass=abc.ABCMeta):
     not_implemented_error = "This method is not implemented for this index type."
+    # Whether `search` ranks documents by decreasing score. Indexes that return
+    # distances rank them by increasing score instead.
+    higher_is_better = True
+    # Name of the attribute that trades the accuracy of `search` for its speed, if
+    # any. Its tuned value is saved next to the index file, see `save_search_params`.
+    search_param = None
+    # The background warm-up started with `start_warmup`, if any.
+    warmup = None
 
     @abc.abstractmethod
     def __init__(self):
@@ -71,6 +161,77 @@ class IndexBase(metaclass=abc.ABCMeta):
         """
         raise NotImplementedError(self.not_implemented_error)
 
+    def add(self, embeddings):
+        """
+        Append the embeddings of new documents to the index, in place. The new
+        documents get the next indices, so they must be appended to the collection
+        in the same order (see `PassageCollection.add_passages`).
+
+        Parameters
+        ----------
+        embeddings: numpy.ndarray or torch.Tensor
+            The embeddings of the new documents, of shape (n_documents, embedding_dim).
+
+        Notes
+        -----
+        This method is not implemented for all index types. For example,
+        it is not implemented for BM25.
+        """
+        raise NotImplementedError(self.not_implemented_error)
+
+    def save_segment(self, directory: str, start_ix: int) -> str:
+        """
+        Persist the embeddings of the documents from `start_ix` on (e.g. those added
+        with `add`) as a segment in `directory`, without saving the whole index.
+        Segments are added back with `load_segments`, after the index itself.
+
+        Returns
+        -------
+        str
+            The path of the segment, a .npy file of embeddings.
+        """
+        os.makedirs(directory, exist_ok=True)
+        path = get_segment_path(directory, start_ix, SEGMENT_SUFFIX)
+        np.save(path, self.get_embeddings(start_ix))
+        return path
+
+    def load_segments(self, directory: str):
+        """
+        Add the segments saved in `directory` with `save_segment` to the index, in order.
+        """
+        for start_ix, path in list_segments(directory, SEGMENT_SUFFIX):
+            check_segment_start(start_ix, len(self), path)
+            self.add(np.load(path))
+
+    @staticmethod
+    def merge_segments(directory: str) -> str:
+        """
+        Merge the segments saved in `directory` into a single segment.
+
+        Returns
+        -------
+        str
+            The path of the merged segment, or None if there are no segments.
+        """
+        segments = list_segments(directory, SEGMENT_SUFFIX)
+        if len(segments) < 2:
+            return segments[0][1] if segments else None
+
+        embeddings = []
+        size = segments[0][0]
+        for start_ix, path in segments:
+            check_segment_start(start_ix, size, path)
+            embeddings.append(np.load(path, mmap_mode="r"))
+            size += len(embeddings[-1])
+
+        path = segments[0][1]
+        tmp_path = path + ".tmp" + SEGMENT_SUFFIX
+        np.save(tmp_path, np.concatenate(embeddings))
+        os.replace(tmp_path, path)
+        for _, segment_path in segments[1:]:
+            os.remove(segment_path)
+        return path
+
     @abc.abstractmethod
     def search(self, queries, k=10):
         """
@@ -94,9 +255,39 @@ class IndexBase(metaclass=abc.ABCMeta):
         """
         pass
 
+    def start_warmup(self, files: List[str] = (), queries=None, k=10, batch_size=32):
+        """
+        Start warming up the index in a background thread, see
+        `instruct_qa.warmup.Warmup`. The index can be searched meanwhile; once
+        `warmup.ready` is set, searches no longer wait on the disk.
+
+        Parameters
+        ----------
+        files: list of strings
+            The files the index maps, e.g. its file when loaded with mmap=True, or
+            the embeddings used for re-scoring, to read into the page cache.
+
+        queries: numpy.ndarray or list of strings
+            Optional sample of queries to search once the files are read.
+
+        k, batch_size:
+            See `instruct_qa.warmup.Warmup`.
+
+        Returns
+        -------
+        instruct_qa.warmup.Warmup
+            The warm-up, also set as the `warmup` attribute of the index.
+        """
+        from instruct_qa.warmup import Warmup
+
+        self.warmup = Warmup(
+            files=files, search=self.search, queries=queries, k=k, batch_size=batch_size
+        )
+        return self.warmup.start()
+
 
 class IndexTorchFlat(IndexBase):
-    def __init__(self, embeddings, sim_func="dot", device="auto"):
+    def __init__(self, embeddings, sim_func="dot", device="auto", block_size=65536, n_jobs=-1):
         """
         Parameters
         ----------
@@ -108,30 +299,33 @@ class IndexTorchFlat(IndexBase):
             The similarity function to use when searching the index. If a string
             is provided, it must be one of "cosine" or "dot". If a callable is
             provided, it must take two arguments (the query and document embeddings)
-            and return a similarity score.
+            and return a similarity score. It must score each document on its own,
+            since documents are scored `block_size` at a time (see `search`).
+            With "cosine", the index holds L2-normalized embeddings and their norms,
+            computed once, so that searching only takes dot products.
 
         device: str
             The device to use when converting the embeddings to a torch tensor.
             If "auto", the device will be determined automatically. If None, the
             embeddings will not be moved to a device.
+
+        block_size: int
+            The number of documents scored at a time when searching, which bounds
+            the size of the score matrices to `n_queries * block_size`.
+
+        n_jobs: int
+            The number of threads scoring blocks of documents in parallel. If -1, use
+            the number of CPUs divided by `torch.get_num_threads()`, since each block
+            is already multiplied on that many threads, or a single thread if the
+            index is on a GPU.
         """
         import torch
 
         error_message = f'Unknown similarity function {sim_func}. Use "cosine", "dot", or provide a function.'
 
+        self.normalized = sim_func == "cosine"
         if isinstance(sim_func, str):
-            if sim_func == "cosine":
-
-                def cosine(x, y):
-                    denom = (
-                        torch.norm(x, dim=1, keepdim=True)
-                        * torch.norm(y, dim=1, keepdim=True).t()
-                    )
-                    return torch.mm(x, y.t()) / denom
-
-                sim_func = cosine
-
-            elif sim_func in ["dot", "dot_product"]:
+            if sim_func in ["cosine", "dot", "dot_product"]:
 
                 def dot(x, y):
                     return torch.mm(x, y.t())
@@ -157,45 +351,189 @@ class IndexTorchFlat(IndexBase):
         if device is not None:
             self.index = self.index.to(device)
 
+        # Norms of the documents, to recover their embeddings when normalized.
+        self.norms = None
+        if self.normalized:
+            self.index, self.norms = self._normalize(self.index)
+
+        self.block_size = block_size
+        self.n_jobs = n_jobs
+
     def __len__(self):
         return self.index.shape[0]
 
-    def save(self, directory="index", filename="flat.index.pt"):
+    def save(self, directory="index", filename="flat.index.npy"):
+        """
+        Save the embeddings to a .npy file, which `load` can memory-map. Filenames
+        ending with .pt are saved with `torch.save` instead, as in earlier versions.
+        """
         import torch
 
         directory = Path(directory)
         directory.mkdir(parents=True, exist_ok=True)
-        torch.save(self.index, directory / filename)
+        if Path(filename).suffix == ".pt":
+            torch.save(self._denormalize(self.index, self.norms), directory / filename)
+            return
+
+        # Written a block at a time, so cosine indexes are not denormalized at once.
+        embeddings = np.lib.format.open_memmap(
+            directory / filename,
+            mode="w+",
+            dtype=_to_np(self.index[:0]).dtype,
+            shape=tuple(self.index.shape),
+        )
+        for start in range(0, len(self), self.block_size):
+            embeddings[start : start + self.block_size] = self.get_embeddings(
+                start, start + self.block_size
+            )
+        embeddings.flush()
 
     @classmethod
-    def load(cls, directory="index", filename="flat.index.pt", device="auto"):
+    def load(
+        cls, directory="index", filename="flat.index.npy", device="auto", mmap=False, **kwargs
+    ):
+        """
+        Load an index from a directory.
+
+        Parameters
+        ----------
+        directory: str
+            The directory to load the index from.
+
+        filename: str
+            The name of the file to load the index from, a .npy file written by
+            `save`, or a .pt file written by `torch.save` in earlier versions, which
+            is read into memory. Re-save .pt indexes to a .npy file to memory-map them.
+            If the .npy file does not exist, the .pt file of the same name (e.g.
+            flat.index.pt, the default filename of earlier versions) is loaded.
+
+        device: str
+            See `__init__`.
+
+        mmap: bool
+            Whether to memory-map the embeddings from a .npy file instead of reading
+            them into memory. On the CPU, with the dot product, the index then wraps
+            the mapped file without copying it: loading is immediate, pages are read
+            on first access, and processes that load the same file share them. The
+            mapping is copy-on-write, so the file is never modified. Cosine indexes
+            normalize the embeddings into memory.
+
+        **kwargs: dict
+            Additional keyword arguments to pass to the constructor (e.g. sim_func).
+        """
         import torch
 
-        directory = Path(directory)
-        return cls(torch.load(directory / filename), device=device)
+        path = Path(directory) / filename
+        if path.suffix == ".npy" and not path.exists() and path.with_suffix(".pt").exists():
+            path = path.with_suffix(".pt")
+            if mmap:
+                warnings.warn(f"{path} is read into memory, re-save it to memory-map it.")
+        if path.suffix == ".pt":
+            return cls(torch.load(path), device=device, **kwargs)
+
+        embeddings = np.load(path, mmap_mode="c" if mmap else None)
+        return cls(torch.from_numpy(embeddings), device=device, **kwargs)
 
     def get_embeddings(self, start_ix=0, end_ix=-1):
         if end_ix == -1:
             end_ix = self.index.shape[0]
         end_ix = min(end_ix, self.index.shape[0])
 
-        return _to_np(self.index[start_ix:end_ix])
+        norms = None if self.norms is None else self.norms[start_ix:end_ix]
+        return _to_np(self._denormalize(self.index[start_ix:end_ix], norms))
+
+    def add(self, embeddings):
+        import torch
+
+        embeddings = torch.as_tensor(embeddings, dtype=self.index.dtype).to(self.index.device)
+        if self.normalized:
+            embeddings, norms = self._normalize(embeddings)
+            self.norms = torch.cat([self.norms, norms])
+        self.index = torch.cat([self.index, embeddings])
 
     def search(self, queries, k=10):
+        """
+        Search the index, `block_size` documents at a time. Each block is scored and
+        reduced to its top `k` documents in a thread, and the running top `k` of
+        each query is merged with the blocks in order, so only `n_jobs` score matrices
+        of `n_queries * block_size` are held at a time.
+
+        The results are the same as scoring all the documents at once, as long as
+        the matrix product gives the same scores on blocks as on the whole index,
+        which holds for CPU BLAS kernels with blocks of a few thousand documents or
+        more. Among documents with the same score, the one with the lowest index
+        comes first, whereas `torch.topk` orders them arbitrarily. If the index holds
+        fewer than `k` documents, results are padded with an index of -1 and a score
+        of -inf, as with the other indexes.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
         import torch
 
         if isinstance(queries, torch.Tensor):
             queries = queries
         else:
             queries = torch.tensor(queries)
+        queries = queries.to(self.index.device)
+        if self.normalized:
+            queries, _ = self._normalize(queries)
+
+        def search_block(start):
+            scores = self.sim_func(queries, self.index[start : start + self.block_size])
+            scores, indices = torch.topk(
+                scores, k=min(k, scores.shape[1]), dim=1, largest=True, sorted=True
+            )
+            return scores, indices + start
+
+        n_jobs = self.n_jobs
+        if n_jobs < 1:
+            if self.index.device.type == "cuda":
+                n_jobs = 1
+            else:
+                n_jobs = max(1, (os.cpu_count() or 1) // torch.get_num_threads())
+
+        top_scores = torch.empty((len(queries), 0), dtype=self.index.dtype)
+        top_indices = torch.empty((len(queries), 0), dtype=torch.long)
+        with ThreadPoolExecutor(n_jobs) as executor:
+            for scores, indices in executor.map(
+                search_block, range(0, len(self), self.block_size)
+            ):
+                scores = torch.cat([top_scores.to(scores.device), scores], dim=1)
+                indices = torch.cat([top_indices.to(indices.device), indices], dim=1)
+                # Sort by index, then stably by score, so that ties are ordered by index.
+                indices, order = torch.sort(indices, dim=1)
+                scores = torch.gather(scores, 1, order)
+                scores, order = torch.sort(scores, dim=1, descending=True, stable=True)
+                top_scores = scores[:, :k]
+                top_indices = torch.gather(indices, 1, order[:, :k])
+
+        scores, indices = _to_np(top_scores), _to_np(top_indices)
+        if indices.shape[1] < k:
+            padding = ((0, 0), (0, k - indices.shape[1]))
+            scores = np.pad(scores, padding, constant_values=-np.inf)
+            indices = np.pad(indices, padding, constant_values=-1)
+        return {"scores": scores, "indices": indices}
 
-        scores, indices = torch.topk(
-            self.sim_func(queries, self.index), k=k, dim=1, largest=True, sorted=True
-        )
-        return {"scores": _to_np(scores), "indices": _to_np(indices)}
+    @staticmethod
+    def _normalize(embeddings):
+        # Zero vectors stay zero, and get a cosine similarity of 0.
+        import torch
+
+        norms = torch.norm(embeddings, dim=1, keepdim=True)
+        return embeddings / norms.clamp_min(1e-12), norms
+
+    @staticmethod
+    def _denormalize(embeddings, norms):
+        # The embeddings are recovered up to float rounding.
+        if norms is None:
+            return embeddings
+        return embeddings * norms
 
 
 class IndexFaissFlatIP(IndexBase):
+    # Whether the index was loaded with `mmap=True`, see `load`.
+    mmap = False
+
     def __init__(self, embeddings):
         import faiss
 
@@ -215,7 +553,11 @@ class IndexFaissFlatIP(IndexBase):
             end_ix = self.index.ntotal
         end_ix = min(end_ix, self.index.ntotal)
 
-        return self.index.reconstruct_n(start_ix, end_ix)
+        return self.index.reconstruct_n(start_ix, end_ix - start_ix)
+
+    def add(self, embeddings):
+        _check_not_mmapped(self)
+        self.index.add(np.ascontiguousarray(_to_np(embeddings), dtype=np.float32))
 
     def save(self, directory="index", filename="flat.index.faiss"):
         import faiss
@@ -225,12 +567,27 @@ class IndexFaissFlatIP(IndexBase):
         faiss.write_index(self.index, str(directory / filename))
 
     @classmethod
-    def load(cls, directory="index", filename="flat.index.faiss"):
-        import faiss
+    def load(cls, directory="index", filename="flat.index.faiss", mmap=False):
+        """
+        Load an index from a directory.
 
-        directory = Path(directory)
-        index = faiss.read_index(str(directory / filename))
-        return cls(index)
+        Parameters
+        ----------
+        directory: str
+            The directory to load the index from.
+
+        filename: str
+            The name of the file to load the index from.
+
+        mmap: bool
+            Whether to memory-map the embeddings from the file, read-only, instead of
+            reading them into memory. Loading is then immediate, and processes that
+            load the same file share its pages. The index cannot be added to.
+        """
+        faiss_index, mapped = _read_faiss_index(Path(directory) / filename, mmap=mmap)
+        index = cls(faiss_index)
+        index.mmap = mapped
+        return index
 
     def search(self, queries, k=10):
         if not isinstance(queries, np.ndarray):
@@ -242,7 +599,55 @@ class IndexFaissFlatIP(IndexBase):
 
 
 class IndexFaissHNSW(IndexFaissFlatIP):
-    def __init__(self, embeddings, store_n=512, ef_search=128, ef_construction=200):
+    # Scores are L2 distances between the augmented vectors, see `add`.
+    higher_is_better = False
+    search_param = "ef_search"
+
+    def __init__(
+        self,
+        embeddings,
+        store_n=512,
+        ef_search=128,
+        ef_construction=200,
+        chunk_size=100000,
+        n_jobs=-1,
+        show_progress_bar=False,
+        phi=None,
+    ):
+        """
+        Parameters
+        ----------
+        embeddings: numpy.ndarray, torch.Tensor or faiss.IndexHNSWFlat
+            The embeddings of the documents, from which the index is built (see
+            `add`). They can be a memory-mapped array (e.g. from `from_file`), since
+            they are only read `chunk_size` rows at a time. If a faiss index is
+            provided, it is used directly.
+
+        store_n: int
+            The number of neighbors of each node in the HNSW graph.
+
+        ef_search: int
+            The size of the candidate list when searching. Higher is more accurate
+            but slower.
+
+        ef_construction: int
+            The size of the candidate list when building the graph.
+
+        chunk_size: int
+            The number of embeddings added to the graph at a time.
+
+        n_jobs: int
+            The number of threads faiss uses to build the graph. If -1, use all
+            available CPUs.
+
+        show_progress_bar: bool
+            Whether to show the progress of the build.
+
+        phi: float
+            The squared norm of the stored vectors, see `add`. Indexes built with
+            the same `phi` return comparable distances, e.g. the shards of an
+            `IndexSharded`. If None, the largest squared norm of the embeddings.
+        """
         import faiss
 
         if isinstance(embeddings, faiss.IndexHNSWFlat):
@@ -252,15 +657,104 @@ class IndexFaissHNSW(IndexFaissFlatIP):
             index.hnsw.efSearch = ef_search
             index.hnsw.efConstruction = ef_construction
             self.index = index
-            # TODO: load index from embeddings
+            if n_jobs > 0:
+                faiss.omp_set_num_threads(n_jobs)
+            self.add(
+                embeddings, chunk_size=chunk_size, show_progress_bar=show_progress_bar, phi=phi
+            )
 
     @classmethod
-    def load(cls, directory="index", filename="hnsw.index.faiss"):
-        import faiss
+    def from_file(cls, path, **kwargs):
+        """
+        Build an index from embeddings saved with `numpy.save`. The file is
+        memory-mapped, so only one chunk of embeddings is held in memory at a time.
 
-        directory = Path(directory)
-        index = faiss.read_index(str(directory / filename))
-        return cls(index)
+        Parameters
+        ----------
+        path: str
+            The path of the .npy file, holding an array of shape
+            (n_documents, embedding_dim).
+
+        **kwargs: dict
+            Additional keyword arguments to pass to the constructor.
+        """
+        return cls(np.load(path, mmap_mode="r"), **kwargs)
+
+    @property
+    def ef_search(self):
+        return self.index.hnsw.efSearch
+
+    @ef_search.setter
+    def ef_search(self, value):
+        self.index.hnsw.efSearch = value
+
+    def save(self, directory="index", filename="hnsw.index.faiss"):
+        super().save(directory, filename)
+
+    @classmethod
+    def load(cls, directory="index", filename="hnsw.index.faiss", mmap=False, ef_search=None):
+        """
+        Load an index from a directory. With `mmap`, the stored vectors are
+        memory-mapped and the graph is read into memory, see `IndexFaissFlatIP.load`.
+
+        The size of the candidate list when searching is `ef_search` if given, else
+        the value saved next to the index file with `save_search_params`, if any,
+        else the value saved in the index.
+        """
+        index = super().load(directory, filename, mmap=mmap)
+        if ef_search is None:
+            ef_search = load_search_params(Path(directory) / filename).get("ef_search")
+        if ef_search is not None:
+            index.ef_search = ef_search
+        return index
+
+    def get_embeddings(self, start_ix=0, end_ix=-1):
+        # Drop the auxiliary dimension, see `add`.
+        return super().get_embeddings(start_ix, end_ix)[:, :-1]
+
+    def add(self, embeddings, chunk_size=100000, show_progress_bar=False, phi=None):
+        """
+        Append embeddings to the index, `chunk_size` rows at a time.
+
+        The HNSW graph searches by L2 distance, so inner products are turned into
+        distances by adding an auxiliary dimension `sqrt(phi - |x|^2)` to each
+        document embedding `x`, where `phi` is the largest squared norm of the
+        documents, and a 0 to each query (see `search`). All stored vectors then have
+        a squared norm of `phi`. When the index is empty, `phi` is the given value, or
+        is computed over all the embeddings first; otherwise, it is read back from the
+        first stored vector.
+        Embeddings with a larger norm than `phi` get an auxiliary dimension of 0,
+        which makes their scores slightly inexact.
+        """
+        from tqdm import tqdm
+
+        _check_not_mmapped(self)
+
+        def iter_chunks(desc=None):
+            starts = range(0, len(embeddings), chunk_size)
+            if desc is not None and show_progress_bar:
+                starts = tqdm(starts, desc=desc, unit="chunk")
+            for start in starts:
+                chunk = _to_np(embeddings[start : start + chunk_size])
+                yield np.ascontiguousarray(chunk, dtype=np.float32)
+
+        if self.index.ntotal == 0:
+            if phi is None:
+                phi = 0.0
+                for chunk in iter_chunks("Computing norms"):
+                    phi = max(phi, float((chunk ** 2).sum(axis=1).max()))
+        else:
+            phi = float((self.index.reconstruct(0) ** 2).sum())
+
+        for chunk in iter_chunks("Building HNSW index"):
+            norms = (chunk ** 2).sum(axis=1)
+            if norms.max() > phi * (1 + 1e-6):
+                warnings.warn(
+                    "Some embeddings have a larger norm than the documents of the index, "
+                    "their inner products will be approximated."
+                )
+            aux_dim = np.sqrt(np.maximum(phi - norms, 0)).astype(np.float32)
+            self.index.add(np.hstack((chunk, aux_dim.reshape(-1, 1))))
 
     def search(self, queries, k=10):
         if not isinstance(queries, np.ndarray):
@@ -274,6 +768,440 @@ class IndexFaissHNSW(IndexFaissFlatIP):
         return {"scores": scores, "indices": indices}
 
 
+class _IndexFaissRescored(IndexBase):
+    """
+    Base class of faiss indexes of compressed vectors, whose candidates can be
+    re-scored with exact inner products against float32 embeddings, usually
+    memory-mapped from a .npy file.
+    """
+
+    # Whether the index was loaded with `mmap=True`, see `load`.
+    mmap = False
+    # Description of the progress bar when building the index.
+    build_description = "Building index"
+
+    def __init__(self, rescore_embeddings=None, rescore_factor=0):
+        self.rescore_embeddings = rescore_embeddings
+        self.rescore_factor = rescore_factor
+        # Exact embeddings added with `add` after `rescore_embeddings`.
+        self._added_embeddings = []
+
+    def __len__(self):
+        return self.index.ntotal
+
+    def save(self, directory, filename):
+        """
+        Save the faiss index. The exact embeddings used for re-scoring are not
+        saved, they are passed to `load` separately.
+        """
+        import faiss
+
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        faiss.write_index(self.index, str(directory / filename))
+
+    def get_embeddings(self, start_ix=0, end_ix=-1):
+        """
+        Get the exact embeddings if `rescore_embeddings` is set, and the decoded
+        (approximate) ones otherwise.
+        """
+        if end_ix == -1:
+            end_ix = len(self)
+        end_ix = min(end_ix, len(self))
+
+        if self.rescore_embeddings is not None:
+            return self._get_exact_embeddings(np.arange(start_ix, end_ix))
+        return self._reconstruct_n(start_ix, end_ix - start_ix)
+
+    def add(self, embeddings, chunk_size=100000, show_progress_bar=False):
+        _check_not_mmapped(self)
+        if self.rescore_embeddings is not None:
+            self._added_embeddings.append(np.array(_to_np(embeddings), dtype=np.float32))
+        self._add_chunks(embeddings, chunk_size, show_progress_bar)
+
+    def search(self, queries, k=10):
+        queries = np.ascontiguousarray(_to_np(queries), dtype=np.float32)
+        rescore = self.rescore_embeddings is not None and self.rescore_factor > 0
+        n_candidates = min(k * self.rescore_factor, len(self)) if rescore else k
+        scores, indices = self.index.search(queries, max(n_candidates, k))
+        if not rescore:
+            return {"scores": scores, "indices": indices}
+        return self._rescore(queries, indices, k)
+
+    @staticmethod
+    def _load_rescore_embeddings(embeddings_path, size):
+        if embeddings_path is None:
+            return None
+        rescore_embeddings = np.load(embeddings_path, mmap_mode="r")
+        if len(rescore_embeddings) != size:
+            raise ValueError(
+                f"{embeddings_path} holds {len(rescore_embeddings)} embeddings, "
+                f"but the index holds {size} documents."
+            )
+        return rescore_embeddings
+
+    def _reconstruct_n(self, start_ix, n):
+        return self.index.reconstruct_n(start_ix, n)
+
+    def _add_chunks(self, embeddings, chunk_size, show_progress_bar):
+        from tqdm import tqdm
+
+        starts = range(0, len(embeddings), chunk_size)
+        if show_progress_bar:
+            starts = tqdm(starts, desc=self.build_description, unit="chunk")
+        for start in starts:
+            chunk = _to_np(embeddings[start : start + chunk_size])
+            self.index.add(np.ascontiguousarray(chunk, dtype=np.float32))
+
+    def _get_exact_embeddings(self, indices):
+        # Gather rows of `rescore_embeddings`, followed by the embeddings added since.
+        indices = np.asarray(indices, dtype=np.int64)
+        num_file = len(self.rescore_embeddings)
+        vectors = np.empty((len(indices), self.rescore_embeddings.shape[1]), dtype=np.float32)
+        in_file = indices < num_file
+        vectors[in_file] = self.rescore_embeddings[indices[in_file]]
+        if not in_file.all():
+            added = np.concatenate(self._added_embeddings)
+            vectors[~in_file] = added[indices[~in_file] - num_file]
+        return vectors
+
+    def _rescore(self, queries, candidates, k):
+        valid = candidates >= 0
+        # Read each candidate once, in file order, to keep memory-mapped reads sequential.
+        unique = np.unique(candidates[valid])
+        vectors = self._get_exact_embeddings(unique)
+        positions = np.searchsorted(unique, np.where(valid, candidates, 0))
+        positions = np.minimum(positions, max(len(unique) - 1, 0))
+
+        scores = np.full(candidates.shape, -np.inf, dtype=np.float32)
+        if len(unique) > 0:
+            exact = np.einsum("qd,qcd->qc", queries, vectors[positions])
+            scores = np.where(valid, exact, scores)
+        order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        return {
+            "scores": np.take_along_axis(scores, order, axis=1),
+            "indices": np.take_along_axis(candidates, order, axis=1),
+        }
+
+
+class IndexFaissIVFPQ(_IndexFaissRescored):
+    build_description = "Building IVF-PQ index"
+    search_param = "nprobe"
+
+    def __init__(
+        self,
+        embeddings,
+        n_lists=None,
+        m=64,
+        n_bits=8,
+        opq=False,
+        nprobe=32,
+        train_size=None,
+        rescore_embeddings=None,
+        rescore_factor=0,
+        chunk_size=100000,
+        n_jobs=-1,
+        show_progress_bar=False,
+        seed=0,
+    ):
+        """
+        Inverted file index with product-quantized vectors (IVF-PQ), optionally with
+        an OPQ rotation. Each document is stored in `m * n_bits / 8` bytes instead of
+        `4 * embedding_dim`, e.g. 64 bytes instead of 3 KB for DPR embeddings, so a
+        21M passage corpus fits in a few GB.
+
+        Parameters
+        ----------
+        embeddings: numpy.ndarray, torch.Tensor or faiss.Index
+            The embeddings of the documents, from which the index is trained and
+            built. They can be a memory-mapped array, since they are only read
+            `chunk_size` rows at a time (plus the training sample). If a faiss
+            index is provided, it is used directly.
+
+        n_lists: int
+            The number of inverted lists (k-means centroids). If None, it is set
+            to about 4 * sqrt(n_documents).
+
+        m: int
+            The number of sub-quantizers. It must divide the embedding dimension.
+
+        n_bits: int
+            The number of bits per sub-quantizer code.
+
+        opq: bool
+            Whether to learn a rotation of the embeddings (OPQ) before quantizing
+            them, which lowers the quantization error.
+
+        nprobe: int
+            The number of inverted lists visited per query. Higher is more accurate
+            but slower. It can be changed later through the `nprobe` attribute. If
+            None with a faiss index, the value saved in the index is kept.
+
+        train_size: int
+            The number of embeddings sampled to train the index. If None, 40 per
+            inverted list, and at least 40 per PQ centroid, as faiss recommends.
+
+        rescore_embeddings: numpy.ndarray
+            The exact float32 embeddings of the documents, usually memory-mapped
+            (see `load`). If given with `rescore_factor`, the candidates found with
+            the compressed vectors are re-scored with exact inner products.
+
+        rescore_factor: int
+            If positive, `k * rescore_factor` candidates are retrieved per query and
+            re-scored exactly, and the best `k` are returned.
+
+        chunk_size: int
+            The number of embeddings added to the index at a time.
+
+        n_jobs: int
+            The number of threads faiss uses. If -1, use all available CPUs.
+
+        show_progress_bar: bool
+            Whether to show the progress of the build.
+
+        seed: int
+            Seed for sampling the training embeddings.
+        """
+        import faiss
+
+        if n_jobs > 0:
+            faiss.omp_set_num_threads(n_jobs)
+
+        super().__init__(rescore_embeddings, rescore_factor)
+
+        if isinstance(embeddings, faiss.Index):
+            self.index = embeddings
+        else:
+            n, dim = embeddings.shape
+            if n_lists is None:
+                n_lists = max(1, min(int(4 * np.sqrt(n)), n // 39))
+            description = f"IVF{n_lists},PQ{m}x{n_bits}"
+            if opq:
+                description = f"OPQ{m}," + description
+            self.index = faiss.index_factory(dim, description, faiss.METRIC_INNER_PRODUCT)
+
+            if train_size is None:
+                train_size = 40 * max(n_lists, 2 ** n_bits)
+            train_size = min(train_size, n)
+            rng = np.random.default_rng(seed)
+            sample = np.sort(rng.choice(n, size=train_size, replace=False))
+            self.index.train(np.ascontiguousarray(_to_np(embeddings[sample]), dtype=np.float32))
+            self._add_chunks(embeddings, chunk_size, show_progress_bar)
+
+        if nprobe is not None:
+            self.nprobe = nprobe
+
+    @property
+    def nprobe(self):
+        import faiss
+
+        return faiss.extract_index_ivf(self.index).nprobe
+
+    @nprobe.setter
+    def nprobe(self, value):
+        import faiss
+
+        faiss.extract_index_ivf(self.index).nprobe = value
+
+    def save(self, directory="index", filename="ivfpq.index.faiss"):
+        super().save(directory, filename)
+
+    @classmethod
+    def load(
+        cls,
+        directory="index",
+        filename="ivfpq.index.faiss",
+        nprobe=None,
+        embeddings_path=None,
+        rescore_factor=None,
+        mmap=False,
+    ):
+        """
+        Load an index from a directory.
+
+        Parameters
+        ----------
+        directory: str
+            The directory to load the index from.
+
+        filename: str
+            The name of the file to load the index from.
+
+        nprobe: int
+            The number of inverted lists visited per query. If None, the value saved
+            next to the index file with `save_search_params` is used if any, and the
+            value saved in the index otherwise.
+
+        embeddings_path: str
+            Optional path to a .npy file of the exact embeddings of the documents,
+            which is memory-mapped for re-scoring.
+
+        rescore_factor: int
+            See `__init__`. If None, it is 4 when `embeddings_path` is given, and
+            re-scoring is disabled otherwise.
+
+        mmap: bool
+            Whether to memory-map the inverted lists from the file, read-only,
+            instead of reading them into memory. The index cannot be added to.
+        """
+        index, mapped = _read_faiss_index(Path(directory) / filename, mmap=mmap, ivf=True)
+        if nprobe is None:
+            nprobe = load_search_params(Path(directory) / filename).get("nprobe")
+        rescore_embeddings = cls._load_rescore_embeddings(embeddings_path, index.ntotal)
+        if rescore_factor is None:
+            rescore_factor = 4 if embeddings_path is not None else 0
+        index = cls(
+            index,
+            nprobe=nprobe,
+            rescore_embeddings=rescore_embeddings,
+            rescore_factor=rescore_factor,
+        )
+        index.mmap = mapped
+        return index
+
+    def _reconstruct_n(self, start_ix, n):
+        import faiss
+
+        faiss.extract_index_ivf(self.index).make_direct_map()
+        return self.index.reconstruct_n(start_ix, n)
+
+
+class IndexFaissFlatSQ(_IndexFaissRescored):
+    build_description = "Building SQ index"
+
+    def __init__(
+        self,
+        embeddings,
+        qtype="int8",
+        train_size=100000,
+        rescore_embeddings=None,
+        rescore_factor=0,
+        chunk_size=100000,
+        n_jobs=-1,
+        show_progress_bar=False,
+        seed=0,
+    ):
+        """
+        Flat index of scalar-quantized vectors. Like `IndexFaissFlatIP`, queries
+        are scored against every document, but in reduced precision: each document
+        is stored in `2 * embedding_dim` bytes with "fp16", or `embedding_dim` bytes
+        with "int8", instead of `4 * embedding_dim`. Re-scoring the candidates
+        against the exact embeddings (see `rescore_factor`) recovers the results of
+        the exact flat index, except for documents that fall out of the candidates.
+
+        Parameters
+        ----------
+        embeddings: numpy.ndarray, torch.Tensor or faiss.IndexScalarQuantizer
+            The embeddings of the documents, from which the index is trained and
+            built. They can be a memory-mapped array, since they are only read
+            `chunk_size` rows at a time (plus the training sample). If a faiss
+            index is provided, it is used directly.
+
+        qtype: str
+            Either "fp16" (half-precision floats) or "int8" (8-bit codes, scaled to
+            the range of each dimension).
+
+        train_size: int
+            The number of embeddings sampled to learn the range of each dimension
+            with "int8". Values out of the range of the sample are clipped.
+
+        rescore_embeddings: numpy.ndarray
+            The exact float32 embeddings of the documents, usually memory-mapped
+            (see `load`). If given with `rescore_factor`, the candidates found with
+            the quantized vectors are re-scored with exact inner products.
+
+        rescore_factor: int
+            If positive, `k * rescore_factor` candidates are retrieved per query and
+            re-scored exactly, and the best `k` are returned.
+
+        chunk_size: int
+            The number of embeddings added to the index at a time.
+
+        n_jobs: int
+            The number of threads faiss uses. If -1, use all available CPUs.
+
+        show_progress_bar: bool
+            Whether to show the progress of the build.
+
+        seed: int
+            Seed for sampling the training embeddings.
+        """
+        import faiss
+
+        qtypes = {
+            "fp16": faiss.ScalarQuantizer.QT_fp16,
+            "int8": faiss.ScalarQuantizer.QT_8bit,
+        }
+        if n_jobs > 0:
+            faiss.omp_set_num_threads(n_jobs)
+
+        super().__init__(rescore_embeddings, rescore_factor)
+
+        if isinstance(embeddings, faiss.Index):
+            self.index = embeddings
+        else:
+            if qtype not in qtypes:
+                raise ValueError(f'Unknown qtype {qtype}. Use "fp16" or "int8".')
+            n, dim = embeddings.shape
+            self.index = faiss.IndexScalarQuantizer(
+                dim, qtypes[qtype], faiss.METRIC_INNER_PRODUCT
+            )
+            if not self.index.is_trained:
+                rng = np.random.default_rng(seed)
+                sample = np.sort(rng.choice(n, size=min(train_size, n), replace=False))
+                self.index.train(
+                    np.ascontiguousarray(_to_np(embeddings[sample]), dtype=np.float32)
+                )
+            self._add_chunks(embeddings, chunk_size, show_progress_bar)
+
+    def save(self, directory="index", filename="sq.index.faiss"):
+        super().save(directory, filename)
+
+    @classmethod
+    def load(
+        cls,
+        directory="index",
+        filename="sq.index.faiss",
+        embeddings_path=None,
+        rescore_factor=None,
+        mmap=False,
+    ):
+        """
+        Load an index from a directory.
+
+        Parameters
+        ----------
+        directory: str
+            The directory to load the index from.
+
+        filename: str
+            The name of the file to load the index from.
+
+        embeddings_path: str
+            Optional path to a .npy file of the exact embeddings of the documents,
+            which is memory-mapped for re-scoring.
+
+        rescore_factor: int
+            See `__init__`. If None, it is 4 when `embeddings_path` is given, and
+            re-scoring is disabled otherwise.
+
+        mmap: bool
+            Whether to memory-map the quantized vectors from the file, read-only,
+            instead of reading them into memory. The index cannot be added to.
+        """
+        index, mapped = _read_faiss_index(Path(directory) / filename, mmap=mmap)
+        rescore_embeddings = cls._load_rescore_embeddings(embeddings_path, index.ntotal)
+        if rescore_factor is None:
+            rescore_factor = 4 if embeddings_path is not None else 0
+        index = cls(
+            index,
+            rescore_embeddings=rescore_embeddings,
+            rescore_factor=rescore_factor,
+        )
+        index.mmap = mapped
+        return index
+
+
 class IndexPyseriniBM25(IndexBase):
     def __init__(self, searcher):
         """
@@ -402,24 +1330,602 @@ class IndexPyseriniBM25(IndexBase):
         index_path = str(Path(directory) / index_subdir)
         return cls(pyserini_utils.LuceneSearcher(index_path))
 
-    def search(self, queries, k=10):
-        indices = []
-        scores = []
+    def search(self, queries, k=10, threads=1):
+        """
+        Search the index for text queries.
+
+        Parameters
+        ----------
+        queries: list of strings or string
+            The queries to search for.
 
+        k: int
+            The number of documents to retrieve for each query.
+
+        threads: int
+            The number of threads Pyserini searches queries with, using
+            `LuceneSearcher.batch_search`. If -1, use all available CPUs. With 1,
+            queries are searched one at a time.
+
+        Returns
+        -------
+        dict
+            The scores and indices of the retrieved documents, in the order of the
+            queries, as arrays of shape (n_queries, k). Queries with fewer than `k`
+            hits are padded with an index of -1 and a score of -inf.
+        """
         if isinstance(queries, str):
             queries = [queries]
+        if threads < 1:
+            threads = os.cpu_count()
+
+        if threads > 1 and len(queries) > 1:
+            qids = [str(i) for i in range(len(queries))]
+            batch_hits = self.index.batch_search(queries, qids, k=k, threads=threads)
+            hits = [batch_hits[qid] for qid in qids]
+        else:
+            hits = [self.index.search(q, k=k) for q in queries]
+
+        return self._hits_to_results(hits, k)
+
+    @staticmethod
+    def _hits_to_results(hits, k):
+        scores = np.full((len(hits), k), -np.inf, dtype=np.float32)
+        indices = np.full((len(hits), k), -1, dtype=np.int64)
+        for i, query_hits in enumerate(hits):
+            query_hits = query_hits[:k]
+            indices[i, : len(query_hits)] = [int(h.docid) for h in query_hits]
+            scores[i, : len(query_hits)] = [h.score for h in query_hits]
+
+        return dict(scores=scores, indices=indices)
+
+
+class _TermList(object):
+    """
+    Sorted list of terms stored as concatenated UTF-8 bytes, searchable with
+    `bisect`. Terms are compared as bytes, which orders them like strings.
+    """
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.data[self.offsets[index] : self.offsets[index + 1]].tobytes()
+
+    def find(self, term: str) -> int:
+        """
+        The position of `term`, or -1 if it is not in the list.
+        """
+        term = term.encode("utf-8")
+        position = bisect.bisect_left(self, term)
+        if position < len(self) and self[position] == term:
+            return position
+        return -1
+
+
+class IndexNumpyBM25(IndexBase):
+    def __init__(self, documents: Iterable[str], k1=0.9, b=0.4, stopwords=ENGLISH_STOPWORDS):
+        """
+        BM25 index in numpy arrays, which needs neither Java nor Pyserini. Postings
+        are stored by term in compressed sparse row (CSR) format: the documents and
+        term frequencies of term `t` are at `indptr[t]:indptr[t + 1]`. Saved indexes
+        are a directory of .npy files, which are memory-mapped when loaded.
 
-        for q in queries:
-            hits = self.index.search(q, k=k)
-            indices.append([int(h.docid) for h in hits])
-            scores.append([h.score for h in hits])
+        Scores follow Lucene's BM25, as in `IndexPyseriniBM25`. Text is lowercased
+        and split into words, and stop words are removed, but words are not stemmed,
+        so scores differ from those of Pyserini.
 
-        results = dict(
-            scores=np.array(scores),
-            indices=np.array(indices),
+        Parameters
+        ----------
+        documents: iterable of strings
+            The texts of the documents, in index order. Use `build_index` to build
+            the index from records, like `IndexPyseriniBM25`.
+
+        k1: float
+            Controls how fast the score of a term saturates with its frequency.
+
+        b: float
+            Controls how much scores are normalized by document length.
+
+        stopwords: set of strings
+            The words that are not indexed.
+
+        Examples
+        --------
+        >>> from instruct_qa.retrieval.index import IndexNumpyBM25
+        >>> records = [{"index": 0, "text": "My name is Nick"}, {"index": 1, "text": "I was born in 1974"}]
+        >>> IndexNumpyBM25.build_index(records, "/tmp/bm25", index_subdir="bm25_numpy")
+        >>> index = IndexNumpyBM25.load("/tmp/bm25", index_subdir="bm25_numpy")
+        >>> index.search(["What is my name?", "When were you born?"], k=1)
+        """
+        self.k1 = k1
+        self.b = b
+        self.stopwords = frozenset(stopwords)
+        if documents is None:
+            return
+
+        vocab = {}
+        # Postings are gathered in Python lists, and moved to arrays every
+        # `_BM25_CHUNK_SIZE` documents.
+        chunks = {"term_ids": [], "doc_ids": [], "tfs": []}
+        term_ids, doc_ids, tfs = [], [], []
+        doc_lengths = array.array("i")
+
+        def flush():
+            chunks["term_ids"].append(np.array(term_ids, dtype=np.int64))
+            chunks["doc_ids"].append(np.array(doc_ids, dtype=np.int32))
+            chunks["tfs"].append(np.array(tfs, dtype=np.uint16))
+            del term_ids[:], doc_ids[:], tfs[:]
+
+        for doc_id, text in enumerate(documents):
+            counts = {}
+            for token in self._tokenize(text):
+                counts[token] = counts.get(token, 0) + 1
+            doc_lengths.append(sum(counts.values()))
+            for token, count in counts.items():
+                term_ids.append(vocab.setdefault(token, len(vocab)))
+                doc_ids.append(doc_id)
+                tfs.append(min(count, 2**16 - 1))
+            if (doc_id + 1) % _BM25_CHUNK_SIZE == 0:
+                flush()
+        flush()
+        term_ids, doc_ids, tfs = (
+            np.concatenate(chunks[name] + [np.zeros(0, dtype=dtype)])
+            for name, dtype in (("term_ids", np.int64), ("doc_ids", np.int32), ("tfs", np.uint16))
+        )
+
+        # Number terms in sorted order, and sort postings by term, then document.
+        terms = sorted(vocab, key=lambda term: term.encode("utf-8"))
+        new_ids = np.empty(len(vocab), dtype=np.int64)
+        new_ids[[vocab[term] for term in terms]] = np.arange(len(terms))
+        term_ids = new_ids[term_ids]
+        order = np.argsort(term_ids, kind="stable")
+
+        encoded = [term.encode("utf-8") for term in terms]
+        self._set_arrays(
+            {
+                "terms.offsets": np.cumsum([0] + [len(t) for t in encoded], dtype=np.int64),
+                "terms.data": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+                "indptr": np.concatenate(
+                    ([0], np.cumsum(np.bincount(term_ids, minlength=len(terms))))
+                ).astype(np.int64),
+                "doc_ids": doc_ids[order],
+                "tfs": tfs[order],
+                "doc_lengths": np.frombuffer(doc_lengths, dtype=np.int32).copy(),
+            }
         )
 
-        return results
+    @classmethod
+    def build_index(
+        cls,
+        records: Iterable[Dict[str, str]],
+        directory: str,
+        index_subdir: str = "bm25_numpy",
+        k1=0.9,
+        b=0.4,
+        stopwords=ENGLISH_STOPWORDS,
+    ):
+        """
+        Build an index from a list of records and save it to `directory/index_subdir`,
+        like `IndexPyseriniBM25.build_index`.
+
+        Parameters
+        ----------
+        records: iterable of dicts
+            The documents, in index order. Their title, sub_title and text are
+            indexed, as with Pyserini. Records are read one at a time, so they can be
+            e.g. the passages of a memory-mapped collection.
+
+        directory: str
+            The directory to save the index to.
+
+        index_subdir: str
+            The name of the subdirectory of `directory` holding the index.
+
+        k1, b, stopwords:
+            See `__init__`.
+        """
+        from .utils import convert_dict_to_text
+
+        documents = (
+            convert_dict_to_text(record, key_order=("title", "sub_title", "text"))
+            for record in records
+        )
+        cls(documents, k1=k1, b=b, stopwords=stopwords).save(directory, index_subdir)
+
+    def __len__(self):
+        return len(self._doc_lengths)
+
+    def save(self, directory, index_subdir="bm25_numpy"):
+        """
+        Save the index as .npy files in `directory/index_subdir`.
+        """
+        path = Path(directory) / index_subdir
+        path.mkdir(parents=True, exist_ok=True)
+        for name, values in self._arrays.items():
+            np.save(path / f"{name}.npy", values)
+        config = {
+            "version": BM25_VERSION,
+            "k1": self.k1,
+            "b": self.b,
+            "stopwords": sorted(self.stopwords),
+        }
+        with open(path / "config.json", "w") as f:
+            json.dump(config, f)
+
+    @classmethod
+    def load(cls, directory, index_subdir="bm25_numpy", k1=None, b=None, mmap=True):
+        """
+        Load an index saved with `save` or `build_index`.
+
+        Parameters
+        ----------
+        directory: str
+            The directory the index was saved to.
+
+        index_subdir: str
+            The name of the subdirectory of `directory` holding the index.
+
+        k1, b: float
+            If given, override the parameters the index was built with.
+
+        mmap: bool
+            Whether to memory-map the postings instead of reading them into memory.
+            Loading is then immediate, and the pages of the postings of query terms
+            are read as they are searched.
+        """
+        path = Path(directory) / index_subdir
+        with open(path / "config.json") as f:
+            config = json.load(f)
+        if config["version"] != BM25_VERSION:
+            raise ValueError(
+                f"{path} holds a BM25 index of version {config['version']}, "
+                f"expected {BM25_VERSION}. Build it again."
+            )
+        index = cls(
+            None,
+            k1=config["k1"] if k1 is None else k1,
+            b=config["b"] if b is None else b,
+            stopwords=config["stopwords"],
+        )
+        mmap_mode = "r" if mmap else None
+        index._set_arrays(
+            {
+                name: np.load(path / f"{name}.npy", mmap_mode=mmap_mode)
+                for name in (
+                    "terms.offsets",
+                    "terms.data",
+                    "indptr",
+                    "doc_ids",
+                    "tfs",
+                    "doc_lengths",
+                )
+            }
+        )
+        return index
+
+    def search(self, queries, k=10):
+        """
+        Search the index for text queries.
+
+        The postings of each term of the batch are scored once, and added to the
+        scores of the queries that contain the term. Documents with equal scores are
+        ranked by index. Results are arrays of shape (n_queries, k): if fewer than `k`
+        documents contain a query term, they are padded with an index of -1 and a
+        score of -inf, as in `IndexPyseriniBM25.search`.
+        """
+        if isinstance(queries, str):
+            queries = [queries]
+
+        query_terms = []
+        for query in queries:
+            counts = {}
+            for token in self._tokenize(query):
+                term_id = self._terms.find(token)
+                if term_id >= 0:
+                    counts[term_id] = counts.get(term_id, 0) + 1
+            query_terms.append(counts)
+
+        term_scores = {}
+        for term_id in set().union(*query_terms):
+            term_scores[term_id] = self._score_term(term_id)
+
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        buffer = np.zeros(len(self), dtype=np.float32)
+        for i, counts in enumerate(query_terms):
+            candidates = [np.zeros(0, dtype=np.int32)]
+            for term_id, count in counts.items():
+                doc_ids, term_score = term_scores[term_id]
+                # A term occurs at most once per document, so `doc_ids` are unique.
+                buffer[doc_ids] += count * term_score
+                candidates.append(doc_ids)
+            candidates = np.unique(np.concatenate(candidates)).astype(np.int64)
+            candidate_scores = buffer[candidates]
+            buffer[candidates] = 0
+
+            if len(candidates) > k:
+                top = np.argpartition(-candidate_scores, k - 1)[:k]
+                candidates, candidate_scores = candidates[top], candidate_scores[top]
+            order = np.lexsort((candidates, -candidate_scores))
+            n = len(order)
+            indices[i, :n] = candidates[order]
+            scores[i, :n] = candidate_scores[order]
+
+        return {"scores": scores, "indices": indices}
+
+    def _set_arrays(self, arrays: Dict[str, np.ndarray]):
+        self._arrays = arrays
+        self._terms = _TermList(arrays["terms.offsets"], arrays["terms.data"])
+        self._indptr = arrays["indptr"]
+        self._doc_ids = arrays["doc_ids"]
+        self._tfs = arrays["tfs"]
+        self._doc_lengths = arrays["doc_lengths"]
+
+        # Length normalization of each document, `k1 * (1 - b + b * dl / avgdl)`.
+        doc_lengths = np.asarray(self._doc_lengths, dtype=np.float32)
+        avg_doc_length = max(float(doc_lengths.mean()), 1e-6) if len(doc_lengths) else 1.0
+        self._norms = self.k1 * (1 - self.b + self.b * doc_lengths / avg_doc_length)
+
+    def _score_term(self, term_id):
+        start, end = self._indptr[term_id], self._indptr[term_id + 1]
+        doc_ids = np.asarray(self._doc_ids[start:end])
+        tfs = np.asarray(self._tfs[start:end], dtype=np.float32)
+        df = end - start
+        idf = np.log(1 + (len(self) - df + 0.5) / (df + 0.5))
+        return doc_ids, (idf * tfs / (tfs + self._norms[doc_ids])).astype(np.float32)
+
+    def _tokenize(self, text: str) -> List[str]:
+        return [
+            token for token in re.findall(r"\w+", text.lower()) if token not in self.stopwords
+        ]
+
+
+class IndexSharded(IndexBase):
+    def __init__(self, shards: List[IndexBase], offsets: List[int] = None, n_jobs=-1):
+        """
+        Index split into shards, each holding a contiguous range of documents. Queries
+        are searched in all shards concurrently, and their results are merged.
+
+        Parameters
+        ----------
+        shards: list of IndexBase
+            The shards, in document order. Their scores must be comparable, e.g.
+            inner products, or distances of HNSW shards built with the same `phi`.
+
+        offsets: list of ints
+            The global index of the first document of each shard. If None, the
+            shards cover the documents from 0 on, one after the other. Offsets are
+            given when only some shards are loaded, see `load`.
+
+        n_jobs: int
+            The number of threads searching shards in parallel. If -1, one per shard.
+            faiss and torch release the GIL while searching.
+        """
+        if not shards:
+            raise ValueError("An IndexSharded needs at least one shard.")
+        higher_is_better = {shard.higher_is_better for shard in shards}
+        if len(higher_is_better) > 1:
+            raise ValueError(
+                "Shards must all rank documents by decreasing score, or all by increasing."
+            )
+        self.higher_is_better = higher_is_better.pop()
+
+        self.shards = list(shards)
+        if offsets is None:
+            offsets = np.cumsum([0] + [len(shard) for shard in self.shards[:-1]]).tolist()
+        if len(offsets) != len(self.shards):
+            raise ValueError(f"Got {len(offsets)} offsets for {len(self.shards)} shards.")
+        self.offsets = [int(offset) for offset in offsets]
+        self.n_jobs = n_jobs
+
+    @classmethod
+    def from_embeddings(
+        cls, embeddings, n_shards, index_cls=IndexFaissFlatIP, n_jobs=-1, **kwargs
+    ):
+        """
+        Build an index of `n_shards` shards of about the same size.
+
+        Parameters
+        ----------
+        embeddings: numpy.ndarray or torch.Tensor
+            The embeddings of the documents. They can be a memory-mapped array, of
+            which each shard only reads its own range.
+
+        n_shards: int
+            The number of shards.
+
+        index_cls: type
+            The class of the shards, built as `index_cls(embeddings, **kwargs)`.
+            HNSW shards are given the largest squared norm of all the embeddings as
+            `phi`, unless it is given, so that their distances are comparable.
+
+        n_jobs: int
+            See `__init__`.
+        """
+        bounds = np.linspace(0, len(embeddings), n_shards + 1).astype(int)
+        if issubclass(index_cls, IndexFaissHNSW) and kwargs.get("phi") is None:
+            chunk_size = kwargs.get("chunk_size", 100000)
+            kwargs["phi"] = max(
+                float((_to_np(embeddings[start : start + chunk_size]) ** 2).sum(axis=1).max())
+                for start in range(0, len(embeddings), chunk_size)
+            )
+        shards = [
+            index_cls(embeddings[start:end], **kwargs)
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+        return cls(shards, n_jobs=n_jobs)
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards)
+
+    def save(self, directory="index", filename="sharded.json"):
+        """
+        Save each shard (see `save_shard`), and a manifest of the shards named
+        `filename`.
+        """
+        for shard_id in range(len(self.shards)):
+            self.save_shard(shard_id, directory)
+        self._save_manifest(directory, filename)
+
+    def save_shard(self, shard_id: int, directory="index"):
+        """
+        Save one shard, with its own `save` method, as `shard-{shard_id:03d}` in
+        `directory`. This does not update the manifest written by `save`.
+        """
+        self.shards[shard_id].save(directory, self._get_shard_filename(shard_id))
+
+    @classmethod
+    def load(
+        cls, directory="index", filename="sharded.json", shard_ids=None, n_jobs=-1, **kwargs
+    ):
+        """
+        Load an index from a directory.
+
+        Parameters
+        ----------
+        directory: str
+            The directory to load the index from.
+
+        filename: str
+            The name of the manifest written by `save`.
+
+        shard_ids: list of ints
+            The shards to load. If None, all shards are loaded. Results of indexes
+            loaded with different shards, e.g. in several processes or on several
+            nodes, can be combined with `merge_results`.
+
+        n_jobs: int
+            See `__init__`.
+
+        **kwargs: dict
+            Additional keyword arguments to pass to the `load` method of each shard
+            (e.g. mmap=True).
+        """
+        with open(Path(directory) / filename) as f:
+            manifest = json.load(f)
+        if shard_ids is None:
+            shard_ids = range(len(manifest["shards"]))
+
+        shards = []
+        offsets = []
+        for shard_id in shard_ids:
+            info = manifest["shards"][shard_id]
+            shard_cls = getattr(sys.modules[__name__], info["class"])
+            shard = shard_cls.load(directory, info["filename"], **kwargs)
+            if len(shard) != info["size"]:
+                raise ValueError(
+                    f"Shard {info['filename']} holds {len(shard)} documents, but "
+                    f"{info['size']} were saved. Save the manifest again with `save`."
+                )
+            shards.append(shard)
+            offsets.append(info["offset"])
+        return cls(shards, offsets=offsets, n_jobs=n_jobs)
+
+    def get_embeddings(self, start_ix=0, end_ix=-1):
+        self._check_complete()
+        if end_ix == -1:
+            end_ix = len(self)
+        end_ix = min(end_ix, len(self))
+
+        embeddings = []
+        for shard, offset in zip(self.shards, self.offsets):
+            start, end = max(start_ix - offset, 0), min(end_ix - offset, len(shard))
+            if start < end:
+                embeddings.append(shard.get_embeddings(start, end))
+        return np.concatenate(embeddings)
+
+    def add(self, embeddings):
+        """
+        Append embeddings to the last shard, whose range of documents ends the index.
+        """
+        self._check_complete()
+        self.shards[-1].add(embeddings)
+
+    def search(self, queries, k=10):
+        from concurrent.futures import ThreadPoolExecutor
+
+        n_jobs = self.n_jobs if self.n_jobs > 0 else len(self.shards)
+        with ThreadPoolExecutor(n_jobs) as executor:
+            results = list(
+                executor.map(lambda shard: shard.search(queries, k=k), self.shards)
+            )
+        return self.merge_results(results, self.offsets, k, self.higher_is_better)
+
+    @staticmethod
+    def merge_results(
+        results: List[Dict], offsets: List[int], k=10, higher_is_better=True
+    ) -> Dict:
+        """
+        Merge the results of searches in several shards into the global top `k`.
+
+        Parameters
+        ----------
+        results: list of dicts
+            The results of `search` of each shard (or `IndexSharded`), with indices
+            relative to the shard.
+
+        offsets: list of ints
+            The global index of the first document of each shard. Use zeros for the
+            results of `IndexSharded`, whose indices are already global.
+
+        k: int
+            The number of documents to keep for each query.
+
+        higher_is_better: bool
+            Whether documents are ranked by decreasing score.
+
+        Returns
+        -------
+        dict
+            The scores and global indices of the retrieved documents, as returned by
+            `search`. Documents with equal scores are ranked by shard.
+        """
+        scores = np.concatenate(
+            [np.asarray(r["scores"], dtype=np.float32) for r in results], axis=1
+        )
+        # Missing results (-1) keep their index.
+        indices = np.concatenate(
+            [
+                np.where(r["indices"] >= 0, r["indices"] + offset, r["indices"])
+                for r, offset in zip(results, offsets)
+            ],
+            axis=1,
+        )
+        ranks = -scores if higher_is_better else scores
+        order = np.argsort(ranks, axis=1, kind="stable")[:, :k]
+        return {
+            "scores": np.take_along_axis(scores, order, axis=1),
+            "indices": np.take_along_axis(indices, order, axis=1),
+        }
+
+    def _check_complete(self):
+        expected = np.cumsum([0] + [len(shard) for shard in self.shards[:-1]]).tolist()
+        if self.offsets != expected:
+            raise ValueError("This method needs all the shards of the index to be loaded.")
+
+    def _get_shard_filename(self, shard_id):
+        return f"{SHARD_PREFIX}{shard_id:03d}"
+
+    def _save_manifest(self, directory, filename):
+        manifest = {
+            "shards": [
+                {
+                    "class": type(shard).__name__,
+                    "filename": self._get_shard_filename(shard_id),
+                    "offset": offset,
+                    "size": len(shard),
+                }
+                for shard_id, (shard, offset) in enumerate(zip(self.shards, self.offsets))
+            ]
+        }
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        with open(Path(directory) / filename, "w") as f:
+            json.dump(manifest, f, indent=2)
 
 
 if __name__ == "__main__":
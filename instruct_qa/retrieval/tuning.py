@@ -0,0 +1,191 @@
+"""
+Tuning of the parameter that trades the accuracy of approximate indexes for their
+speed (`IndexBase.search_param`), e.g. `ef_search` of HNSW indexes or `nprobe` of
+IVF-PQ indexes, to reach a target recall or a latency objective.
+
+Examples
+--------
+>>> from instruct_qa.retrieval.index import IndexFaissHNSW, save_search_params
+>>> from instruct_qa.retrieval.tuning import tune_search_param
+>>> index = IndexFaissHNSW.load("data/nq/index/hnsw", "index.dpr")
+>>> params = tune_search_param(index, queries, k=10, target_recall=0.95)
+>>> save_search_params("data/nq/index/hnsw/index.dpr", params)
+"""
+import logging
+import warnings
+
+import numpy as np
+
+from instruct_qa.retrieval.benchmark import exact_search, measure_latency, recall_at_k
+from instruct_qa.retrieval.index import IndexBase
+
+logger = logging.getLogger(__name__)
+
+
+def get_search_param_bounds(index: IndexBase, k=10):
+    """
+    The default range of values of the search parameter of an index. Values of
+    `ef_search` below `k` are searched as `k` by faiss, and `nprobe` cannot exceed
+    the number of inverted lists.
+    """
+    if index.search_param == "ef_search":
+        return k, max(2048, k)
+    if index.search_param == "nprobe":
+        import faiss
+
+        return 1, faiss.extract_index_ivf(index.index).nlist
+    raise ValueError(f"{type(index).__name__} has no search parameter to tune.")
+
+
+def tune_search_param(
+    index: IndexBase,
+    queries,
+    k=10,
+    target_recall=None,
+    max_latency_ms=None,
+    latency_stat="p99_ms",
+    batch_size=1,
+    max_batches=100,
+    exact_indices=None,
+    embeddings=None,
+    low=None,
+    high=None,
+):
+    """
+    Binary-search the search parameter of an index for the smallest value that
+    reaches `target_recall`, or the largest value that meets `max_latency_ms`, and
+    set it on the index. Recall and latency are both assumed to grow with the value.
+
+    Parameters
+    ----------
+    index: instruct_qa.retrieval.index.IndexBase
+        An index with a `search_param`.
+
+    queries: numpy.ndarray
+        Held-out query embeddings, of shape (n_queries, embedding_dim).
+
+    k: int
+        The number of documents retrieved per query.
+
+    target_recall: float
+        The recall@k to reach against exact inner product search.
+
+    max_latency_ms: float
+        The latency objective of a search of `batch_size` queries, in milliseconds.
+        With `target_recall`, the value reaching the recall is chosen if it meets the
+        objective, and the largest value that meets it otherwise.
+
+    latency_stat: str
+        The statistic of the latency compared to `max_latency_ms`, "p50_ms" or
+        "p99_ms" (see `instruct_qa.retrieval.benchmark.measure_latency`).
+
+    batch_size: int
+        The number of queries searched at a time when measuring latency.
+
+    max_batches: int
+        The maximum number of searches timed when measuring latency.
+
+    exact_indices: numpy.ndarray
+        The indices of the exact top `k` documents of each query. If None, they are
+        computed from `embeddings`.
+
+    embeddings: numpy.ndarray
+        The exact embeddings of the documents, usually memory-mapped. If None, they
+        are read from the index with `get_embeddings`.
+
+    low, high: int
+        The range of values searched. Defaults to `get_search_param_bounds`.
+
+    Returns
+    -------
+    dict
+        The chosen value under the name of the search parameter, its recall and
+        latency, the targets, and the values tried with their recall and latency.
+        It can be saved next to the index file with `save_search_params`.
+    """
+    if target_recall is None and max_latency_ms is None:
+        raise ValueError("Give a target_recall, a max_latency_ms, or both.")
+    name = index.search_param
+    default_low, default_high = get_search_param_bounds(index, k)
+    low = default_low if low is None else low
+    high = default_high if high is None else high
+
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    if exact_indices is None:
+        exact_indices = exact_search(index if embeddings is None else embeddings, queries, k)
+
+    trials = {}
+
+    def evaluate(value):
+        if value not in trials:
+            setattr(index, name, value)
+            recall = recall_at_k(index.search(queries, k=k)["indices"], exact_indices, k)
+            latency = measure_latency(index, queries, k, [batch_size], max_batches)
+            trials[value] = {"recall": recall, "latency_ms": latency[batch_size][latency_stat]}
+            logger.info(f"{name}={value}: {trials[value]}")
+        return trials[value]
+
+    recall_value = latency_value = None
+    if target_recall is not None:
+        recall_value = _smallest(lambda v: evaluate(v)["recall"] >= target_recall, low, high)
+        if recall_value is None:
+            warnings.warn(f"Recall {target_recall} is not reached with {name}={high}.")
+            recall_value = high
+    if max_latency_ms is not None:
+        latency_value = _largest(lambda v: evaluate(v)["latency_ms"] <= max_latency_ms, low, high)
+        if latency_value is None:
+            warnings.warn(f"The latency objective is not met with {name}={low}.")
+            latency_value = low
+
+    if recall_value is not None and latency_value is not None:
+        if recall_value > latency_value:
+            warnings.warn(
+                f"Recall {target_recall} needs {name}={recall_value}, which does not meet "
+                f"the latency objective, using {name}={latency_value}."
+            )
+        value = min(recall_value, latency_value)
+    else:
+        value = recall_value if recall_value is not None else latency_value
+
+    result = evaluate(value)
+    setattr(index, name, value)
+    return {
+        name: int(value),
+        "recall": result["recall"],
+        "latency_ms": result["latency_ms"],
+        "k": k,
+        "target_recall": target_recall,
+        "max_latency_ms": max_latency_ms,
+        "latency_stat": latency_stat,
+        "batch_size": batch_size,
+        "n_queries": len(queries),
+        "trials": {str(v): trials[v] for v in sorted(trials)},
+    }
+
+
+def _smallest(predicate, low, high):
+    # The smallest value in [low, high] for which a predicate that only turns from
+    # False to True holds, or None.
+    if not predicate(high):
+        return None
+    while low < high:
+        middle = (low + high) // 2
+        if predicate(middle):
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+def _largest(predicate, low, high):
+    # The largest value in [low, high] for which a predicate that only turns from
+    # True to False holds, or None.
+    if not predicate(low):
+        return None
+    while low < high:
+        middle = (low + high + 1) // 2
+        if predicate(middle):
+            low = middle
+        else:
+            high = middle - 1
+    return low
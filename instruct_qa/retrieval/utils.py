@@ -1,9 +1,16 @@
+import json
 import os
 from typing import Dict, List
 
 import instruct_qa.experiment_utils as utils
 from instruct_qa.retrieval import RetrieverFromFile, SentenceTransformerRetriever
-from instruct_qa.retrieval.index import IndexFaissFlatIP, IndexFaissHNSW
+from instruct_qa.retrieval.index import (
+    IndexFaissFlatIP,
+    IndexFaissFlatSQ,
+    IndexFaissHNSW,
+    IndexFaissIVFPQ,
+    IndexSharded,
+)
 
 INDEX_NAME_TO_PATH_URL = {
     "dpr-nq-multi-hnsw": {
@@ -14,6 +21,29 @@ INDEX_NAME_TO_PATH_URL = {
         "url": "https://instruct-qa.s3.us-east-2.amazonaws.com/indexes/dpr/topiocqa/single/hnsw/index.dpr",
         "path": "data/topiocqa/index/hnsw/index.dpr",
     },
+    # Compressed indexes are not hosted. Build them locally from the HNSW indexes
+    # with experiments/build_ivfpq_index.py and experiments/build_sq_index.py, which
+    # also export the exact embeddings used for re-scoring, shared by both.
+    "dpr-nq-multi-ivfpq": {
+        "url": None,
+        "path": "data/nq/index/ivfpq/index.faiss",
+        "embeddings_path": "data/nq/index/embeddings.npy",
+    },
+    "dpr-topiocqa-single-ivfpq": {
+        "url": None,
+        "path": "data/topiocqa/index/ivfpq/index.faiss",
+        "embeddings_path": "data/topiocqa/index/embeddings.npy",
+    },
+    "dpr-nq-multi-sq8": {
+        "url": None,
+        "path": "data/nq/index/sq8/index.faiss",
+        "embeddings_path": "data/nq/index/embeddings.npy",
+    },
+    "dpr-topiocqa-single-sq8": {
+        "url": None,
+        "path": "data/topiocqa/index/sq8/index.faiss",
+        "embeddings_path": "data/topiocqa/index/embeddings.npy",
+    },
 }
 
 
@@ -117,6 +147,34 @@ def convert_records_to_texts(
     return texts
 
 
+def export_embeddings(index, path, chunk_size=100000):
+    """
+    Save the embeddings of an index to a .npy file, `chunk_size` documents at a
+    time, so that they can be memory-mapped (e.g. for re-scoring, see
+    `IndexFaissIVFPQ`) without ever being held in memory at once.
+
+    Parameters
+    ----------
+    index: instruct_qa.retrieval.index.IndexBase
+        The index whose embeddings are saved, as returned by `get_embeddings`.
+
+    path: str
+        The path of the .npy file.
+
+    chunk_size: int
+        The number of embeddings read from the index at a time.
+    """
+    import numpy as np
+
+    dim = index.get_embeddings(0, 1).shape[1]
+    output = np.lib.format.open_memmap(
+        path, mode="w+", dtype=np.float32, shape=(len(index), dim)
+    )
+    for start in range(0, len(index), chunk_size):
+        output[start : start + chunk_size] = index.get_embeddings(start, start + chunk_size)
+    output.flush()
+
+
 def change_pooling_method(model, pooling_mode):
     """
     Change the pooling method of a sentence-transformers model.
@@ -223,7 +281,19 @@ def load_index(index_name, **kwargs):
     Parameters
     ----------
     index_name (str): Name of index to load.
-    kwargs: Additional parameters for the index (e.g., index_path).
+    kwargs: Additional parameters for the index (e.g., index_path). With mmap=True,
+        the index is memory-mapped read-only from its file rather than read into
+        memory, so loading does not wait for a full read and processes share pages.
+        IVF-PQ ("ivfpq") and scalar-quantized ("sq8" or "fp16") indexes also take
+        embeddings_path (exact embeddings for re-scoring, defaults to the one in
+        INDEX_NAME_TO_PATH_URL if it exists) and rescore_factor, IVF-PQ indexes take
+        nprobe and HNSW indexes take ef_search. If these are not given, the values
+        tuned with experiments/tune_index.py are applied, if any. For sharded indexes
+        ("sharded"), index_path is the manifest written by IndexSharded.save, and
+        shard_ids selects the shards to load. With warmup=True, a background thread
+        reads the memory-mapped files of the index into the page cache, then searches
+        the optional warmup_queries sample (with k=warmup_k), see
+        IndexBase.start_warmup; index.warmup.ready is set when it is done.
 
     Returns
     -------
@@ -234,22 +304,89 @@ def load_index(index_name, **kwargs):
     if index_path is None:
         index_path = INDEX_NAME_TO_PATH_URL[index_name]["path"]
         if not os.path.exists(index_path):
+            if INDEX_NAME_TO_PATH_URL[index_name]["url"] is None:
+                raise FileNotFoundError(
+                    f"Index {index_name} is not hosted and was not found at {index_path}. "
+                    "Build it first (see experiments/build_ivfpq_index.py and "
+                    "experiments/build_sq_index.py)."
+                )
             utils.wget(
                 INDEX_NAME_TO_PATH_URL[index_name]["url"],
                 index_path,
             )
 
+    mmap = kwargs.get("mmap", False)
     print("Loading index...")
-    if "hnsw" in index_name:
-        return IndexFaissHNSW.load(
+    embeddings_path = kwargs.get("embeddings_path", None)
+    if embeddings_path is None and index_name in INDEX_NAME_TO_PATH_URL:
+        embeddings_path = INDEX_NAME_TO_PATH_URL[index_name].get("embeddings_path")
+        if embeddings_path is not None and not os.path.exists(embeddings_path):
+            embeddings_path = None
+
+    files = []
+    if "sharded" in index_name:
+        shard_kwargs = {"mmap": True} if mmap else {}
+        index = IndexSharded.load(
             directory=os.path.dirname(index_path),
             filename=os.path.basename(index_path),
+            shard_ids=kwargs.get("shard_ids", None),
+            **shard_kwargs,
+        )
+        if mmap:
+            with open(index_path) as f:
+                manifest = json.load(f)
+            shard_ids = kwargs.get("shard_ids", None)
+            if shard_ids is None:
+                shard_ids = range(len(manifest["shards"]))
+            files = [
+                os.path.join(os.path.dirname(index_path), manifest["shards"][i]["filename"])
+                for i in shard_ids
+            ]
+    elif "ivfpq" in index_name:
+        ivfpq_kwargs = {}
+        if kwargs.get("nprobe", None) is not None:
+            ivfpq_kwargs["nprobe"] = kwargs["nprobe"]
+        index = IndexFaissIVFPQ.load(
+            directory=os.path.dirname(index_path),
+            filename=os.path.basename(index_path),
+            embeddings_path=embeddings_path,
+            rescore_factor=kwargs.get("rescore_factor", None),
+            mmap=mmap,
+            **ivfpq_kwargs,
+        )
+    elif "sq8" in index_name or "fp16" in index_name:
+        index = IndexFaissFlatSQ.load(
+            directory=os.path.dirname(index_path),
+            filename=os.path.basename(index_path),
+            embeddings_path=embeddings_path,
+            rescore_factor=kwargs.get("rescore_factor", None),
+            mmap=mmap,
+        )
+    elif "hnsw" in index_name:
+        index = IndexFaissHNSW.load(
+            directory=os.path.dirname(index_path),
+            filename=os.path.basename(index_path),
+            mmap=mmap,
+            ef_search=kwargs.get("ef_search", None),
         )
     else:
-        return IndexFaissFlatIP.load(
+        index = IndexFaissFlatIP.load(
             directory=os.path.dirname(index_path),
             filename=os.path.basename(index_path),
+            mmap=mmap,
+        )
+
+    if kwargs.get("warmup", False):
+        if mmap and not files:
+            files = [index_path]
+        if getattr(index, "rescore_embeddings", None) is not None:
+            files.append(embeddings_path)
+        index.start_warmup(
+            files,
+            queries=kwargs.get("warmup_queries", None),
+            k=kwargs.get("warmup_k", 10),
         )
+    return index
 
 
 def load_retriever(model_name, index, retriever_cached_results_fp=None):
@@ -0,0 +1,49 @@
+import os
+import re
+from typing import List, Tuple
+
+SEGMENT_PREFIX = "segment-"
+
+
+def get_segment_path(directory: str, start_ix: int, suffix: str) -> str:
+    """
+    Path of the segment holding the items of a collection or index from `start_ix`.
+
+    Segments persist items appended after a collection or index was built. They are
+    named after the position of their first item, so that they sort in order and can
+    be checked to follow each other.
+    """
+    return os.path.join(directory, f"{SEGMENT_PREFIX}{start_ix:012d}{suffix}")
+
+
+def list_segments(directory: str, suffix: str) -> List[Tuple[int, str]]:
+    """
+    List the segments with the given suffix in a directory.
+
+    Returns
+    -------
+    list of tuples
+        The start index and path of each segment, by increasing start index. The list
+        is empty if the directory does not exist.
+    """
+    if not os.path.isdir(directory):
+        return []
+    pattern = re.compile(re.escape(SEGMENT_PREFIX) + r"(\d+)" + re.escape(suffix) + "$")
+    segments = []
+    for name in os.listdir(directory):
+        match = pattern.match(name)
+        if match:
+            segments.append((int(match.group(1)), os.path.join(directory, name)))
+    return sorted(segments)
+
+
+def check_segment_start(start_ix: int, size: int, path: str):
+    """
+    Raise a ValueError if a segment does not start right after the `size` items of
+    the collection or index it is added to.
+    """
+    if start_ix != size:
+        raise ValueError(
+            f"Segment {path} starts at {start_ix}, but {size} items are loaded. "
+            "Segments must be added to the collection or index they were saved from."
+        )
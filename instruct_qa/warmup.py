@@ -0,0 +1,152 @@
+import logging
+import mmap
+import os
+import threading
+import time
+from typing import Callable, Iterable
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+WARMUP_CHUNK_SIZE = 2 ** 24
+
+
+def prefetch_file(path: str, chunk_size: int = WARMUP_CHUNK_SIZE) -> int:
+    """
+    Read a file into the page cache, so that processes memory-mapping it (e.g. faiss
+    with mmap=True, or `numpy.load` with mmap_mode) do not wait on the disk when
+    they first access its pages. The kernel is asked to read ahead with
+    `madvise(MADV_WILLNEED)` where available, then the file is read sequentially,
+    `chunk_size` bytes at a time.
+
+    Returns
+    -------
+    int
+        The number of bytes read.
+    """
+    total = 0
+    with open(path, "rb", buffering=0) as f:
+        if os.fstat(f.fileno()).st_size > 0 and hasattr(mmap, "MADV_WILLNEED"):
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                mapped.madvise(mmap.MADV_WILLNEED)
+        buffer = bytearray(chunk_size)
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            total += n
+    return total
+
+
+def prefetch_buffer(buffer, chunk_size: int = WARMUP_CHUNK_SIZE) -> int:
+    """
+    Touch every page of a buffer, e.g. a `mmap.mmap` the process already maps, so
+    that later reads of the mapping neither wait on the disk nor fault. Memory maps
+    are first advised with `madvise(MADV_WILLNEED)` where available.
+
+    Returns
+    -------
+    int
+        The number of bytes touched.
+    """
+    if isinstance(buffer, mmap.mmap) and len(buffer) > 0 and hasattr(mmap, "MADV_WILLNEED"):
+        buffer.madvise(mmap.MADV_WILLNEED)
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    for start in range(0, len(data), chunk_size):
+        # One byte per page is enough to map it.
+        int(data[start : start + chunk_size : mmap.PAGESIZE].sum())
+    return len(data)
+
+
+class Warmup(object):
+    def __init__(
+        self,
+        files: Iterable[str] = (),
+        buffers: Iterable = (),
+        search: Callable = None,
+        queries=None,
+        k: int = 10,
+        batch_size: int = 32,
+        chunk_size: int = WARMUP_CHUNK_SIZE,
+    ):
+        """
+        Warm-up of loaded indexes and collections in a background thread, so that a
+        process can start serving while pages are still being read from disk.
+
+        Files are read into the page cache and buffers are touched, in order (see
+        `prefetch_file` and `prefetch_buffer`), then `queries` are replayed through
+        `search`, `batch_size` at a time, e.g. to load the pages of an HNSW graph or
+        IVF lists that real queries visit. The `ready` event is set when the warm-up
+        is over, even if it failed, in which case `error` holds the exception.
+
+        Parameters
+        ----------
+        files: list of strings
+            Paths of files to read into the page cache.
+
+        buffers: list
+            Memory maps or other buffers to touch.
+
+        search: callable
+            The search function queries are replayed through, e.g. `index.search`.
+
+        queries: numpy.ndarray or list of strings
+            Sample queries to replay. If None, no query is replayed.
+
+        k: int
+            The number of documents retrieved per replayed query.
+
+        batch_size: int
+            The number of queries replayed at a time.
+
+        chunk_size: int
+            The number of bytes read or touched at a time.
+
+        Examples
+        --------
+        >>> index = load_index("dpr-nq-multi-hnsw", mmap=True, warmup=True)
+        >>> index.warmup.ready.wait()
+        >>> index.warmup.stats
+        """
+        self.files = list(files)
+        self.buffers = list(buffers)
+        self.search = search
+        self.queries = queries
+        self.k = k
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.ready = threading.Event()
+        self.error = None
+        self.stats = {"bytes": 0, "queries": 0, "seconds": None}
+        self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+
+    def start(self) -> "Warmup":
+        self._thread.start()
+        return self
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Wait for the warm-up to be over. Returns False if `timeout` expired first.
+        """
+        return self.ready.wait(timeout)
+
+    def _run(self):
+        start = time.perf_counter()
+        try:
+            for path in self.files:
+                self.stats["bytes"] += prefetch_file(path, self.chunk_size)
+            for buffer in self.buffers:
+                self.stats["bytes"] += prefetch_buffer(buffer, self.chunk_size)
+            if self.search is not None and self.queries is not None:
+                for i in range(0, len(self.queries), self.batch_size):
+                    batch = self.queries[i : i + self.batch_size]
+                    self.search(batch, k=self.k)
+                    self.stats["queries"] += len(batch)
+        except Exception as e:
+            self.error = e
+            logger.warning(f"Warm-up failed: {e}")
+        finally:
+            self.stats["seconds"] = time.perf_counter() - start
+            self.ready.set()
+            logger.info(f"Warm-up done: {self.stats}")
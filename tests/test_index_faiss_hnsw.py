@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+faiss = pytest.importorskip("faiss")
+
+from instruct_qa.retrieval.index import IndexFaissHNSW
+
+
+@pytest.fixture
+def embeddings():
+    return np.random.default_rng(0).standard_normal((500, 16)).astype(np.float32)
+
+
+@pytest.fixture
+def queries():
+    return np.random.default_rng(1).standard_normal((10, 16)).astype(np.float32)
+
+
+@pytest.fixture
+def index(embeddings):
+    return IndexFaissHNSW(embeddings, store_n=16, ef_search=64, ef_construction=64, n_jobs=1)
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_save_load_round_trip(tmp_path, index, queries, mmap):
+    index.save(tmp_path)
+
+    loaded = IndexFaissHNSW.load(tmp_path, mmap=mmap)
+
+    assert len(loaded) == len(index)
+    assert loaded.ef_search == index.ef_search
+    expected = index.search(queries, k=5)
+    results = loaded.search(queries, k=5)
+    np.testing.assert_array_equal(results["indices"], expected["indices"])
+    np.testing.assert_allclose(results["scores"], expected["scores"])
+
+
+@pytest.mark.skipif(
+    not hasattr(faiss, "IO_FLAG_MMAP_IFC"), reason="Indexes are read into memory."
+)
+def test_add_to_mmapped_index_raises(tmp_path, index, embeddings):
+    index.save(tmp_path)
+    loaded = IndexFaissHNSW.load(tmp_path, mmap=True)
+
+    with pytest.raises(ValueError):
+        loaded.add(embeddings[:10])
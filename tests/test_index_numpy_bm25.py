@@ -0,0 +1,88 @@
+import math
+import re
+
+import numpy as np
+import pytest
+
+from instruct_qa.retrieval import BM25Retriever
+from instruct_qa.retrieval.index import IndexNumpyBM25
+
+DOCUMENTS = [
+    "The cat sat on the mat",
+    "A dog chased the cat around the garden",
+    "Dogs and cats are pets",
+    "The quick brown fox jumps over the lazy dog",
+    "Birds fly south in winter",
+    "cat cat cat",
+    "",
+]
+
+
+def tokenize(text):
+    return re.findall(r"\w+", text.lower())
+
+
+def lucene_bm25(query, documents, k1=0.9, b=0.4):
+    # Brute-force BM25 as in Lucene: each query term adds
+    # idf * tf / (tf + k1 * (1 - b + b * dl / avgdl)), with
+    # idf = log(1 + (N - df + 0.5) / (df + 0.5)).
+    tokenized = [tokenize(document) for document in documents]
+    avg_doc_length = sum(len(tokens) for tokens in tokenized) / len(tokenized)
+    scores = np.zeros(len(documents))
+    for term in tokenize(query):
+        df = sum(term in tokens for tokens in tokenized)
+        idf = math.log(1 + (len(documents) - df + 0.5) / (df + 0.5))
+        for i, tokens in enumerate(tokenized):
+            tf = tokens.count(term)
+            norm = k1 * (1 - b + b * len(tokens) / avg_doc_length)
+            scores[i] += idf * tf / (tf + norm)
+    return scores
+
+
+@pytest.mark.parametrize("query", ["cat", "the cat", "dog garden", "cat cat pets", "winter"])
+def test_scores_match_lucene_bm25(query):
+    index = IndexNumpyBM25(DOCUMENTS, stopwords=())
+    k = len(DOCUMENTS)
+
+    results = index.search([query], k=k)
+
+    expected = lucene_bm25(query, DOCUMENTS)
+    found = results["indices"][0] >= 0
+    np.testing.assert_array_equal(
+        np.sort(results["indices"][0][found]), np.flatnonzero(expected > 0)
+    )
+    np.testing.assert_allclose(
+        results["scores"][0][found], expected[results["indices"][0][found]], rtol=1e-5
+    )
+    assert np.all(np.diff(results["scores"][0][found]) <= 0)
+
+
+def test_results_are_padded():
+    index = IndexNumpyBM25(DOCUMENTS, stopwords=())
+
+    results = index.search(["winter", "unknown"], k=3)
+
+    assert results["indices"].shape == (2, 3)
+    np.testing.assert_array_equal(results["indices"], [[4, -1, -1], [-1, -1, -1]])
+    assert np.all(np.isneginf(results["scores"][0, 1:]))
+
+
+def test_save_load_round_trip(tmp_path):
+    index = IndexNumpyBM25(DOCUMENTS)
+    index.save(tmp_path)
+
+    loaded = IndexNumpyBM25.load(tmp_path)
+
+    expected = index.search(["cat", "dog garden"], k=3)
+    results = loaded.search(["cat", "dog garden"], k=3)
+    np.testing.assert_array_equal(results["indices"], expected["indices"])
+    np.testing.assert_allclose(results["scores"], expected["scores"])
+
+
+def test_retriever_saves_to_numpy_subdir(tmp_path):
+    retriever = BM25Retriever()
+
+    retriever.build_index(DOCUMENTS, str(tmp_path), index_cls=IndexNumpyBM25)
+
+    assert (tmp_path / "bm25_numpy" / "config.json").exists()
+    assert not (tmp_path / "bm25_pyserini").exists()
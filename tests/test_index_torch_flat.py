@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from instruct_qa.retrieval.index import IndexTorchFlat
+
+
+@pytest.fixture
+def embeddings():
+    embeddings = np.random.default_rng(0).standard_normal((20, 8)).astype(np.float32)
+    # Unit norm, so that each embedding is its own nearest neighbour.
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+def test_load_legacy_pt_index(tmp_path, embeddings):
+    # Indexes saved by earlier versions, with the default filename flat.index.pt.
+    torch.save(torch.from_numpy(embeddings), tmp_path / "flat.index.pt")
+
+    index = IndexTorchFlat.load(tmp_path, device="cpu")
+
+    np.testing.assert_allclose(index.get_embeddings(), embeddings)
+    results = index.search(embeddings[:3], k=1)
+    np.testing.assert_array_equal(results["indices"][:, 0], [0, 1, 2])
+
+
+def test_load_legacy_pt_index_with_mmap(tmp_path, embeddings):
+    torch.save(torch.from_numpy(embeddings), tmp_path / "flat.index.pt")
+
+    with pytest.warns(UserWarning):
+        index = IndexTorchFlat.load(tmp_path, device="cpu", mmap=True)
+
+    np.testing.assert_allclose(index.get_embeddings(), embeddings)
+
+
+def test_npy_index_is_preferred(tmp_path, embeddings):
+    torch.save(torch.zeros(1, 8), tmp_path / "flat.index.pt")
+    IndexTorchFlat(embeddings, device="cpu").save(tmp_path)
+
+    index = IndexTorchFlat.load(tmp_path, device="cpu", mmap=True)
+
+    np.testing.assert_allclose(index.get_embeddings(), embeddings)
+
+
+def test_search_pads_results_to_k(embeddings):
+    index = IndexTorchFlat(embeddings, device="cpu", block_size=8)
+
+    results = index.search(embeddings[:2], k=len(embeddings) + 5)
+
+    assert results["indices"].shape == (2, len(embeddings) + 5)
+    assert results["scores"].shape == (2, len(embeddings) + 5)
+    np.testing.assert_array_equal(
+        np.sort(results["indices"][:, : len(embeddings)], axis=1),
+        np.tile(np.arange(len(embeddings)), (2, 1)),
+    )
+    assert np.all(results["indices"][:, len(embeddings) :] == -1)
+    assert np.all(np.isneginf(results["scores"][:, len(embeddings) :]))